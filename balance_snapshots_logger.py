@@ -3,11 +3,21 @@
 Логирование снимков баланса для анализа динамики
 """
 
+import asyncio
+import atexit
+import io
+import itertools
+import struct
+import threading
+import time
+from collections import deque
 from datetime import datetime, timedelta
-from decimal import Decimal
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Iterable, Iterator, Tuple
 
-from app.db_session import SessionLocal
+from sqlalchemy import insert, select, delete, literal, union_all, text, bindparam
+from sqlalchemy.exc import InterfaceError, OperationalError
+
+from app.db_session import ScopedSession, ReadScopedSession, engine, utc_now
 from app.db_models import BalanceSnapshots
 from app.sys_events_logger import sys_logger
 
@@ -15,10 +25,102 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    # Опционально: нативный async-драйвер для фонового сброса из event loop
+    from psycopg_pool import AsyncConnectionPool
+except ImportError:
+    AsyncConnectionPool = None
+
+# Все метки времени модуля — наивный UTC (db_session.utc_now()), как и в
+# остальных логгерах
+
+# Параметры буферизации: сбрасываем по достижении BATCH_SIZE строк
+# или раз в FLUSH_INTERVAL_SEC секунд — что наступит раньше
+BATCH_SIZE = 500
+FLUSH_INTERVAL_SEC = 5.0
+# Пока БД недоступна, несохранённые пачки возвращаются в буфер; он ограничен
+# MAX_BUFFER_SIZE — вытесняются самые старые снимки, а не растёт память
+MAX_BUFFER_SIZE = 50_000
+
+# Буфер снимков, ожидающих записи (общий для всех потоков)
+_buffer: deque = deque(maxlen=MAX_BUFFER_SIZE)
+_buffer_lock = threading.Lock()
+_flush_event = threading.Event()
+_flusher_thread: Optional[threading.Thread] = None
+
+# Async-сброс из event loop (run_flusher_async): пока он активен,
+# фоновый поток не запускается
+ASYNC_POOL_MAX_SIZE = 4
+_async_pool = None
+_async_wakeup: Optional[Tuple[asyncio.AbstractEventLoop, asyncio.Event]] = None
+
+# Размер порции при удалении старых снимков: короткие транзакции
+# вместо одного монолитного DELETE по всей таблице
+CLEANUP_BATCH_SIZE = 10_000
+
+# COPY для массовой загрузки (бэкфилл/импорт истории)
+COPY_COLUMNS = ("account_id", "asset", "free", "locked", "equity", "ts")
+COPY_CHUNK_ROWS = 50_000
+
+# Бинарный формат COPY: заголовок, хвост и эпоха timestamp в PostgreSQL
+_PGCOPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack(">ii", 0, 0)
+_PGCOPY_TRAILER = struct.pack(">h", -1)
+_PG_EPOCH = datetime(2000, 1, 1)
+
+# Помесячные партиции balance_snapshots (PARTITION BY RANGE (ts)).
+# _partitioned = None — ещё не проверяли; False — старая непартиционированная таблица
+PARTITIONS_AHEAD_MONTHS = 1
+_partitioned: Optional[bool] = None
+_known_partitions: set = set()
+_partition_lock = threading.Lock()
+
+# Порог, начиная с которого история читается порциями (yield_per)
+HISTORY_YIELD_PER = 1000
+
+# Запрос «последний снимок» собирается один раз: на вызове остаются только
+# bind-параметры, скомпилированный SQL берётся из кэша SQLAlchemy
+_LAST_SNAPSHOT_STMT = (
+    select(
+        BalanceSnapshots.account_id,
+        BalanceSnapshots.asset,
+        BalanceSnapshots.free,
+        BalanceSnapshots.locked,
+        BalanceSnapshots.equity,
+        (BalanceSnapshots.free + BalanceSnapshots.locked).label("total"),
+        BalanceSnapshots.ts,
+    )
+    .where(
+        BalanceSnapshots.account_id == bindparam("account_id"),
+        BalanceSnapshots.asset == bindparam("asset"),
+    )
+    .order_by(BalanceSnapshots.ts.desc())
+    .limit(1)
+)
+
+# TTL-кэш чтений (дашборды/Telegram опрашивают одни и те же пары account/asset)
+LAST_SNAPSHOT_TTL_SEC = 5.0
+PNL_24H_TTL_SEC = 60.0
+
+# (kind, account_id, asset) -> (expires_at, version, value)
+_read_cache: Dict[Tuple[str, int, str], Tuple[float, int, Any]] = {}
+# (account_id, asset) -> версия; растёт при каждой записи снимков
+_cache_versions: Dict[Tuple[int, str], int] = {}
+_cache_lock = threading.Lock()
+_MISS = object()
+
 
 class BalanceSnapshotLogger:
     """Класс для логирования снимков баланса"""
 
+    # Фабрики сессий: запись — в транзакции, чтение — в autocommit
+    session_factory = ScopedSession
+    read_session_factory = ReadScopedSession
+
     @staticmethod
     def log_balance_snapshot(
         account_id: int,
@@ -28,7 +130,8 @@ class BalanceSnapshotLogger:
         equity: Optional[float] = None,
     ) -> bool:
         """
-        Записывает снимок баланса в БД.
+        Ставит снимок баланса в буфер; запись в БД выполняется пачками
+        фоновым потоком (см. BATCH_SIZE / FLUSH_INTERVAL_SEC).
 
         Args:
             account_id: ID аккаунта (1 для источника, 2 для основного)
@@ -42,53 +145,263 @@ class BalanceSnapshotLogger:
             if equity is None:
                 equity = free + locked
 
-            with SessionLocal() as session:
-                snapshot = BalanceSnapshots(
-                    account_id=account_id,
-                    asset=asset,
-                    free=Decimal(str(free)),
-                    locked=Decimal(str(locked)),
-                    equity=Decimal(str(equity)),
-                    ts=datetime.now(),
-                )
+            _enqueue(
+                [
+                    {
+                        "account_id": account_id,
+                        "asset": asset,
+                        "free": float(free),
+                        "locked": float(locked),
+                        "equity": float(equity),
+                        "ts": utc_now(),
+                    }
+                ]
+            )
 
-                session.add(snapshot)
-                session.commit()
-
-                logger.debug(
-                    f"Balance snapshot saved: {asset} free={free:.2f} locked={locked:.2f} equity={equity:.2f}"
-                )
-                return True
+            logger.debug(
+                f"Balance snapshot queued: {asset} free={free:.2f} locked={locked:.2f} equity={equity:.2f}"
+            )
+            return True
 
         except Exception as e:
             logger.error(f"Failed to log balance snapshot: {e}")
             return False
 
+    @staticmethod
+    def log_balance_snapshots_bulk(rows: List[Dict[str, Any]]) -> int:
+        """
+        Записывает пачку снимков одним INSERT и одним коммитом.
+
+        Args:
+            rows: Список словарей с ключами account_id, asset, free, locked, equity[, ts]
+                  (без ts строка получает момент записи, UTC)
+
+        Returns:
+            Количество записанных строк (0 при ошибке)
+        """
+        if not rows:
+            return 0
+
+        try:
+            # Строки без ts получают момент записи
+            now = utc_now()
+            for row in rows:
+                if row.get("ts") is None:
+                    row["ts"] = now
+
+            return _write_rows(rows)
+
+        except Exception as e:
+            logger.error(f"Failed to write {len(rows)} balance snapshots: {e}")
+            return 0
+
+    @staticmethod
+    def bulk_copy_snapshots(rows_iter: Iterable[Dict[str, Any]]) -> int:
+        """
+        Массовая загрузка снимков через COPY ... FROM STDIN (FORMAT BINARY).
+        Предназначена для бэкфилла/импорта истории, а не для онлайн-записи.
+
+        Строки передаются порциями по COPY_CHUNK_ROWS, всё — в одной транзакции.
+        Для драйверов без COPY используется пакетный INSERT.
+
+        Args:
+            rows_iter: Итерируемое словарей с ключами account_id, asset, free, locked, equity[, ts]
+
+        Returns:
+            Количество загруженных строк (0 при ошибке)
+        """
+        rows_iter = iter(rows_iter)
+        total = 0
+        touched = set()
+
+        try:
+            with BalanceSnapshotLogger.session_factory() as session:
+                dbapi_conn = session.connection().connection.dbapi_connection
+                cursor = dbapi_conn.cursor()
+                use_copy = hasattr(cursor, "copy_expert") or hasattr(cursor, "copy")
+
+                while True:
+                    chunk = list(itertools.islice(rows_iter, COPY_CHUNK_ROWS))
+                    if not chunk:
+                        break
+
+                    now = utc_now()
+                    for row in chunk:
+                        if row.get("ts") is None:
+                            row["ts"] = now
+                        touched.add((row["account_id"], row["asset"]))
+
+                    BalanceSnapshotLogger.ensure_partitions(
+                        min(r["ts"] for r in chunk), max(r["ts"] for r in chunk)
+                    )
+
+                    if use_copy:
+                        _copy_binary(cursor, _encode_copy_binary(chunk))
+                    else:
+                        session.execute(insert(BalanceSnapshots), chunk)
+
+                    total += len(chunk)
+
+                session.commit()
+
+            _cache_invalidate(touched)
+            logger.info(f"Balance snapshots bulk-loaded: {total} rows")
+            return total
+
+        except Exception as e:
+            logger.error(f"Failed to bulk-load balance snapshots: {e}")
+            return 0
+
+    @staticmethod
+    def log_balance_snapshot_batch(account_id: int, asset: str, rows_np) -> int:
+        """
+        Быстрый путь для серий снимков одного account/asset.
+
+        rows_np — структурированный массив NumPy (или recarray) с полями
+        ts (datetime64), free, locked, equity (float64). Бинарный COPY-поток
+        собирается векторно одним буфером NumPy, без Python-объекта на строку.
+
+        Returns:
+            Количество загруженных строк (0 при ошибке)
+        """
+        n = len(rows_np)
+        if n == 0:
+            return 0
+
+        try:
+            if np is None:
+                raise RuntimeError("numpy is required for log_balance_snapshot_batch")
+
+            ts_us = rows_np["ts"].astype("datetime64[us]")
+            BalanceSnapshotLogger.ensure_partitions(ts_us.min().item(), ts_us.max().item())
+
+            with BalanceSnapshotLogger.session_factory() as session:
+                cursor = session.connection().connection.dbapi_connection.cursor()
+                if hasattr(cursor, "copy_expert") or hasattr(cursor, "copy"):
+                    payload = _encode_copy_binary_np(account_id, asset, rows_np, ts_us)
+                    _copy_binary(cursor, payload)
+                else:
+                    session.execute(
+                        insert(BalanceSnapshots),
+                        [
+                            {
+                                "account_id": account_id,
+                                "asset": asset,
+                                "free": float(free),
+                                "locked": float(locked),
+                                "equity": float(equity),
+                                "ts": ts.item(),
+                            }
+                            for free, locked, equity, ts in zip(
+                                rows_np["free"], rows_np["locked"], rows_np["equity"], ts_us
+                            )
+                        ],
+                    )
+                session.commit()
+
+            _cache_invalidate([(account_id, asset)])
+            logger.debug(f"Balance snapshot batch loaded: {asset} {n} rows")
+            return n
+
+        except Exception as e:
+            logger.error(f"Failed to load balance snapshot batch ({n} rows): {e}")
+            return 0
+
+    @staticmethod
+    def flush() -> int:
+        """
+        Принудительно сбрасывает буфер снимков в БД. Если БД недоступна,
+        пачка возвращается в начало буфера до следующего сброса.
+        """
+        written = 0
+        while True:
+            with _buffer_lock:
+                batch = [_buffer.popleft() for _ in range(min(BATCH_SIZE, len(_buffer)))]
+            if not batch:
+                return written
+            try:
+                written += _write_rows(batch)
+            except Exception as e:
+                logger.error(f"Failed to write {len(batch)} balance snapshots, requeued: {e}")
+                _requeue(batch)
+                return written
+
+    @staticmethod
+    async def flush_async() -> int:
+        """
+        Async-вариант flush(): пачки пишутся через psycopg AsyncConnectionPool,
+        не блокируя event loop. Без psycopg — через пул потоков.
+        """
+        written = 0
+        while True:
+            with _buffer_lock:
+                batch = [_buffer.popleft() for _ in range(min(BATCH_SIZE, len(_buffer)))]
+            if not batch:
+                return written
+            try:
+                written += await _write_batch_async(batch)
+            except Exception as e:
+                logger.error(f"Failed to write {len(batch)} balance snapshots (async), requeued: {e}")
+                _requeue(batch)
+                return written
+
+    @staticmethod
+    async def run_flusher_async(interval: float = FLUSH_INTERVAL_SEC) -> None:
+        """
+        Фоновая задача для существующего event loop:
+        asyncio.create_task(balance_logger.run_flusher_async()).
+        Сбрасывает буфер раз в interval секунд или при накоплении BATCH_SIZE строк.
+        """
+        global _async_wakeup
+        wakeup = asyncio.Event()
+        _async_wakeup = (asyncio.get_running_loop(), wakeup)
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(wakeup.wait(), timeout=interval)
+                except asyncio.TimeoutError:
+                    pass
+                wakeup.clear()
+                try:
+                    await BalanceSnapshotLogger.flush_async()
+                except Exception as e:
+                    logger.error(f"Balance snapshot async flusher error: {e}")
+        finally:
+            _async_wakeup = None
+            # Остаток буфера подхватит поток/atexit
+            if _buffer:
+                _enqueue([])
+                _flush_event.set()
+
     @staticmethod
     def get_last_snapshot(
         account_id: int, asset: str = "USDT"
     ) -> Optional[Dict[str, Any]]:
         """Получает последний снимок баланса"""
+        cached, version = _cache_lookup("last", account_id, asset)
+        if cached is not _MISS:
+            return dict(cached) if cached else None
+
         try:
-            with SessionLocal() as session:
-                snapshot = (
-                    session.query(BalanceSnapshots)
-                    .filter_by(account_id=account_id, asset=asset)
-                    .order_by(BalanceSnapshots.ts.desc())
-                    .first()
-                )
+            with BalanceSnapshotLogger.read_session_factory() as session:
+                snapshot = session.execute(
+                    _LAST_SNAPSHOT_STMT, {"account_id": account_id, "asset": asset}
+                ).one_or_none()
 
+                result = None
                 if snapshot:
-                    return {
+                    result = {
                         "account_id": snapshot.account_id,
                         "asset": snapshot.asset,
-                        "free": float(snapshot.free),
-                        "locked": float(snapshot.locked),
-                        "equity": float(snapshot.equity),
-                        "total": float(snapshot.free + snapshot.locked),
+                        "free": snapshot.free,
+                        "locked": snapshot.locked,
+                        "equity": snapshot.equity,
+                        "total": snapshot.total,
                         "timestamp": snapshot.ts.isoformat(),
                     }
-                return None
+
+            _cache_store("last", account_id, asset, version, result, LAST_SNAPSHOT_TTL_SEC)
+            return dict(result) if result else None
 
         except Exception as e:
             logger.error(f"Failed to get last snapshot: {e}")
@@ -100,86 +413,107 @@ class BalanceSnapshotLogger:
     ) -> List[Dict[str, Any]]:
         """Получает историю балансов за период"""
         try:
-            with SessionLocal() as session:
-                since = datetime.now() - timedelta(hours=hours)
-
-                snapshots = (
-                    session.query(BalanceSnapshots)
-                    .filter(
-                        BalanceSnapshots.account_id == account_id,
-                        BalanceSnapshots.asset == asset,
-                        BalanceSnapshots.ts >= since,
-                    )
-                    .order_by(BalanceSnapshots.ts.desc())
-                    .limit(limit)
-                    .all()
-                )
-
-                return [
-                    {
-                        "free": float(s.free),
-                        "locked": float(s.locked),
-                        "equity": float(s.equity),
-                        "total": float(s.free + s.locked),
-                        "timestamp": s.ts.isoformat(),
-                    }
-                    for s in snapshots
-                ]
+            stmt = _history_stmt(account_id, asset, hours, limit)
+            if limit > HISTORY_YIELD_PER:
+                # Большие выборки забираем порциями через серверный курсор;
+                # он работает только внутри транзакции — берём пишущую фабрику
+                stmt = stmt.execution_options(yield_per=HISTORY_YIELD_PER)
+                session_factory = BalanceSnapshotLogger.session_factory
+            else:
+                session_factory = BalanceSnapshotLogger.read_session_factory
+
+            with session_factory() as session:
+                return [_history_row(s) for s in session.execute(stmt)]
 
         except Exception as e:
             logger.error(f"Failed to get balance history: {e}")
             return []
 
+    @staticmethod
+    def iter_balance_history(
+        account_id: int, asset: str = "USDT", hours: int = 24, limit: Optional[int] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Потоково отдаёт историю балансов (серверный курсор, порции по
+        HISTORY_YIELD_PER строк) — для выгрузок, где список целиком не нужен.
+        Вызывающий может прервать итерацию в любой момент.
+        """
+        stmt = _history_stmt(account_id, asset, hours, limit).execution_options(
+            stream_results=True, yield_per=HISTORY_YIELD_PER
+        )
+        # Отдельное соединение: генератор живёт дольше вызова и не должен
+        # делить scoped-сессию потока с другими запросами
+        with engine.connect() as conn:
+            for s in conn.execute(stmt):
+                yield _history_row(s)
+
     @staticmethod
     def calculate_pnl_24h(account_id: int, asset: str = "USDT") -> Dict[str, float]:
         """Рассчитывает PnL за 24 часа"""
+        cached, version = _cache_lookup("pnl_24h", account_id, asset)
+        if cached is not _MISS:
+            return dict(cached)
+
         try:
-            with SessionLocal() as session:
-                now = datetime.now()
+            with BalanceSnapshotLogger.read_session_factory() as session:
+                now = utc_now()
                 day_ago = now - timedelta(hours=24)
 
-                # Снимок 24 часа назад
-                snapshot_24h = (
-                    session.query(BalanceSnapshots)
-                    .filter(
+                # Оба снимка одним запросом: (снимок 24 часа назад) UNION ALL (текущий)
+                old_leg = (
+                    select(literal("old").label("kind"), BalanceSnapshots.equity)
+                    .where(
                         BalanceSnapshots.account_id == account_id,
                         BalanceSnapshots.asset == asset,
                         BalanceSnapshots.ts <= day_ago,
                     )
                     .order_by(BalanceSnapshots.ts.desc())
-                    .first()
+                    .limit(1)
+                    .subquery()
                 )
-
-                # Текущий снимок
-                current = (
-                    session.query(BalanceSnapshots)
-                    .filter_by(account_id=account_id, asset=asset)
+                new_leg = (
+                    select(literal("new").label("kind"), BalanceSnapshots.equity)
+                    .where(
+                        BalanceSnapshots.account_id == account_id,
+                        BalanceSnapshots.asset == asset,
+                    )
                     .order_by(BalanceSnapshots.ts.desc())
-                    .first()
+                    .limit(1)
+                    .subquery()
                 )
 
-                if snapshot_24h and current:
-                    start_equity = float(snapshot_24h.equity)
-                    current_equity = float(current.equity)
+                equities = {
+                    row.kind: row.equity
+                    for row in session.execute(
+                        union_all(select(old_leg), select(new_leg))
+                    )
+                }
+
+                if "old" in equities and "new" in equities:
+                    start_equity = float(equities["old"])
+                    current_equity = float(equities["new"])
 
                     pnl_absolute = current_equity - start_equity
                     pnl_percent = (
                         (pnl_absolute / start_equity * 100) if start_equity > 0 else 0
                     )
 
-                    return {
+                    result = {
                         "pnl_24h": pnl_absolute,
                         "pnl_24h_percent": pnl_percent,
                         "start_equity": start_equity,
                         "current_equity": current_equity,
                     }
+                else:
+                    result = {
+                        "pnl_24h": 0.0,
+                        "pnl_24h_percent": 0.0,
+                        "start_equity": 0.0,
+                        "current_equity": 0.0,
+                    }
 
-                return {
-                    "pnl_24h": 0.0,
-                    "pnl_24h_percent": 0.0,
-                    "start_equity": 0.0,
-                    "current_equity": 0.0,
-                }
+            _cache_store("pnl_24h", account_id, asset, version, result, PNL_24H_TTL_SEC)
+            return dict(result)
 
         except Exception as e:
             logger.error(f"Failed to calculate 24h PnL: {e}")
@@ -191,35 +525,460 @@ class BalanceSnapshotLogger:
             }
 
     @staticmethod
-    def cleanup_old_snapshots(days: int = 30) -> int:
-        """Удаляет старые снимки"""
-        try:
-            with SessionLocal() as session:
-                cutoff_date = datetime.now() - timedelta(days=days)
+    def ensure_partitions(start: datetime, end: Optional[datetime] = None) -> int:
+        """
+        Создаёт помесячные партиции, покрывающие [start, end], плюс
+        PARTITIONS_AHEAD_MONTHS месяцев вперёд от текущего.
+        Уже созданные партиции запоминаются, повторный вызов DDL не выполняет.
 
-                deleted = (
-                    session.query(BalanceSnapshots)
-                    .filter(BalanceSnapshots.ts < cutoff_date)
-                    .delete()
-                )
+        Returns:
+            Количество созданных партиций
+        """
+        if not _is_partitioned():
+            return 0
 
-                session.commit()
+        end = max(end or start, _add_months(utc_now(), PARTITIONS_AHEAD_MONTHS))
+        months = []
+        month = _month_start(start)
+        while month <= end:
+            if month not in _known_partitions:
+                months.append(month)
+            month = _add_months(month, 1)
+        if not months:
+            return 0
 
-                if deleted > 0:
-                    logger.info(f"Cleaned up {deleted} old balance snapshots")
-                    sys_logger.log_event(
-                        "INFO",
-                        "BalanceSnapshotLogger",
-                        f"Cleaned up old snapshots",
-                        {"deleted_count": deleted, "older_than_days": days},
+        # DDL — через отдельное соединение: метод вызывается и изнутри
+        # открытой сессии (bulk_copy_snapshots), а scoped-сессия у потока одна
+        with _partition_lock:
+            with engine.begin() as conn:
+                for month in months:
+                    conn.execute(
+                        text(
+                            f"CREATE TABLE IF NOT EXISTS {_partition_name(month)} "
+                            f"PARTITION OF {BalanceSnapshots.__tablename__} "
+                            f"FOR VALUES FROM ('{month:%Y-%m-%d}') "
+                            f"TO ('{_add_months(month, 1):%Y-%m-%d}')"
+                        )
                     )
+            _known_partitions.update(months)
+
+        logger.debug(f"Balance snapshot partitions ensured: {len(months)}")
+        return len(months)
+
+    @staticmethod
+    def _drop_old_partitions(cutoff_date: datetime) -> Tuple[List[str], int]:
+        """
+        Удаляет (DROP TABLE) партиции, целиком лежащие раньше cutoff_date.
+        Возвращает (имена удалённых партиций, оценка числа строк по pg_class).
+        """
+        if not _is_partitioned():
+            return [], 0
+
+        prefix = f"{BalanceSnapshots.__tablename__}_"
+        with engine.begin() as conn:
+            partitions = conn.execute(
+                text(
+                    "SELECT c.relname, GREATEST(c.reltuples, 0)::bigint "
+                    "FROM pg_inherits i "
+                    "JOIN pg_class c ON c.oid = i.inhrelid "
+                    "JOIN pg_class p ON p.oid = i.inhparent "
+                    "WHERE p.relname = :parent AND c.relkind = 'r'"
+                ),
+                {"parent": BalanceSnapshots.__tablename__},
+            ).all()
+
+            dropped, estimated_rows = [], 0
+            for name, reltuples in partitions:
+                try:
+                    month = datetime.strptime(name[len(prefix):], "%Y_%m")
+                except ValueError:
+                    continue  # чужая/нестандартная партиция — не трогаем
+                if _add_months(month, 1) <= cutoff_date:
+                    conn.execute(text(f"DROP TABLE IF EXISTS {name}"))
+                    dropped.append(name)
+                    estimated_rows += reltuples
+
+        with _partition_lock:
+            _known_partitions.difference_update(
+                datetime.strptime(name[len(prefix):], "%Y_%m") for name in dropped
+            )
+        return dropped, estimated_rows
+
+    @staticmethod
+    def cleanup_old_snapshots(days: int = 30, batch_size: int = CLEANUP_BATCH_SIZE) -> int:
+        """
+        Удаляет старые снимки.
+
+        Партиции, целиком лежащие до cutoff, удаляются через DROP TABLE (O(1)).
+        Остаток удаляется порциями по batch_size строк, каждая порция —
+        отдельная короткая транзакция:
+        DELETE ... WHERE id IN (SELECT id ... LIMIT :batch FOR UPDATE SKIP LOCKED),
+        поэтому память и время удержания блокировок ограничены.
+        Для удалённых партиций в результат идёт оценка числа строк по статистике.
+        """
+        deleted = 0
+        dropped: List[str] = []
+        try:
+            cutoff_date = utc_now() - timedelta(days=days)
+
+            dropped, deleted = BalanceSnapshotLogger._drop_old_partitions(cutoff_date)
+
+            ids_batch = (
+                select(BalanceSnapshots.id)
+                .where(BalanceSnapshots.ts < cutoff_date)
+                .limit(batch_size)
+                .with_for_update(skip_locked=True)
+            )
+            stmt = (
+                delete(BalanceSnapshots)
+                .where(BalanceSnapshots.id.in_(ids_batch))
+                .execution_options(synchronize_session=False)
+            )
+
+            with BalanceSnapshotLogger.session_factory() as session:
+                while True:
+                    affected = session.execute(stmt).rowcount
+                    session.commit()
+                    deleted += affected
+                    if affected < batch_size:
+                        break
+
+            if deleted > 0 or dropped:
+                _cache_clear()
+                logger.info(f"Cleaned up {deleted} old balance snapshots")
+                sys_logger.log_event(
+                    "INFO",
+                    "BalanceSnapshotLogger",
+                    f"Cleaned up old snapshots",
+                    {
+                        "deleted_count": deleted,
+                        "older_than_days": days,
+                        "dropped_partitions": dropped,
+                    },
+                )
 
-                return deleted
+            return deleted
 
         except Exception as e:
             logger.error(f"Failed to cleanup old snapshots: {e}")
-            return 0
+            return deleted
+
+
+def _history_stmt(account_id: int, asset: str, hours: int, limit: Optional[int]):
+    """SELECT истории балансов за последние hours часов (новые сверху)"""
+    since = utc_now() - timedelta(hours=hours)
+    stmt = (
+        select(
+            BalanceSnapshots.free,
+            BalanceSnapshots.locked,
+            BalanceSnapshots.equity,
+            (BalanceSnapshots.free + BalanceSnapshots.locked).label("total"),
+            BalanceSnapshots.ts,
+        )
+        .where(
+            BalanceSnapshots.account_id == account_id,
+            BalanceSnapshots.asset == asset,
+            BalanceSnapshots.ts >= since,
+        )
+        .order_by(BalanceSnapshots.ts.desc())
+    )
+    return stmt.limit(limit) if limit is not None else stmt
+
+
+def _history_row(s) -> Dict[str, Any]:
+    return {
+        "free": s.free,
+        "locked": s.locked,
+        "equity": s.equity,
+        "total": s.total,
+        "timestamp": s.ts.isoformat(),
+    }
+
+
+def _month_start(dt: datetime) -> datetime:
+    return datetime(dt.year, dt.month, 1)
+
+
+def _add_months(dt: datetime, months: int) -> datetime:
+    """Первое число месяца, отстоящего от dt на months"""
+    index = dt.year * 12 + dt.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def _partition_name(month: datetime) -> str:
+    return f"{BalanceSnapshots.__tablename__}_{month:%Y_%m}"
+
+
+def _is_partitioned() -> bool:
+    """Проверяет (один раз на процесс), партиционирована ли таблица в БД"""
+    global _partitioned
+    if _partitioned is None:
+        with engine.connect() as conn:
+            _partitioned = bool(
+                conn.execute(
+                    text(
+                        "SELECT 1 FROM pg_partitioned_table pt "
+                        "JOIN pg_class c ON c.oid = pt.partrelid "
+                        "WHERE c.relname = :name"
+                    ),
+                    {"name": BalanceSnapshots.__tablename__},
+                ).first()
+            )
+        if not _partitioned:
+            logger.warning(
+                "balance_snapshots is not partitioned; partition maintenance disabled"
+            )
+    return _partitioned
+
+
+def _copy_binary(cursor, payload: bytes) -> None:
+    """Отправляет готовый бинарный COPY-поток в balance_snapshots"""
+    copy_sql = (
+        f"COPY {BalanceSnapshots.__tablename__} ({', '.join(COPY_COLUMNS)}) "
+        "FROM STDIN WITH (FORMAT BINARY)"
+    )
+    if hasattr(cursor, "copy_expert"):
+        # psycopg2
+        cursor.copy_expert(copy_sql, io.BytesIO(payload))
+    else:
+        # psycopg 3
+        with cursor.copy(copy_sql) as copy:
+            copy.write(payload)
+
+
+def _encode_copy_binary_np(account_id: int, asset: str, rows_np, ts_us) -> bytes:
+    """
+    Векторная сборка бинарного COPY-потока: при общих account_id/asset
+    строка имеет фиксированный размер и описывается big-endian dtype.
+    """
+    asset_b = asset.encode("utf-8")
+    row_dtype = np.dtype(
+        [
+            ("nfields", ">i2"),
+            ("len_account", ">i4"), ("account_id", ">i4"),
+            ("len_asset", ">i4"), ("asset", f"S{len(asset_b)}"),
+            ("len_free", ">i4"), ("free", ">f8"),
+            ("len_locked", ">i4"), ("locked", ">f8"),
+            ("len_equity", ">i4"), ("equity", ">f8"),
+            ("len_ts", ">i4"), ("ts", ">i8"),
+        ]
+    )
+    out = np.empty(len(rows_np), dtype=row_dtype)
+    out["nfields"] = len(COPY_COLUMNS)
+    out["len_account"] = 4
+    out["account_id"] = account_id
+    out["len_asset"] = len(asset_b)
+    out["asset"] = asset_b
+    out["len_free"] = out["len_locked"] = out["len_equity"] = out["len_ts"] = 8
+    out["free"] = rows_np["free"]
+    out["locked"] = rows_np["locked"]
+    out["equity"] = rows_np["equity"]
+    out["ts"] = (ts_us - np.datetime64(_PG_EPOCH, "us")).astype(np.int64)
+    return _PGCOPY_HEADER + out.tobytes() + _PGCOPY_TRAILER
+
+
+def _encode_copy_binary(rows: List[Dict[str, Any]]) -> bytes:
+    """Кодирует строки в бинарный формат COPY (int4, text, float8 x3, timestamp)"""
+    buf = bytearray(_PGCOPY_HEADER)
+    pack_row = struct.Struct(">hii").pack          # кол-во полей, len, account_id
+    pack_tail = struct.Struct(">idididiq").pack    # free, locked, equity, ts
+    for row in rows:
+        asset = row["asset"].encode("utf-8")
+        ts = row["ts"] - _PG_EPOCH
+        buf += pack_row(len(COPY_COLUMNS), 4, row["account_id"])
+        buf += struct.pack(">i", len(asset)) + asset
+        buf += pack_tail(
+            8, row["free"], 8, row["locked"], 8, row["equity"], 8,
+            (ts.days * 86_400 + ts.seconds) * 1_000_000 + ts.microseconds,
+        )
+    buf += _PGCOPY_TRAILER
+    return bytes(buf)
+
+
+def _cache_lookup(kind: str, account_id: int, asset: str) -> Tuple[Any, int]:
+    """
+    Возвращает (значение | _MISS, текущая версия пары).
+    Версию нужно передать в _cache_store, чтобы запись, пришедшая во время
+    запроса к БД, не «законсервировала» устаревший результат.
+    """
+    with _cache_lock:
+        version = _cache_versions.get((account_id, asset), 0)
+        entry = _read_cache.get((kind, account_id, asset))
+
+    if entry is None:
+        return _MISS, version
+
+    expires_at, entry_version, value = entry
+    if entry_version != version or expires_at < time.monotonic():
+        return _MISS, version
+    return value, version
+
+
+def _cache_store(
+    kind: str, account_id: int, asset: str, version: int, value: Any, ttl: float
+) -> None:
+    """Кладёт результат в кэш с TTL"""
+    with _cache_lock:
+        _read_cache[(kind, account_id, asset)] = (time.monotonic() + ttl, version, value)
+
+
+def _cache_invalidate(pairs: Iterable[Tuple[int, str]]) -> None:
+    """Инвалидирует кэш для пар (account_id, asset) увеличением версии"""
+    with _cache_lock:
+        for pair in pairs:
+            _cache_versions[pair] = _cache_versions.get(pair, 0) + 1
+
+
+def _cache_clear() -> None:
+    """Полностью очищает кэш чтений"""
+    with _cache_lock:
+        _read_cache.clear()
+
+
+async def _get_async_pool():
+    """Лениво открывает AsyncConnectionPool (None, если psycopg не установлен)"""
+    global _async_pool
+    if AsyncConnectionPool is None:
+        return None
+    if _async_pool is None:
+        conninfo = engine.url.set(drivername="postgresql").render_as_string(
+            hide_password=False
+        )
+        pool = AsyncConnectionPool(
+            conninfo, min_size=1, max_size=ASYNC_POOL_MAX_SIZE, open=False
+        )
+        await pool.open()
+        _async_pool = pool
+    return _async_pool
+
+
+async def _write_batch_async(batch: List[Dict[str, Any]]) -> int:
+    """
+    Пишет пачку одним executemany (psycopg pipeline) и одним коммитом.
+    При ошибке пачка повторяется через _write_rows (построчно, если нужно);
+    недоступность БД пробрасывается вызывающему.
+    """
+    pool = await _get_async_pool()
+    if pool is None:
+        return await asyncio.to_thread(_write_rows, batch)
+
+    try:
+        # Строки из буфера уже несут ts момента log_balance_snapshot
+        await asyncio.to_thread(
+            BalanceSnapshotLogger.ensure_partitions,
+            min(r["ts"] for r in batch),
+            max(r["ts"] for r in batch),
+        )
+
+        insert_sql = (
+            f"INSERT INTO {BalanceSnapshots.__tablename__} ({', '.join(COPY_COLUMNS)}) "
+            f"VALUES ({', '.join(['%s'] * len(COPY_COLUMNS))})"
+        )
+        # Соединение из пула коммитит транзакцию при выходе из блока
+        async with pool.connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.executemany(
+                    insert_sql, [tuple(r[c] for c in COPY_COLUMNS) for r in batch]
+                )
+
+        _cache_invalidate({(r["account_id"], r["asset"]) for r in batch})
+        logger.debug(f"Balance snapshots flushed (async): {len(batch)} rows")
+        return len(batch)
+
+    except Exception as e:
+        logger.warning(f"Async write of {len(batch)} balance snapshots failed, retrying: {e}")
+        return await asyncio.to_thread(_write_rows, batch)
+
+
+def _write_rows(rows: List[Dict[str, Any]]) -> int:
+    """
+    Пишет строки одним INSERT и одним коммитом. Если пачка не прошла
+    из-за данных, строки пишутся по одной и отбрасываются только
+    сбойные. Недоступность БД (OperationalError/InterfaceError)
+    пробрасывается; в rows при этом остаются только незаписанные строки.
+    """
+    BalanceSnapshotLogger.ensure_partitions(
+        min(r["ts"] for r in rows), max(r["ts"] for r in rows)
+    )
+
+    session_factory = BalanceSnapshotLogger.session_factory
+    try:
+        with session_factory() as session:
+            session.execute(insert(BalanceSnapshots), rows)
+            session.commit()
+        written = rows
+    except (OperationalError, InterfaceError):
+        raise
+    except Exception as e:
+        logger.warning(f"Batch write of {len(rows)} balance snapshots failed, retrying row by row: {e}")
+        written = []
+        for i, row in enumerate(rows):
+            try:
+                with session_factory() as session:
+                    session.execute(insert(BalanceSnapshots), [row])
+                    session.commit()
+                written.append(row)
+            except (OperationalError, InterfaceError):
+                del rows[:i]
+                _cache_invalidate({(r["account_id"], r["asset"]) for r in written})
+                raise
+            except Exception as row_error:
+                logger.error(f"Dropped balance snapshot {row.get('account_id')}/{row.get('asset')}: {row_error}")
+
+    # Новые снимки видны в БД — сбрасываем кэш затронутых пар
+    _cache_invalidate({(r["account_id"], r["asset"]) for r in written})
+
+    logger.debug(f"Balance snapshots flushed: {len(written)} rows")
+    return len(written)
+
+
+def _requeue(batch: List[Dict[str, Any]]) -> None:
+    """Возвращает несохранённую пачку в начало буфера (в пределах MAX_BUFFER_SIZE)"""
+    with _buffer_lock:
+        room = MAX_BUFFER_SIZE - len(_buffer)
+        if room < len(batch):
+            logger.error(f"Balance snapshot buffer full, dropped {len(batch) - max(room, 0)} oldest rows")
+            batch = batch[len(batch) - max(room, 0):]
+        _buffer.extendleft(reversed(batch))
+
+
+def _flusher_loop() -> None:
+    """Фоновый поток: периодически сбрасывает буфер в БД"""
+    while True:
+        _flush_event.wait(FLUSH_INTERVAL_SEC)
+        _flush_event.clear()
+        try:
+            BalanceSnapshotLogger.flush()
+        except Exception as e:
+            logger.error(f"Balance snapshot flusher error: {e}")
+
+
+def _enqueue(rows: Iterable[Dict[str, Any]]) -> None:
+    """Добавляет строки в буфер и при необходимости будит фоновый поток"""
+    global _flusher_thread
+
+    wakeup = _async_wakeup
+
+    with _buffer_lock:
+        _buffer.extend(rows)
+        pending = len(_buffer)
+
+        if wakeup is None and (_flusher_thread is None or not _flusher_thread.is_alive()):
+            _flusher_thread = threading.Thread(
+                target=_flusher_loop, name="BalanceSnapshotFlusher", daemon=True
+            )
+            _flusher_thread.start()
+
+    if pending >= BATCH_SIZE:
+        if wakeup is not None:
+            loop, event = wakeup
+            loop.call_soon_threadsafe(event.set)
+        else:
+            _flush_event.set()
+
 
+# Дописываем хвост буфера при завершении процесса
+atexit.register(BalanceSnapshotLogger.flush)
 
 # Глобальный экземпляр
 balance_logger = BalanceSnapshotLogger()
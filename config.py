@@ -1,6 +1,7 @@
 # ---------- config.py (фрагмент: ключи/URL/окружение) ----------
 from __future__ import annotations
 import os
+from types import MappingProxyType
 from typing import Optional, Tuple  # ← ДОБАВЛЕНО: импорт типов
 
 # --- credentials store import for DB-first resolution ---
@@ -47,11 +48,34 @@ API_BACKOFF_MAX = SAFE_MODE["api_backoff_max"]
 ENVIRONMENT = os.getenv("ENVIRONMENT", "prod").lower()
 BYBIT_TESTNET = (ENVIRONMENT == "testnet")
 
+# Эндпойнты Bybit по окружению — таблица вместо ветвлений, выбор один раз при импорте.
+# Порядок в кортеже совпадает с ENDPOINT_NAMES. Донор (SOURCE_*) и публичный
+# поток — всегда mainnet; окружение влияет только на основной REST.
+ENDPOINT_NAMES = ("MAIN_API_URL", "SOURCE_API_URL", "SOURCE_WS_URL", "PUBLIC_WS_URL")
+BYBIT_ENDPOINTS = MappingProxyType({
+    "prod": (
+        "https://api.bybit.com", "https://api.bybit.com",
+        "wss://stream.bybit.com/v5/private", "wss://stream.bybit.com/v5/public/linear",
+    ),
+    "demo": (
+        "https://api-demo.bybit.com", "https://api.bybit.com",
+        "wss://stream.bybit.com/v5/private", "wss://stream.bybit.com/v5/public/linear",
+    ),
+    "testnet": (
+        "https://api-testnet.bybit.com", "https://api.bybit.com",
+        "wss://stream.bybit.com/v5/private", "wss://stream.bybit.com/v5/public/linear",
+    ),
+})
+
+
+def resolve_endpoints(env: str) -> Tuple[str, str, str, str]:
+    """Эндпойнты окружения env с учётом override'ов из .env (MAIN_API_URL и т.д.)"""
+    defaults = BYBIT_ENDPOINTS.get(env, BYBIT_ENDPOINTS["prod"])
+    return tuple(os.getenv(name, url) for name, url in zip(ENDPOINT_NAMES, defaults))
+
+
 # URL'ы как в работающем коде
-SOURCE_API_URL = os.getenv("SOURCE_API_URL", "https://api.bybit.com")
-MAIN_API_URL   = os.getenv("MAIN_API_URL",   "https://api.bybit.com")
-SOURCE_WS_URL  = os.getenv("SOURCE_WS_URL",  "wss://stream.bybit.com/v5/private")
-PUBLIC_WS_URL  = os.getenv("PUBLIC_WS_URL",  "wss://stream.bybit.com/v5/public/linear")
+MAIN_API_URL, SOURCE_API_URL, SOURCE_WS_URL, PUBLIC_WS_URL = resolve_endpoints(ENVIRONMENT)
 
 # Реквизиты (recv_window и т.д.) оставь свои
 BYBIT_RECV_WINDOW = int(os.getenv("BYBIT_RECV_WINDOW", "20000"))
@@ -67,15 +91,23 @@ DEFAULT_DONOR_ACCOUNT_ID = int(os.getenv("DEFAULT_DONOR_ACCOUNT_ID", str(DONOR_A
 
 
 # --- helpers для вытягивания ключей из БД (или ENV как фолбэк) ---
+def _get_store():
+    """
+    CredentialsStore процесса: фабрика кэширует его по BOT_MASTER_KEY,
+    так что разбор мастер-ключа и создание AEAD выполняются один раз.
+    """
+    # ЖЁСТКОЕ хранилище с БД+шифрованием (как использует /keys)
+    from app.database_security_implementation import create_credentials_store
+    return create_credentials_store()
+
+
 def _get_db_creds(account_id: int) -> Optional[Tuple[str, str]]:
     """
     Получение credentials из БД.
     Возвращает (api_key, api_secret) или None.
     """
     try:
-        # ЖЁСТКОЕ хранилище с БД+шифрованием (как использует /keys)
-        from app.database_security_implementation import CredentialsStore
-        store = CredentialsStore()
+        store = _get_store()
         creds = store.get_account_credentials(account_id)
         # ожидание (key, secret) либо None
         if creds and all(creds):
@@ -88,18 +120,36 @@ def _get_db_creds(account_id: int) -> Optional[Tuple[str, str]]:
         return None
 
 
-def _resolve(account_id: int, env_key_name: str, env_secret_name: str) -> Tuple[str, str]:  # ← ДОБАВЛЕНА типизация
+def _get_db_creds_many(account_ids: list[int]) -> dict[int, Tuple[str, str]]:
+    """
+    Пакетное получение credentials из БД одним запросом.
+    Возвращает {account_id: (api_key, api_secret)} только для найденных.
+    """
+    try:
+        found = _get_store().get_accounts_credentials(account_ids)
+        return {acc_id: creds for acc_id, creds in found.items() if creds and all(creds)}
+    except Exception:
+        logger.exception("config._get_db_creds_many() failed for account_ids=%s", account_ids)
+        return {}
+
+
+def _resolve(account_id: int, env_key_name: str, env_secret_name: str,
+             prefetched: Optional[dict[int, Tuple[str, str]]] = None) -> Tuple[str, str]:  # ← ДОБАВЛЕНА типизация
     """
     Резолвинг credentials с приоритетом БД > ENV
     Args:
         account_id: ID аккаунта
         env_key_name: Имя переменной окружения для ключа
         env_secret_name: Имя переменной окружения для секрета
+        prefetched: Результат _get_db_creds_many (чтобы не ходить в БД повторно)
     Returns:
         Tuple[str, str]: (api_key, api_secret)
     """
     # 1) БД (основной источник)
-    creds = _get_db_creds(account_id)
+    if prefetched is not None:
+        creds = prefetched.get(account_id)
+    else:
+        creds = _get_db_creds(account_id)
     if creds:
         return creds
     # 2) Фолбэк из ENV (на дев-машине можно временно задать)
@@ -185,8 +235,10 @@ def get_api_credentials_with_source(account_id: int) -> Tuple[str, str, str]:
 COPY_LEVERAGE = os.getenv('COPY_LEVERAGE', 'true').lower() == 'true'
 
 # -------- СНАЧАЛА вычисляем основные пары ключей --------
-MAIN_API_KEY,   MAIN_API_SECRET   = _resolve(TARGET_ACCOUNT_ID, "MAIN_API_KEY",   "MAIN_API_SECRET")
-SOURCE_API_KEY, SOURCE_API_SECRET = _resolve(DONOR_ACCOUNT_ID,  "SOURCE_API_KEY", "SOURCE_API_SECRET")
+# Оба аккаунта — одним запросом к БД
+_STARTUP_DB_CREDS = _get_db_creds_many([TARGET_ACCOUNT_ID, DONOR_ACCOUNT_ID])
+MAIN_API_KEY,   MAIN_API_SECRET   = _resolve(TARGET_ACCOUNT_ID, "MAIN_API_KEY",   "MAIN_API_SECRET",   _STARTUP_DB_CREDS)
+SOURCE_API_KEY, SOURCE_API_SECRET = _resolve(DONOR_ACCOUNT_ID,  "SOURCE_API_KEY", "SOURCE_API_SECRET", _STARTUP_DB_CREDS)
 
 # -------- Потом публикуем алиасы совместимости --------
 BYBIT_API_KEY    = MAIN_API_KEY     # так импортирует enhanced_trading_system_final_fixed.py
@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
-import os, json, base64, binascii, secrets
-from datetime import datetime
+import os, json, base64, binascii, secrets, threading
+from functools import lru_cache
 from typing import Optional, Tuple
 
 from cryptography.hazmat.primitives.kdf.hkdf import HKDF
@@ -9,7 +9,7 @@ from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 from cryptography.hazmat.primitives import hashes, constant_time
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 
-from .db_session import SessionLocal
+from .db_session import SessionLocal, utc_now
 from .db_models import ApiCredentials, SysEvents
 
 PBKDF2_ITERS = 200_000
@@ -32,7 +32,12 @@ def _derive_master_key(raw: str) -> bytes:
       - если raw похоже на base64 -> decode
       - если raw похоже на hex    -> decode
       - иначе считаем 'парольной фразой' и делаем PBKDF2-HMAC(SHA256)
+    Результат кэшируется на процесс: PBKDF2 (200k итераций) выполняется один раз.
     """
+    return _derive_master_key_cached(raw, os.getenv("BOT_MASTER_SALT", ""))
+
+@lru_cache(maxsize=4)
+def _derive_master_key_cached(raw: str, salt_env: str) -> bytes:
     b = _b64_try(raw)
     if b is None:
         b = _hex_try(raw)
@@ -41,7 +46,6 @@ def _derive_master_key(raw: str) -> bytes:
             raise ValueError("BOT_MASTER_KEY after decode must be 32 bytes")
         return b
 
-    salt_env = os.getenv("BOT_MASTER_SALT", "")
     salt = _b64_try(salt_env) or _hex_try(salt_env) or salt_env.encode("utf-8")
     if not salt:
         raise ValueError("Provide BOT_MASTER_SALT for PBKDF2 when using passphrase BOT_MASTER_KEY")
@@ -52,17 +56,28 @@ def _hkdf_expand(master: bytes, info: bytes) -> bytes:
     hkdf = HKDF(algorithm=hashes.SHA256(), length=32, salt=None, info=info)
     return hkdf.derive(master)
 
+# Разделитель ключа и секрета в общем plaintext (управляющий символ US,
+# в API-ключах не встречается)
+PAIR_SEPARATOR = b"\x1f"
+
 class CredentialsStore:
     """
-    AES-GCM с одним nonce на запись и двумя ПОДКЛЮЧАМИ (HKDF):
+    AES-GCM, одна операция на пару: payload = api_key || 0x1F || api_secret
+    шифруется подключом HKDF(master, info=b"api_pair") со свежим nonce.
+    Ciphertext кладётся в enc_key, enc_secret остаётся пустым — схема не меняется.
+
+    Старые записи (enc_secret непустой) расшифровываются прежней схемой
+    с двумя ПОДКЛЮЧАМИ (HKDF):
       - key_enc_key     = HKDF(master, info=b"api_key")
       - key_enc_secret  = HKDF(master, info=b"api_secret")
-    Это устраняет риск 'nonce reuse' в пределах одной записи без изменения схемы.
     """
     def __init__(self) -> None:
         self._master_key: Optional[bytes] = None
         self._k_api_key: Optional[bytes] = None
         self._k_api_secret: Optional[bytes] = None
+        self._aead_key: Optional[AESGCM] = None
+        self._aead_sec: Optional[AESGCM] = None
+        self._aead_pair: Optional[AESGCM] = None
 
     def init(self) -> None:
         raw = os.getenv("BOT_MASTER_KEY")
@@ -72,26 +87,29 @@ class CredentialsStore:
         self._master_key = master
         self._k_api_key = _hkdf_expand(master, b"api_key")
         self._k_api_secret = _hkdf_expand(master, b"api_secret")
+        # AESGCM-объекты создаём один раз и переиспользуем в encrypt/decrypt
+        self._aead_key = AESGCM(self._k_api_key)
+        self._aead_sec = AESGCM(self._k_api_secret)
+        self._aead_pair = AESGCM(_hkdf_expand(master, b"api_pair"))
 
     def encrypt_pair(self, api_key: str, api_secret: str) -> tuple[bytes, bytes, bytes]:
-        if self._k_api_key is None:
+        if self._aead_pair is None:
             self.init()
-        assert self._k_api_key and self._k_api_secret
+        assert self._aead_pair
         nonce = secrets.token_bytes(12)
-        aead_key = AESGCM(self._k_api_key)
-        aead_sec = AESGCM(self._k_api_secret)
-        enc_key = aead_key.encrypt(nonce, api_key.encode("utf-8"), None)
-        enc_sec = aead_sec.encrypt(nonce, api_secret.encode("utf-8"), None)
-        return enc_key, enc_sec, nonce
+        payload = api_key.encode("utf-8") + PAIR_SEPARATOR + api_secret.encode("utf-8")
+        return self._aead_pair.encrypt(nonce, payload, None), b"", nonce
 
     def decrypt_pair(self, enc_key: bytes, enc_secret: bytes, nonce: bytes) -> tuple[str, str]:
-        if self._k_api_key is None:
+        if self._aead_pair is None:
             self.init()
-        assert self._k_api_key and self._k_api_secret
-        aead_key = AESGCM(self._k_api_key)
-        aead_sec = AESGCM(self._k_api_secret)
-        key = aead_key.decrypt(nonce, enc_key, None).decode("utf-8")
-        sec = aead_sec.decrypt(nonce, enc_secret, None).decode("utf-8")
+        assert self._aead_pair and self._aead_key and self._aead_sec
+        if not enc_secret:
+            key_b, _, sec_b = self._aead_pair.decrypt(nonce, enc_key, None).partition(PAIR_SEPARATOR)
+            return key_b.decode("utf-8"), sec_b.decode("utf-8")
+        # legacy: два подключа, общий nonce
+        key = self._aead_key.decrypt(nonce, enc_key, None).decode("utf-8")
+        sec = self._aead_sec.decrypt(nonce, enc_secret, None).decode("utf-8")
         return key, sec
 
     @staticmethod
@@ -114,7 +132,7 @@ class CredentialsStore:
                 row.enc_secret = enc_secret
                 row.nonce = nonce
                 row.key_hint = hint
-                row.updated_at = datetime.utcnow()
+                row.updated_at = utc_now()
             session.add(SysEvents(level="INFO", component="CredentialsStore",
                                   message=f"Credentials {action}",
                                   details_json={"account_id": account_id}))
@@ -126,3 +144,16 @@ class CredentialsStore:
             if not row:
                 return None
             return self.decrypt_pair(row.enc_key, row.enc_secret, row.nonce)
+
+
+_default_store: Optional[CredentialsStore] = None
+_default_store_lock = threading.Lock()
+
+def get_credentials_store() -> CredentialsStore:
+    """Общий на процесс экземпляр CredentialsStore (ключи выводятся один раз)."""
+    global _default_store
+    if _default_store is None:
+        with _default_store_lock:
+            if _default_store is None:
+                _default_store = CredentialsStore()
+    return _default_store
@@ -24,34 +24,322 @@ project_root/
     config_loader.py
 """
 
+import atexit
 import os
+import queue
+import re
+import select as _select
 import sys
 import asyncio
 import logging
 import secrets
 import base64
+import hmac
+import threading
+import time
+from functools import lru_cache
 from pathlib import Path
-from datetime import datetime as _dt
+from datetime import datetime as _dt, timezone as _tz
 from typing import Optional, Dict, Any, List, Tuple
+from collections import OrderedDict
 import json
+import struct
+
+from sqlalchemy import delete, insert, literal_column, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+try:
+    # Опционально: orjson сериализует сразу в UTF-8 bytes
+    import orjson
+except ImportError:
+    orjson = None
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # --- УСТОЙЧИВЫЕ ИМПОРТЫ БД (без EventLevelEnum) ---
-try:
-    # Пакетный запуск
-    from app.db_session import SessionLocal
-    from app.db_models import ApiCredentials, SysEvents
-except Exception:
+@lru_cache(maxsize=1)
+def _resolve_db() -> Tuple[Any, Any, Any]:
+    """
+    Один раз разрешает (ScopedSession, ApiCredentials, SysEvents):
+    сначала пакетный запуск (app.*), затем топ-левел. Вызывается лениво,
+    поэтому импорт модуля (например, только ради CryptoStore) не тянет БД
+    и не создаёт циклов импорта.
+    """
+    try:
+        # Пакетный запуск
+        from app.db_session import ScopedSession
+        from app.db_models import ApiCredentials, SysEvents
+    except Exception:
+        try:
+            # Топ-левел запуск
+            from db_session import ScopedSession
+            from db_models import ApiCredentials, SysEvents
+        except Exception:
+            logger.exception("DB imports failed")
+            raise
+    return ScopedSession, ApiCredentials, SysEvents
+
+
+# ================================
+# КЭШ РАСШИФРОВАННЫХ CREDENTIALS
+# ================================
+
+# Общий для всех экземпляров CredentialsStore: set/delete в любом экземпляре
+# сразу инвалидируют запись, изменения из других процессов приходят через
+# LISTEN/NOTIFY (см. ниже), а TTL — страховка на случай потери соединения
+CREDENTIALS_CACHE_TTL_SEC = 60.0
+# LRU-граница: горячие аккаунты остаются в памяти, редкие вытесняются
+CREDENTIALS_CACHE_MAXSIZE = 256
+
+_creds_cache: "OrderedDict[int, Tuple[float, Tuple[str, str]]]" = OrderedDict()
+_creds_cache_lock = threading.Lock()
+
+
+def _creds_cache_get(account_id: int) -> Optional[Tuple[str, str]]:
+    with _creds_cache_lock:
+        entry = _creds_cache.get(account_id)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del _creds_cache[account_id]
+            return None
+        _creds_cache.move_to_end(account_id)
+        return entry[1]
+
+
+def _creds_cache_put(account_id: int, creds: Tuple[str, str]) -> None:
+    _ensure_credentials_listener()
+    with _creds_cache_lock:
+        _creds_cache[account_id] = (time.monotonic() + CREDENTIALS_CACHE_TTL_SEC, creds)
+        _creds_cache.move_to_end(account_id)
+        while len(_creds_cache) > CREDENTIALS_CACHE_MAXSIZE:
+            _creds_cache.popitem(last=False)
+
+
+def invalidate_credentials_cache(account_id: Optional[int] = None) -> None:
+    """Сбрасывает кэш credentials для аккаунта (или целиком, если account_id=None)"""
+    with _creds_cache_lock:
+        if account_id is None:
+            _creds_cache.clear()
+        else:
+            _creds_cache.pop(account_id, None)
+
+
+# Межпроцессная инвалидация: триггер на api_credentials шлёт
+# pg_notify(CREDENTIALS_NOTIFY_CHANNEL, account_id), фоновый поток с LISTEN
+# сбрасывает запись. Поток стартует при первом попадании чего-либо в кэш.
+CREDENTIALS_NOTIFY_CHANNEL = "api_credentials_changed"
+CREDENTIALS_LISTEN_RETRY_SEC = 5.0
+
+_listener_thread: Optional[threading.Thread] = None
+_listener_lock = threading.Lock()
+
+
+def _ensure_credentials_listener() -> None:
+    global _listener_thread
+    if _listener_thread is not None:
+        return
+    with _listener_lock:
+        if _listener_thread is None:
+            _listener_thread = threading.Thread(
+                target=_credentials_listen_loop, name="CredentialsListener", daemon=True
+            )
+            _listener_thread.start()
+
+
+def _on_credentials_notify(payload: str) -> None:
+    try:
+        invalidate_credentials_cache(int(payload))
+    except ValueError:
+        invalidate_credentials_cache()
+
+
+def _credentials_listen_loop() -> None:
+    """LISTEN на отдельном (вынутом из пула) соединении; при обрыве — переподключение"""
+    try:
+        from app.db_session import engine
+    except Exception:
+        from db_session import engine
+
+    if engine.dialect.name != "postgresql":
+        return
+
+    while True:
+        raw = None
+        try:
+            raw = engine.raw_connection()
+            conn = raw.driver_connection
+            raw.detach()
+            conn.autocommit = True
+            cursor = conn.cursor()
+            cursor.execute(f"LISTEN {CREDENTIALS_NOTIFY_CHANNEL}")
+            # Уведомления, пропущенные пока соединения не было
+            invalidate_credentials_cache()
+
+            if callable(getattr(conn, "notifies", None)):
+                # psycopg 3: блокирующий генератор уведомлений
+                for notify in conn.notifies():
+                    _on_credentials_notify(notify.payload)
+            else:
+                # psycopg2: ждём готовности сокета, затем poll()
+                while True:
+                    if _select.select([conn], [], [], 60.0)[0]:
+                        conn.poll()
+                        while conn.notifies:
+                            _on_credentials_notify(conn.notifies.pop(0).payload)
+        except Exception as e:
+            logger.warning("Credentials listener error: %s", e)
+        finally:
+            if raw is not None:
+                try:
+                    raw.close()
+                except Exception:
+                    pass
+        time.sleep(CREDENTIALS_LISTEN_RETRY_SEC)
+
+
+# ================================
+# ФОНОВАЯ ЗАПИСЬ АУДИТА (SysEvents)
+# ================================
+
+# События CredentialsStore не пишутся в транзакции с credentials: они
+# ставятся в очередь и вставляются фоновым потоком пачками до
+# AUDIT_BATCH_SIZE одним executemany. При выходе очередь дописывается.
+AUDIT_BATCH_SIZE = 100
+
+_audit_queue: "queue.Queue[Dict[str, Any]]" = queue.Queue()
+_audit_thread: Optional[threading.Thread] = None
+_audit_thread_lock = threading.Lock()
+
+
+def _audit_event(message: str, details: Dict[str, Any], level: str = "INFO") -> None:
+    """Ставит событие CredentialsStore в очередь на запись в sys_events"""
+    global _audit_thread
+    _audit_queue.put({
+        "level": level,
+        "component": "CredentialsStore",
+        "message": message,
+        "details_json": details,
+    })
+    if _audit_thread is None:
+        with _audit_thread_lock:
+            if _audit_thread is None:
+                _audit_thread = threading.Thread(
+                    target=_audit_writer_loop, name="credentials-audit", daemon=True
+                )
+                _audit_thread.start()
+
+
+def _write_audit_batch(batch: List[Dict[str, Any]]) -> None:
+    Session, _, SysEvents = _resolve_db()
     try:
-        # Топ-левел запуск
-        from db_session import SessionLocal
-        from db_models import ApiCredentials, SysEvents
+        with Session() as session:
+            session.execute(insert(SysEvents), batch)
+            session.commit()
     except Exception as e:
-        logger.exception("DB imports failed")
-        raise
+        logger.error("Failed to write %d audit events: %s", len(batch), e)
+
+
+def _drain_audit_queue(first: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    batch = [first] if first is not None else []
+    while len(batch) < AUDIT_BATCH_SIZE:
+        try:
+            batch.append(_audit_queue.get_nowait())
+        except queue.Empty:
+            break
+    return batch
+
+
+def _write_and_ack(batch: List[Dict[str, Any]]) -> None:
+    try:
+        _write_audit_batch(batch)
+    finally:
+        for _ in batch:
+            _audit_queue.task_done()
+
+
+def _audit_writer_loop() -> None:
+    while True:
+        _write_and_ack(_drain_audit_queue(_audit_queue.get()))
+
+
+def flush_audit_events() -> None:
+    """
+    Синхронно дописывает очередь аудита и дожидается пачки,
+    которую фоновый поток уже взял в работу.
+    """
+    while True:
+        batch = _drain_audit_queue()
+        if not batch:
+            break
+        _write_and_ack(batch)
+    _audit_queue.join()
+
+
+atexit.register(flush_audit_events)
+
+
+# Учёт чтений credentials вместо UPDATE last_used на каждый GET: счётчики
+# копятся в памяти и раз в CREDENTIALS_USAGE_FLUSH_SEC уходят одной
+# записью "Credentials used" через очередь аудита
+CREDENTIALS_USAGE_FLUSH_SEC = 60.0
+
+_creds_usage: Dict[int, int] = {}
+_creds_usage_lock = threading.Lock()
+_creds_usage_flushed_at = time.monotonic()
+
+
+def _note_credentials_use(account_ids) -> None:
+    global _creds_usage, _creds_usage_flushed_at
+    now = time.monotonic()
+    with _creds_usage_lock:
+        for account_id in account_ids:
+            _creds_usage[account_id] = _creds_usage.get(account_id, 0) + 1
+        if now - _creds_usage_flushed_at < CREDENTIALS_USAGE_FLUSH_SEC:
+            return
+        usage, _creds_usage = _creds_usage, {}
+        _creds_usage_flushed_at = now
+    _audit_event("Credentials used", {"reads": {str(k): v for k, v in usage.items()}})
+
+
+# ================================
+# ФОРМАТ ЗАШИФРОВАННОЙ ПАРЫ
+# ================================
+
+# Ключ и секрет шифруются ОДНОЙ операцией AEAD со своим nonce:
+#   plaintext = len(key):u32be || key || len(secret):u32be || secret
+# Результат пишется в enc_key, enc_secret остаётся пустым (схема та же).
+# Старые записи (enc_secret непустой, общий nonce на два шифротекста)
+# по-прежнему расшифровываются, но больше не создаются.
+_PAIR_LEN = struct.Struct(">I")
+
+
+def _pack_pair(api_key: str, api_secret: str) -> bytes:
+    # API-ключи биржи — ASCII (проверяется в set_account_credentials);
+    # кодек ascii дешевле utf-8 и сразу отсекает мусор на входе
+    k = api_key.encode('ascii')
+    s = api_secret.encode('ascii')
+    return _PAIR_LEN.pack(len(k)) + k + _PAIR_LEN.pack(len(s)) + s
+
+
+def _unpack_pair(plaintext: bytes) -> Tuple[str, str]:
+    (klen,) = _PAIR_LEN.unpack_from(plaintext, 0)
+    kend = _PAIR_LEN.size + klen
+    (slen,) = _PAIR_LEN.unpack_from(plaintext, kend)
+    sstart = kend + _PAIR_LEN.size
+    if sstart + slen != len(plaintext):
+        raise ValueError("Malformed credentials payload")
+    return (
+        plaintext[_PAIR_LEN.size:kend].decode('utf-8'),
+        plaintext[sstart:].decode('utf-8'),
+    )
+
+
+def _secure_eq(a: str, b: str) -> bool:
+    """Сравнение секретов за постоянное время (без раннего выхода str.__eq__)"""
+    return hmac.compare_digest(a.encode('utf-8'), b.encode('utf-8'))
 
 
 # ================================
@@ -74,7 +362,7 @@ def create_project_structure():
     for directory in directories:
         dir_path = base_path / directory
         dir_path.mkdir(exist_ok=True, parents=True)
-        logger.info(f"✅ Создана директория: {directory}")
+        logger.info("✅ Создана директория: %s", directory)
     
     return base_path
 
@@ -83,6 +371,108 @@ def create_project_structure():
 # КЛАСС ДЛЯ РАБОТЫ С ШИФРОВАНИЕМ
 # ================================
 
+# AEAD для новых записей. Случайный 96-битный nonce в AES-GCM безопасен лишь
+# до ~2^32 сообщений на ключ; AES-GCM-SIV устойчив к повтору nonce, а на CPU
+# без аппаратного AES быстрее ChaCha20-Poly1305. Тег алгоритма хранится
+# первым байтом в колонке nonce (13 байт), 12-байтовые nonce — AES-GCM.
+_AEAD_AESGCM_SIV = 1
+_AEAD_CHACHA20_POLY1305 = 2
+_TAGGED_NONCE_LEN = 13
+
+
+def _aesgcmsiv(key_bytes: bytes):
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCMSIV
+    return AESGCMSIV(key_bytes)
+
+
+def _chacha20poly1305(key_bytes: bytes):
+    from cryptography.hazmat.primitives.ciphers.aead import ChaCha20Poly1305
+    return ChaCha20Poly1305(key_bytes)
+
+
+_AEAD_FACTORIES = {
+    _AEAD_AESGCM_SIV: _aesgcmsiv,
+    _AEAD_CHACHA20_POLY1305: _chacha20poly1305,
+}
+
+# Один ключ не используется в разных алгоритмах: каждому AEAD — свой
+# подключ HKDF от мастер-ключа; сам мастер-ключ — только для старого AES-GCM
+_AEAD_SUBKEY_INFO = {
+    _AEAD_AESGCM_SIV: b"aead:siv",
+    _AEAD_CHACHA20_POLY1305: b"aead:chacha",
+}
+
+
+def _aead_subkey(key_bytes: bytes, tag: int) -> bytes:
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+    return HKDF(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=None,
+        info=_AEAD_SUBKEY_INFO[tag],
+    ).derive(key_bytes)
+
+
+def _make_aead(key_bytes: bytes, tag: int):
+    """AEAD алгоритма tag на его подключе"""
+    return _AEAD_FACTORIES[tag](_aead_subkey(key_bytes, tag))
+
+
+def _cpu_has_aes() -> bool:
+    """Аппаратный AES (x86 AES-NI / ARMv8 AES) по /proc/cpuinfo; без него считаем, что есть"""
+    try:
+        with open("/proc/cpuinfo", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith(("flags", "Features")):
+                    return "aes" in line.split()
+    except OSError:
+        pass
+    return True
+
+
+def _new_aead(key_bytes: bytes) -> Tuple[int, Any]:
+    """Выбор AEAD для шифрования: AES-GCM-SIV при аппаратном AES, иначе ChaCha20-Poly1305"""
+    if _cpu_has_aes():
+        try:
+            return _AEAD_AESGCM_SIV, _make_aead(key_bytes, _AEAD_AESGCM_SIV)
+        except Exception:
+            # старый cryptography/OpenSSL без AES-GCM-SIV
+            pass
+    return _AEAD_CHACHA20_POLY1305, _make_aead(key_bytes, _AEAD_CHACHA20_POLY1305)
+
+
+class _NoncePool:
+    """
+    Пул 96-битных nonce: os.urandom вызывается раз на size байт, а не на
+    каждое шифрование. После fork буфер перечитывается, чтобы дочерний
+    процесс не повторил nonce родителя.
+    """
+    NONCE_LEN = 12
+
+    def __init__(self, size: int = 4096):
+        self._size = size - size % self.NONCE_LEN
+        self._lock = threading.Lock()
+        self._refill()
+
+    def _refill(self) -> None:
+        self._buf = os.urandom(self._size)
+        self._off = 0
+        self._pid = os.getpid()
+
+    def take(self) -> bytes:
+        with self._lock:
+            if self._off >= self._size or self._pid != os.getpid():
+                self._refill()
+            nonce = self._buf[self._off:self._off + self.NONCE_LEN]
+            self._off += self.NONCE_LEN
+            return nonce
+
+
+# base64 ровно 32 байт: 43 символа алфавита + один '=' (проверка без исключений)
+_B64_KEY32_RE = re.compile(r"[A-Za-z0-9+/]{43}=")
+
+
 class CredentialsStore:
     """
     Enhanced credentials store по ТЗ с интеграцией в базу данных
@@ -91,33 +481,45 @@ class CredentialsStore:
     
     def __init__(self):
         """Инициализация с мастер-ключом из BOT_MASTER_KEY"""
+        # Сессия и модели разрешаются один раз, а не в каждом методе
+        self._Session, self._ApiCredentials, self._SysEvents = _resolve_db()
+
         key_b64 = os.getenv("BOT_MASTER_KEY")
         if not key_b64:
             raise ValueError("BOT_MASTER_KEY is required")
             
         # Обработка разных форматов ключа
+        from cryptography.hazmat.primitives.ciphers.aead import AESGCM
         if key_b64 == "DEV_RANDOM":
             # Для разработки - случайный ключ
-            from cryptography.hazmat.primitives.ciphers.aead import AESGCM
-            self._key = AESGCM(os.urandom(32))
+            key_bytes = os.urandom(32)
             logger.warning("Using DEV_RANDOM key - not for production!")
+        elif _B64_KEY32_RE.fullmatch(key_b64.strip()):
+            # Каноничный base64 ровно 32 байт
+            key_bytes = base64.b64decode(key_b64)
+            logger.info("Using base64 decoded master key")
         else:
-            try:
-                from cryptography.hazmat.primitives.ciphers.aead import AESGCM
-                # Попытка декодировать как base64
-                key_bytes = base64.b64decode(key_b64)
-                if len(key_bytes) != 32:
-                    raise ValueError("Decoded key must be 32 bytes")
-                self._key = AESGCM(key_bytes)
-                logger.info("Using base64 decoded master key")
-            except Exception:
-                # Если не base64, используем первые 32 байта как UTF-8
-                key_bytes = key_b64.encode("utf-8")[:32]
-                if len(key_bytes) < 32:
-                    # Дополняем до 32 байт
-                    key_bytes = key_bytes.ljust(32, b'\0')
-                self._key = AESGCM(key_bytes)
-                logger.info("Using UTF-8 encoded master key")
+            # Если не base64, используем первые 32 байта как UTF-8
+            key_bytes = key_b64.encode("utf-8")[:32]
+            if len(key_bytes) < 32:
+                # Дополняем до 32 байт
+                key_bytes = key_bytes.ljust(32, b'\0')
+            logger.warning("Using UTF-8 encoded master key (no KDF) - prefer a base64 32-byte key")
+
+        # AES-GCM остаётся только для чтения старых записей
+        self._key = AESGCM(key_bytes)
+        self._key_bytes = key_bytes
+        self._aead_tag, self._aead = _new_aead(key_bytes)
+        self._aeads = {self._aead_tag: self._aead}
+        self._nonces = _NoncePool()
+
+    def _aead_by_tag(self, tag: int):
+        """AEAD по тегу из nonce (запись могла быть сделана на другой машине)"""
+        aead = self._aeads.get(tag)
+        if aead is None:
+            aead = _make_aead(self._key_bytes, tag)
+            self._aeads[tag] = aead
+        return aead
     
     def encrypt_pair(self, api_key: str, api_secret: str) -> Tuple[bytes, bytes, bytes]:
         """
@@ -128,18 +530,17 @@ class CredentialsStore:
             api_secret: API секрет
             
         Returns:
-            tuple[bytes, bytes, bytes]: (enc_key, enc_secret, nonce)
+            tuple[bytes, bytes, bytes]: (enc_pair, b"", tag || nonce) — см. _pack_pair
         """
         try:
-            nonce = secrets.token_bytes(12)  # 96-bit nonce для GCM
-            enc_key = self._key.encrypt(nonce, api_key.encode('utf-8'), None)
-            enc_secret = self._key.encrypt(nonce, api_secret.encode('utf-8'), None)
+            nonce = self._nonces.take()  # 96-bit nonce
+            enc_blob = self._aead.encrypt(nonce, _pack_pair(api_key, api_secret), None)
             
             logger.debug("Credentials encrypted successfully")
-            return enc_key, enc_secret, nonce
+            return enc_blob, b"", bytes((self._aead_tag,)) + nonce
             
         except Exception as e:
-            logger.error(f"Encryption failed: {e}")
+            logger.error("Encryption failed: %s", e)
             raise
     
     def decrypt_pair(self, enc_key: bytes, enc_secret: bytes, nonce: bytes) -> Tuple[str, str]:
@@ -155,16 +556,28 @@ class CredentialsStore:
             tuple[str, str]: (api_key, api_secret)
         """
         try:
-            key = self._key.decrypt(nonce, enc_key, None).decode('utf-8')
-            secret = self._key.decrypt(nonce, enc_secret, None).decode('utf-8')
+            if len(nonce) == _TAGGED_NONCE_LEN:
+                aead = self._aead_by_tag(nonce[0])
+                key, secret = _unpack_pair(aead.decrypt(nonce[1:], enc_key, None))
+            elif not enc_secret:
+                key, secret = _unpack_pair(self._key.decrypt(nonce, enc_key, None))
+            else:
+                # legacy: два шифротекста под общим nonce
+                key = self._key.decrypt(nonce, enc_key, None).decode('utf-8')
+                secret = self._key.decrypt(nonce, enc_secret, None).decode('utf-8')
             
             logger.debug("Credentials decrypted successfully")
             return key, secret
             
         except Exception as e:
-            logger.error(f"Decryption failed: {e}")
+            logger.error("Decryption failed: %s", e)
             raise
     
+    @staticmethod
+    def _key_hint(api_key: str) -> str:
+        """Первые 8 символов ключа, остальное маскируется '*' (одна аллокация)"""
+        return api_key[:8].ljust(len(api_key), "*")
+
     def set_account_credentials(self, account_id: int, api_key: str, api_secret: str):
         """
         Сохраняет зашифрованные credentials в таблице ApiCredentials.
@@ -172,55 +585,40 @@ class CredentialsStore:
         """
         if not account_id:
             raise ValueError("account_id is required")
-
-        # Устойчивый импорт на уровне функции (избегаем циклов)
-        try:
-            from app.db_session import SessionLocal as _SessionLocal
-            from app.db_models import ApiCredentials as _ApiCredentials, SysEvents as _SysEvents
-        except Exception:
-            try:
-                from db_session import SessionLocal as _SessionLocal
-                from db_models import ApiCredentials as _ApiCredentials, SysEvents as _SysEvents
-            except Exception as e:
-                logger.exception("DB imports failed inside set_account_credentials")
-                raise
+        if not (api_key.isascii() and api_secret.isascii()):
+            raise ValueError("api_key and api_secret must be ASCII")
 
         try:
             enc_key, enc_secret, nonce = self.encrypt_pair(api_key, api_secret)
 
-            with _SessionLocal() as session:
-                row = session.query(_ApiCredentials).filter_by(account_id=account_id).first()
-                if row is None:
-                    row = _ApiCredentials(
-                        account_id=account_id,
-                        enc_key=enc_key,
-                        enc_secret=enc_secret,
-                        nonce=nonce,
-                        key_hint=api_key[:8] + "*" * (len(api_key) - 8) if len(api_key) > 8 else api_key
-                    )
-                    session.add(row)
-                    action = "created"
-                else:
-                    row.enc_key = enc_key
-                    row.enc_secret = enc_secret
-                    row.nonce = nonce
-                    row.key_hint = api_key[:8] + "*" * (len(api_key) - 8) if len(api_key) > 8 else api_key
-                    try:
-                        from datetime import datetime as _dt
-                        row.updated_at = _dt.utcnow()
-                    except Exception:
-                        pass
-                    action = "updated"
-
-                event = _SysEvents(
-                    level="INFO",                        # <--- было EventLevelEnum.INFO
-                    component="CredentialsStore",
-                    message=f"Credentials {action}",
-                    details_json={"account_id": account_id, "action": action}
-                )
-                session.add(event)
+            hint = self._key_hint(api_key)
+            # Upsert одним запросом; xmax = 0 у вставленной (не обновлённой) строки
+            stmt = pg_insert(self._ApiCredentials).values(
+                account_id=account_id,
+                enc_key=enc_key,
+                enc_secret=enc_secret,
+                nonce=nonce,
+                key_hint=hint,
+            )
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[self._ApiCredentials.account_id],
+                set_={
+                    "enc_key": stmt.excluded.enc_key,
+                    "enc_secret": stmt.excluded.enc_secret,
+                    "nonce": stmt.excluded.nonce,
+                    "key_hint": stmt.excluded.key_hint,
+                    "updated_at": _dt.now(_tz.utc).replace(tzinfo=None),
+                },
+            ).returning(literal_column("(xmax = 0)").label("inserted"))
+
+            with self._Session() as session:
+                inserted = session.execute(stmt).scalar_one()
+                action = "created" if inserted else "updated"
                 session.commit()
 
+            _audit_event(f"Credentials {action}", {"account_id": account_id, "action": action})
+
+            invalidate_credentials_cache(account_id)
             logger.info("Credentials %s for account %s", action, account_id)
 
         except Exception as e:
@@ -236,33 +634,29 @@ class CredentialsStore:
         if not account_id:
             raise ValueError("account_id is required")
 
-        try:
-            from app.db_session import SessionLocal as _SessionLocal
-            from app.db_models import ApiCredentials as _ApiCredentials
-        except Exception:
-            try:
-                from db_session import SessionLocal as _SessionLocal
-                from db_models import ApiCredentials as _ApiCredentials
-            except Exception as e:
-                logger.exception("DB imports failed inside get_account_credentials")
-                raise
+        _note_credentials_use((account_id,))
+        cached = _creds_cache_get(account_id)
+        if cached is not None:
+            return cached
 
         try:
-            with _SessionLocal() as session:
-                row = session.query(_ApiCredentials).filter_by(account_id=account_id).first()
+            # Один SELECT нужных колонок: без joined-загрузки Accounts и без
+            # отдельного COMMIT (колонки last_used в api_credentials нет)
+            with self._Session() as session:
+                row = session.execute(
+                    select(
+                        self._ApiCredentials.enc_key,
+                        self._ApiCredentials.enc_secret,
+                        self._ApiCredentials.nonce,
+                    ).where(self._ApiCredentials.account_id == account_id)
+                ).first()
                 if not row:
                     logger.debug("No credentials found for account %s", account_id)
                     return None
 
                 api_key, api_secret = self.decrypt_pair(row.enc_key, row.enc_secret, row.nonce)
 
-                try:
-                    from datetime import datetime as _dt
-                    row.last_used = _dt.utcnow()
-                    session.commit()
-                except Exception:
-                    pass
-
+                _creds_cache_put(account_id, (api_key, api_secret))
                 logger.debug("Credentials retrieved for account %s", account_id)
                 return api_key, api_secret
 
@@ -270,6 +664,51 @@ class CredentialsStore:
             logger.exception("Failed to get credentials for account %s: %s", account_id, e)
             raise
 
+    def get_accounts_credentials(self, account_ids: List[int]) -> Dict[int, Tuple[str, str]]:
+        """
+        Пакетный вариант get_account_credentials: один запрос
+        WHERE account_id IN (...) для всех id, которых нет в кэше.
+        Возвращает {account_id: (api_key, api_secret)} только для найденных.
+        """
+        result: Dict[int, Tuple[str, str]] = {}
+        missing: List[int] = []
+        for account_id in dict.fromkeys(account_ids):
+            if not account_id:
+                continue
+            cached = _creds_cache_get(account_id)
+            if cached is not None:
+                result[account_id] = cached
+            else:
+                missing.append(account_id)
+
+        _note_credentials_use(result.keys() | set(missing))
+        if not missing:
+            return result
+
+        try:
+            with self._Session() as session:
+                rows = session.execute(
+                    select(
+                        self._ApiCredentials.account_id,
+                        self._ApiCredentials.enc_key,
+                        self._ApiCredentials.enc_secret,
+                        self._ApiCredentials.nonce,
+                    ).where(self._ApiCredentials.account_id.in_(missing))
+                ).all()
+
+            for row in rows:
+                creds = self.decrypt_pair(row.enc_key, row.enc_secret, row.nonce)
+                _creds_cache_put(row.account_id, creds)
+                result[row.account_id] = creds
+
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Credentials retrieved for accounts %s", sorted(result))
+            return result
+
+        except Exception as e:
+            logger.exception("Failed to get credentials for accounts %s: %s", missing, e)
+            raise
+
 
     
     def delete_account_credentials(self, account_id: int) -> bool:
@@ -281,32 +720,20 @@ class CredentialsStore:
             raise ValueError("account_id is required")
 
         try:
-            from app.db_session import SessionLocal as _SessionLocal
-            from app.db_models import ApiCredentials as _ApiCredentials, SysEvents as _SysEvents
-        except Exception:
-            try:
-                from db_session import SessionLocal as _SessionLocal
-                from db_models import ApiCredentials as _ApiCredentials, SysEvents as _SysEvents
-            except Exception as e:
-                logger.exception("DB imports failed inside delete_account_credentials")
-                raise
-
-        try:
-            with _SessionLocal() as session:
-                row = session.query(_ApiCredentials).filter_by(account_id=account_id).first()
-                if not row:
-                    return False
-
-                session.delete(row)
-                event = _SysEvents(
-                    level="INFO",                        # <--- было EventLevelEnum.INFO
-                    component="CredentialsStore",
-                    message="Credentials deleted",
-                    details_json={"account_id": account_id}
+            with self._Session() as session:
+                # account_id не PK (PK — id), но уникален: удаляем по нему
+                # напрямую, без загрузки строки (и joined Accounts) в сессию
+                result = session.execute(
+                    delete(self._ApiCredentials).where(self._ApiCredentials.account_id == account_id)
                 )
-                session.add(event)
+                if not result.rowcount:
+                    session.rollback()
+                    return False
                 session.commit()
 
+            _audit_event("Credentials deleted", {"account_id": account_id})
+
+            invalidate_credentials_cache(account_id)
             logger.info("Credentials deleted for account %s", account_id)
             return True
 
@@ -321,20 +748,8 @@ class CredentialsStore:
         Список account_id, имеющих сохранённые credentials.
         """
         try:
-            from app.db_session import SessionLocal as _SessionLocal
-            from app.db_models import ApiCredentials as _ApiCredentials
-        except Exception:
-            try:
-                from db_session import SessionLocal as _SessionLocal
-                from db_models import ApiCredentials as _ApiCredentials
-            except Exception as e:
-                logger.exception("DB imports failed inside list_accounts_with_credentials")
-                raise
-
-        try:
-            with _SessionLocal() as session:
-                rows = session.query(_ApiCredentials.account_id).all()
-                return [r[0] for r in rows]
+            with self._Session() as session:
+                return list(session.scalars(select(self._ApiCredentials.account_id)))
         except Exception as e:
             logger.exception("Failed to list accounts with credentials: %s", e)
             raise
@@ -345,6 +760,68 @@ class CredentialsStore:
 # КЛАСС ДЛЯ РАБОТЫ С КРИПТОГРАФИЕЙ
 # ================================
 
+# Ниже этой скорости AES-GCM (64 KiB) считаем, что OpenSSL работает без
+# AES-NI/PCLMULQDQ: аппаратный путь даёт единицы GiB/s, программный — ~100-300 MiB/s
+AES_ACCEL_MIN_MIB_S = 1024.0
+
+
+@lru_cache(maxsize=1)
+def _check_aes_acceleration() -> float:
+    """
+    Однократная проверка при старте: микробенчмарк AES-GCM на 64 KiB,
+    версия OpenSSL и маска OPENSSL_ia32cap. Предупреждает, если похоже,
+    что шифрование идёт по медленному программному пути.
+    Возвращает измеренную скорость в MiB/s.
+    """
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+    try:
+        from cryptography.hazmat.backends.openssl import backend
+        openssl_version = backend.openssl_version_text()
+    except Exception:
+        import ssl
+        openssl_version = ssl.OPENSSL_VERSION
+
+    aead = AESGCM(os.urandom(32))
+    nonce = os.urandom(12)
+    data = bytes(64 * 1024)
+    rounds = 16
+    aead.encrypt(nonce, data, None)  # прогрев
+    started = time.perf_counter()
+    for _ in range(rounds):
+        aead.encrypt(nonce, data, None)
+    elapsed = time.perf_counter() - started
+    mib_s = (len(data) * rounds / (1024 * 1024)) / elapsed if elapsed > 0 else float("inf")
+
+    logger.info("AES-GCM throughput %.0f MiB/s (%s)", mib_s, openssl_version)
+
+    ia32cap = os.environ.get("OPENSSL_ia32cap")
+    if ia32cap and "~" in ia32cap:
+        logger.warning("OPENSSL_ia32cap=%s masks CPU features and may disable AES-NI", ia32cap)
+    if mib_s < AES_ACCEL_MIN_MIB_S:
+        logger.warning(
+            "AES-GCM is slow (%.0f MiB/s < %.0f): OpenSSL is likely not using AES-NI/CLMUL",
+            mib_s, AES_ACCEL_MIN_MIB_S,
+        )
+    return mib_s
+
+
+def _json_dumpb(data: Dict[str, Any]) -> bytes:
+    """JSON -> UTF-8 bytes (orjson, если установлен; формат как json.dumps(ensure_ascii=False))"""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, ensure_ascii=False).encode('utf-8')
+
+
+def _json_loadb(raw: bytes) -> Dict[str, Any]:
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+# Константная соль для воспроизводимости вывода ключа CryptoStore
+CRYPTO_STORE_SALT = b'bybit_trading_salt_2024'
+
+
 class CryptoStore:
     """
     Professional-grade encryption store для API credentials
@@ -366,33 +843,70 @@ class CryptoStore:
         if len(self.master_key) < 32:
             raise ValueError("Master key must be at least 32 characters long")
         
+        # Шифр (и стартовая проверка AES-NI) создаётся при первом
+        # encrypt/decrypt: CLI, которым он не нужен, ничего не платят
         self._aesgcm = None
-        self._initialize_cipher()
+        self._legacy_aesgcm = None
     
-    def _initialize_cipher(self):
-        """Инициализация AES-GCM шифра"""
+    def _ensure_cipher(self):
+        """
+        Ленивая инициализация AES-GCM шифра, возвращает его.
+        Мастер-ключ — случайная строка ≥32 символов, растяжение PBKDF2 при
+        константной соли ничего не добавляет, поэтому ключ выводится
+        одношаговым HKDF-SHA256.
+        """
+        if self._aesgcm is not None:
+            return self._aesgcm
         try:
             from cryptography.hazmat.primitives.ciphers.aead import AESGCM
             from cryptography.hazmat.primitives import hashes
-            from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+            from cryptography.hazmat.primitives.kdf.hkdf import HKDF
             
-            # Выводим ключ из мастер-пароля с использованием PBKDF2
-            kdf = PBKDF2HMAC(
+            hkdf = HKDF(
                 algorithm=hashes.SHA256(),
                 length=32,  # 256-bit ключ
-                salt=b'bybit_trading_salt_2024',  # Константная соль для воспроизводимости
-                iterations=100000,  # OWASP рекомендация
+                salt=CRYPTO_STORE_SALT,
+                info=b'bot-master-key-v1',
             )
             
-            key = kdf.derive(self.master_key.encode('utf-8'))
+            key = hkdf.derive(self.master_key.encode('utf-8'))
             self._aesgcm = AESGCM(key)
+            _check_aes_acceleration()
             
             logger.info("Crypto store initialized successfully")
+            return self._aesgcm
             
         except Exception as e:
-            logger.error(f"Failed to initialize crypto store: {e}")
+            logger.error("Failed to initialize crypto store: %s", e)
             raise
     
+    def _legacy_cipher(self):
+        """
+        AES-GCM с ключом PBKDF2 (100k итераций) — только для расшифровки
+        данных, зашифрованных до перехода на HKDF. Выводится лениво, один раз.
+        """
+        if self._legacy_aesgcm is None:
+            from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+            from cryptography.hazmat.primitives import hashes
+            from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+            
+            kdf = PBKDF2HMAC(
+                algorithm=hashes.SHA256(),
+                length=32,
+                salt=CRYPTO_STORE_SALT,
+                iterations=100000,
+            )
+            self._legacy_aesgcm = AESGCM(kdf.derive(self.master_key.encode('utf-8')))
+        return self._legacy_aesgcm
+    
+    def _decrypt(self, nonce: bytes, data: bytes) -> bytes:
+        """Расшифровка текущим ключом с откатом на legacy PBKDF2-ключ"""
+        from cryptography.exceptions import InvalidTag
+        try:
+            return self._ensure_cipher().decrypt(nonce, data, None)
+        except InvalidTag:
+            return self._legacy_cipher().decrypt(nonce, data, None)
+    
     def encrypt_credentials(self, api_key: str, api_secret: str) -> Tuple[bytes, bytes, bytes]:
         """
         Шифрование API credentials
@@ -402,21 +916,20 @@ class CryptoStore:
             api_secret: API секрет для шифрования
         
         Returns:
-            Tuple[bytes, bytes, bytes]: (encrypted_key, encrypted_secret, nonce)
+            Tuple[bytes, bytes, bytes]: (encrypted_pair, b"", nonce)
         """
         try:
             # Генерируем уникальный nonce для каждого шифрования
             nonce = secrets.token_bytes(12)  # 96-bit nonce для GCM
             
-            # Шифруем API ключ и секрет
-            encrypted_key = self._aesgcm.encrypt(nonce, api_key.encode('utf-8'), None)
-            encrypted_secret = self._aesgcm.encrypt(nonce, api_secret.encode('utf-8'), None)
+            # Шифруем ключ и секрет одним вызовом (см. _pack_pair)
+            encrypted_blob = self._ensure_cipher().encrypt(nonce, _pack_pair(api_key, api_secret), None)
             
             logger.debug("API credentials encrypted successfully")
-            return encrypted_key, encrypted_secret, nonce
+            return encrypted_blob, b"", nonce
             
         except Exception as e:
-            logger.error(f"Encryption failed: {e}")
+            logger.error("Encryption failed: %s", e)
             raise
     
     def decrypt_credentials(self, enc_key: bytes, enc_secret: bytes, nonce: bytes) -> Tuple[str, str]:
@@ -433,14 +946,18 @@ class CryptoStore:
         """
         try:
             # Расшифровываем данные
-            api_key = self._aesgcm.decrypt(nonce, enc_key, None).decode('utf-8')
-            api_secret = self._aesgcm.decrypt(nonce, enc_secret, None).decode('utf-8')
+            if not enc_secret:
+                api_key, api_secret = _unpack_pair(self._decrypt(nonce, enc_key))
+            else:
+                # legacy: два шифротекста под общим nonce
+                api_key = self._decrypt(nonce, enc_key).decode('utf-8')
+                api_secret = self._decrypt(nonce, enc_secret).decode('utf-8')
             
             logger.debug("API credentials decrypted successfully")
             return api_key, api_secret
             
         except Exception as e:
-            logger.error(f"Decryption failed: {e}")
+            logger.error("Decryption failed: %s", e)
             raise
     
     def encrypt_json_data(self, data: Dict[str, Any]) -> Tuple[bytes, bytes]:
@@ -455,13 +972,12 @@ class CryptoStore:
         """
         try:
             nonce = secrets.token_bytes(12)
-            json_data = json.dumps(data, ensure_ascii=False)
-            encrypted_data = self._aesgcm.encrypt(nonce, json_data.encode('utf-8'), None)
+            encrypted_data = self._ensure_cipher().encrypt(nonce, _json_dumpb(data), None)
             
             return encrypted_data, nonce
             
         except Exception as e:
-            logger.error(f"JSON encryption failed: {e}")
+            logger.error("JSON encryption failed: %s", e)
             raise
     
     def decrypt_json_data(self, encrypted_data: bytes, nonce: bytes) -> Dict[str, Any]:
@@ -476,12 +992,10 @@ class CryptoStore:
             Dict[str, Any]: Расшифрованный словарь
         """
         try:
-            decrypted_data = self._aesgcm.decrypt(nonce, encrypted_data, None)
-            json_str = decrypted_data.decode('utf-8')
-            return json.loads(json_str)
+            return _json_loadb(self._decrypt(nonce, encrypted_data))
             
         except Exception as e:
-            logger.error(f"JSON decryption failed: {e}")
+            logger.error("JSON decryption failed: %s", e)
             raise
     
     def generate_key_hint(self, api_key: str) -> str:
@@ -494,9 +1008,7 @@ class CryptoStore:
         Returns:
             str: Подсказка (первые 8 символов)
         """
-        if len(api_key) < 8:
-            return api_key
-        return api_key[:8] + "*" * (len(api_key) - 8)
+        return CredentialsStore._key_hint(api_key)
     
     @staticmethod
     def generate_master_key() -> str:
@@ -528,7 +1040,7 @@ class CryptoStore:
             dec_key, dec_secret = self.decrypt_credentials(enc_key, enc_secret, nonce)
             
             # Проверяем
-            if dec_key == test_key and dec_secret == test_secret:
+            if _secure_eq(dec_key, test_key) and _secure_eq(dec_secret, test_secret):
                 logger.info("Encryption test passed")
                 return True
             else:
@@ -536,7 +1048,7 @@ class CryptoStore:
                 return False
                 
         except Exception as e:
-            logger.error(f"Encryption test failed: {e}")
+            logger.error("Encryption test failed: %s", e)
             return False
 
 
@@ -545,21 +1057,40 @@ class CryptoStore:
 # ================================
 
 def create_crypto_store() -> CryptoStore:
-    """Factory function для создания CryptoStore"""
+    """
+    Factory function для CryptoStore.
+    Экземпляр (и выведенный AESGCM) кэшируется на процесс по значению
+    BOT_MASTER_KEY — KDF выполняется один раз, а не на каждый вызов.
+    """
     try:
-        return CryptoStore()
+        return _crypto_store_for(os.getenv("BOT_MASTER_KEY"))
     except Exception as e:
-        logger.error(f"Failed to create crypto store: {e}")
+        logger.error("Failed to create crypto store: %s", e)
         raise
 
 def create_credentials_store() -> CredentialsStore:
-    """Factory function для создания CredentialsStore"""
+    """
+    Factory function для CredentialsStore (кэшируется по BOT_MASTER_KEY).
+    Вызывающий код должен брать стор отсюда, а не создавать CredentialsStore()
+    заново: экземпляр держит AEAD-объекты (расписание ключа AES и таблицу
+    GHASH в OpenSSL), пул nonce и, при DEV_RANDOM, единственный ключ процесса.
+    Новый экземпляр создаётся только при смене BOT_MASTER_KEY.
+    """
     try:
-        return CredentialsStore()
+        return _credentials_store_for(os.getenv("BOT_MASTER_KEY"))
     except Exception as e:
-        logger.error(f"Failed to create credentials store: {e}")
+        logger.error("Failed to create credentials store: %s", e)
         raise
 
+@lru_cache(maxsize=1)
+def _crypto_store_for(master_key: Optional[str]) -> CryptoStore:
+    return CryptoStore(master_key)
+
+@lru_cache(maxsize=1)
+def _credentials_store_for(master_key: Optional[str]) -> CredentialsStore:
+    # CredentialsStore сам читает BOT_MASTER_KEY; аргумент — только ключ кэша
+    return CredentialsStore()
+
 def encrypt_api_credentials(api_key: str, api_secret: str) -> Dict[str, bytes]:
     """
     Удобная функция для шифрования API credentials
@@ -598,12 +1129,12 @@ def test_credentials_store():
 
         enc_key, enc_secret, nonce = store.encrypt_pair(test_key, test_secret)
         dec_key, dec_secret = store.decrypt_pair(enc_key, enc_secret, nonce)
-        assert dec_key == test_key, "Decrypted key mismatch"
-        assert dec_secret == test_secret, "Decrypted secret mismatch"
+        assert _secure_eq(dec_key, test_key), "Decrypted key mismatch"
+        assert _secure_eq(dec_secret, test_secret), "Decrypted secret mismatch"
         print("✅ Encrypt/decrypt test passed")
 
         # Тест с базой данных (если check_db_health проходит)
-        if _db_health_check():
+        if check_db_health():
             test_account_id = 999_999
 
             # Сохраняем
@@ -612,8 +1143,8 @@ def test_credentials_store():
             # Читаем
             api = store.get_account_credentials(test_account_id)
             assert api is not None, "Credentials not found in DB"
-            assert api[0] == test_key, "Retrieved key mismatch"
-            assert api[1] == test_secret, "Retrieved secret mismatch"
+            assert _secure_eq(api[0], test_key), "Retrieved key mismatch"
+            assert _secure_eq(api[1], test_secret), "Retrieved secret mismatch"
 
             # Удаляем
             assert store.delete_account_credentials(test_account_id) is True, "Delete returned False"
@@ -630,8 +1161,12 @@ def test_credentials_store():
 
 
 def check_db_health():
-    """Проверка здоровья БД (без заглушек)."""
+    """Проверка здоровья БД (без заглушек): общий кэшированный probe из db_session."""
     try:
+        try:
+            from app.db_session import check_db_health as _db_health_check
+        except Exception:
+            from db_session import check_db_health as _db_health_check
         return _db_health_check()
     except Exception as e:
         logger.exception("DB health check failed: %s", e)
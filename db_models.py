@@ -2,11 +2,13 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
 from datetime import datetime
+from decimal import Decimal
 from typing import Optional
 from enum import Enum
 
 from sqlalchemy import (
-    String, Integer, DateTime, Numeric, Text, UniqueConstraint, Index, ForeignKey, func
+    DDL, String, Integer, SmallInteger, DateTime, Numeric, Double, LargeBinary, Text, UniqueConstraint, Index,
+    ForeignKey, TypeDecorator, event, func, text
 )
 from sqlalchemy.dialects.postgresql import BYTEA, JSONB
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
@@ -18,6 +20,51 @@ class EventLevelEnum(str, Enum):
     ERROR = "ERROR"
 # ------------------------------------------------------------
 
+
+class SmallIntCode(TypeDecorator):
+    """
+    Категориальная строка (уровень, сторона, статус), хранящаяся как SMALLINT:
+    2 байта в строке и в B-tree вместо VARCHAR, сравнение — int, а не strcmp.
+    В Python по-прежнему строки: запись принимает str/Enum (без учёта регистра,
+    с алиасами), чтение возвращает каноническое имя. Код = индекс в codes,
+    поэтому новые значения добавляются только в конец.
+    """
+
+    impl = SmallInteger
+    cache_ok = True
+
+    def __init__(self, codes: tuple, aliases: tuple = ()):
+        super().__init__()
+        self.codes = codes
+        self.aliases = aliases
+        self._to_code = {name: i for i, name in enumerate(codes)}
+        self._to_code.update((alias, self._to_code[name]) for alias, name in aliases)
+
+    def process_bind_param(self, value, dialect):
+        if value is None or isinstance(value, int):
+            return value
+        if isinstance(value, Enum):
+            value = value.value
+        try:
+            return self._to_code[value.upper()]
+        except KeyError:
+            raise ValueError(f"Unknown code {value!r}, expected one of {self.codes}") from None
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else self.codes[value]
+
+
+EVENT_LEVEL_CODES = SmallIntCode(("INFO", "WARN", "ERROR", "DEBUG", "CRITICAL"), aliases=(("WARNING", "WARN"),))
+SIDE_CODES = SmallIntCode(("BUY", "SELL"))
+ORDER_STATUS_CODES = SmallIntCode(
+    ("PENDING", "PLACED", "PARTIALLY_FILLED", "FILLED", "CANCELLED", "REJECTED", "FAILED"),
+    aliases=(("CANCELED", "CANCELLED"), ("PARTIALLYFILLED", "PARTIALLY_FILLED")),
+)
+
+# Связи по умолчанию lazy="raise": родитель не JOIN-ится в каждую выборку
+# строк-логов. Где он действительно нужен — явно
+# .options(selectinload(Model.account)); иначе обращение к .account падает,
+# а не делает скрытый N+1.
 class Base(DeclarativeBase):
     pass
 
@@ -26,7 +73,7 @@ class Users(Base):
     __tablename__ = "users"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    email: Mapped[str] = mapped_column(String(255), nullable=False, unique=True, index=False)
+    email: Mapped[str] = mapped_column(String(255), nullable=False)
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=False), server_default=func.now(), nullable=False)
     updated_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=False), nullable=True)
 
@@ -45,7 +92,7 @@ class Accounts(Base):
     env: Mapped[str] = mapped_column(String(16), nullable=False, default="testnet")  # 'prod' | 'testnet'
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=False), server_default=func.now(), nullable=False)
 
-    user = relationship("Users", lazy="joined")
+    user = relationship("Users", lazy="raise")
 
     __table_args__ = (
         Index("ix_accounts_user_id", "user_id"),
@@ -56,7 +103,9 @@ class ApiCredentials(Base):
     __tablename__ = "api_credentials"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    account_id: Mapped[int] = mapped_column(Integer, ForeignKey("accounts.id"), nullable=False, index=True)
+    account_id: Mapped[int] = mapped_column(Integer, ForeignKey("accounts.id"), nullable=False)
+    # Копия accounts.env (заполняется триггером, см. конец файла)
+    env: Mapped[str] = mapped_column(String(16), nullable=False)
     enc_key: Mapped[bytes] = mapped_column(BYTEA, nullable=False)
     enc_secret: Mapped[bytes] = mapped_column(BYTEA, nullable=False)
     nonce: Mapped[bytes] = mapped_column(BYTEA, nullable=False)
@@ -64,26 +113,30 @@ class ApiCredentials(Base):
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=False), server_default=func.now(), nullable=False)
     updated_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=False), nullable=True)
 
-    account = relationship("Accounts", lazy="joined")
+    account = relationship("Accounts", lazy="raise")
 
     __table_args__ = (
+        # Уникальный индекс обслуживает и поиск по account_id
         UniqueConstraint("account_id", name="uq_api_credentials_account_id"),
-        Index("ix_api_credentials_account_id", "account_id"),
     )
 
 # ========== risk_profiles ==========
+# Конфиг читается редко — остаётся Numeric и отдаётся как Decimal (asdecimal=True
+# по умолчанию); горячие qty/value/балансы в логах хранятся как DOUBLE PRECISION
+# (фиксированные 8 байт, аппаратная арифметика) и читаются сразу как float
 class RiskProfiles(Base):
     __tablename__ = "risk_profiles"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    account_id: Mapped[int] = mapped_column(Integer, ForeignKey("accounts.id"), nullable=False, unique=True)
-    daily_loss_limit: Mapped[float] = mapped_column(Numeric(18, 8), nullable=False)
-    per_symbol_limit: Mapped[float] = mapped_column(Numeric(18, 8), nullable=False)
-    equity_scale: Mapped[float] = mapped_column(Numeric(18, 8), nullable=False)
+    account_id: Mapped[int] = mapped_column(Integer, ForeignKey("accounts.id"), nullable=False)
+    env: Mapped[str] = mapped_column(String(16), nullable=False)  # копия accounts.env
+    daily_loss_limit: Mapped[Decimal] = mapped_column(Numeric(18, 8), nullable=False)
+    per_symbol_limit: Mapped[Decimal] = mapped_column(Numeric(18, 8), nullable=False)
+    equity_scale: Mapped[Decimal] = mapped_column(Numeric(18, 8), nullable=False)
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=False), server_default=func.now(), nullable=False)
     updated_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=False), nullable=True)
 
-    account = relationship("Accounts", lazy="joined")
+    account = relationship("Accounts", lazy="raise")
 
     __table_args__ = (
         UniqueConstraint("account_id", name="uq_risk_profiles_account_id"),
@@ -93,25 +146,42 @@ class RiskProfiles(Base):
 class SignalsLog(Base):
     __tablename__ = "signals_log"
 
-    id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    account_id: Mapped[int] = mapped_column(Integer, ForeignKey("accounts.id"), nullable=False, index=True)
+    # PARTITION BY LIST (account_id): у каждого аккаунта своя дочерняя таблица
+    # signals_log_p{id} со своими (локальными) B-tree, конкурентные вставки
+    # разных аккаунтов не делят страницы индексов. Партиции создаёт триггер
+    # на accounts (см. конец файла); account_id входит в PK и уникальные ключи.
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    account_id: Mapped[int] = mapped_column(Integer, ForeignKey("accounts.id"), nullable=False, primary_key=True)
     symbol: Mapped[str] = mapped_column(String(50), nullable=False)
-    side: Mapped[str] = mapped_column(String(12), nullable=False)  # 'BUY'|'SELL'
-    qty: Mapped[float] = mapped_column(Numeric(36, 18), nullable=False)
+    side: Mapped[str] = mapped_column(SIDE_CODES, nullable=False)  # 'BUY'|'SELL'
+    qty: Mapped[float] = mapped_column(Double, nullable=False)
     ext_id: Mapped[Optional[str]] = mapped_column(String(120), nullable=True)
-    # НОВОЕ: поле для дедупликации
-    dedup_key: Mapped[str] = mapped_column(String(128), nullable=False, unique=True)
+    # НОВОЕ: поле для дедупликации — 16-байтный BLAKE2b-дайджест
+    # (SignalsLogger.generate_dedup_key), узкий ключ уникального индекса
+    dedup_key: Mapped[bytes] = mapped_column(LargeBinary(16), nullable=False)
     parsed_json: Mapped[Optional[dict]] = mapped_column(JSONB, nullable=True)
     received_at: Mapped[datetime] = mapped_column(DateTime(timezone=False), server_default=func.now(), nullable=False)
 
-    account = relationship("Accounts", lazy="joined")
+    account = relationship("Accounts", lazy="raise")
 
     __table_args__ = (
-        UniqueConstraint("ext_id", name="uq_signals_ext_id"),
-        UniqueConstraint("dedup_key", name="uq_signals_dedup_key"),  # НОВОЕ
-        Index("ix_signals_log_account_id", "account_id"),
+        UniqueConstraint("account_id", "ext_id", name="uq_signals_ext_id"),
+        # Обслуживает и поиск дубликата (account_id, dedup_key) — отдельный индекс не нужен
+        UniqueConstraint("account_id", "dedup_key", name="uq_signals_dedup_key"),  # НОВОЕ
+        # Последние сигналы аккаунта: ORDER BY received_at DESC LIMIT N
+        # (заменяет отдельный ix_signals_log_account_id)
+        Index(
+            "ix_signals_log_account_received",
+            "account_id", text("received_at DESC"),
+            postgresql_include=["symbol", "side", "qty"],
+        ),
         Index("ix_signals_log_symbol", "symbol"),
-        Index("ix_signals_log_dedup_key", "dedup_key"),  # НОВОЕ
+        # Containment-запросы parsed_json @> '{...}' — по GIN, а не seq scan
+        Index(
+            "ix_signals_log_parsed_json_gin", "parsed_json",
+            postgresql_using="gin", postgresql_ops={"parsed_json": "jsonb_path_ops"},
+        ),
+        {"postgresql_partition_by": "LIST (account_id)"},
     )
 
 
@@ -119,12 +189,13 @@ class SignalsLog(Base):
 class OrdersLog(Base):
     __tablename__ = "orders_log"
 
-    id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    account_id: Mapped[int] = mapped_column(Integer, ForeignKey("accounts.id"), nullable=False, index=True)
+    # PARTITION BY LIST (account_id), как signals_log: orders_log_p{id}
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    account_id: Mapped[int] = mapped_column(Integer, ForeignKey("accounts.id"), nullable=False, primary_key=True)
     symbol: Mapped[str] = mapped_column(String(50), nullable=False)
-    side: Mapped[str] = mapped_column(String(12), nullable=False)
-    qty: Mapped[float] = mapped_column(Numeric(36, 18), nullable=False)
-    status: Mapped[str] = mapped_column(String(24), nullable=False)
+    side: Mapped[str] = mapped_column(SIDE_CODES, nullable=False)
+    qty: Mapped[float] = mapped_column(Double, nullable=False)
+    status: Mapped[str] = mapped_column(ORDER_STATUS_CODES, nullable=False)  # OrderStatus
     exchange_order_id: Mapped[Optional[str]] = mapped_column(String(120), nullable=True)
     # НОВЫЕ поля для ретраев
     attempt: Mapped[int] = mapped_column(Integer, default=1, nullable=False)
@@ -132,13 +203,23 @@ class OrdersLog(Base):
     reason: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=False), server_default=func.now(), nullable=False)
 
-    account = relationship("Accounts", lazy="joined")
+    account = relationship("Accounts", lazy="raise")
 
     __table_args__ = (
-        UniqueConstraint("exchange_order_id", name="uq_orders_exchange_id"),
-        Index("ix_orders_log_account_id", "account_id"),
+        UniqueConstraint("account_id", "exchange_order_id", name="uq_orders_exchange_id"),
+        # update_order_status ищет только по exchange_order_id
+        Index("ix_orders_log_exchange_order_id", "exchange_order_id"),
         Index("ix_orders_log_symbol", "symbol"),
-        Index("ix_orders_log_status", "status"),  # НОВОЕ
+        # WHERE account_id [AND status IN (...)] ORDER BY created_at DESC LIMIT N —
+        # без сортировки и (за счёт INCLUDE) без похода в heap.
+        # Ведущий account_id заменяет отдельный ix_orders_log_account_id.
+        Index(
+            "ix_orders_log_account_created",
+            "account_id", text("created_at DESC"),
+            postgresql_include=["exchange_order_id", "symbol", "qty"],
+        ),
+        Index("ix_orders_log_account_status_created", "account_id", "status", text("created_at DESC")),
+        {"postgresql_partition_by": "LIST (account_id)"},
     )
 
 # ========== risk_events ==========
@@ -146,13 +227,13 @@ class RiskEvents(Base):
     __tablename__ = "risk_events"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    account_id: Mapped[int] = mapped_column(Integer, ForeignKey("accounts.id"), nullable=False, index=True)
+    account_id: Mapped[int] = mapped_column(Integer, ForeignKey("accounts.id"), nullable=False)
     event: Mapped[str] = mapped_column(String(64), nullable=False)
     reason: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
-    value: Mapped[Optional[float]] = mapped_column(Numeric(36, 18), nullable=True)
+    value: Mapped[Optional[float]] = mapped_column(Double, nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=False), server_default=func.now(), nullable=False)
 
-    account = relationship("Accounts", lazy="joined")
+    account = relationship("Accounts", lazy="raise")
 
     __table_args__ = (
         Index("ix_risk_events_account_id", "account_id"),
@@ -161,34 +242,184 @@ class RiskEvents(Base):
 class BalanceSnapshots(Base):
     __tablename__ = "balance_snapshots"
 
-    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    # Таблица партиционирована помесячно по ts (PARTITION BY RANGE),
+    # поэтому ts входит в первичный ключ. Партиции создаёт
+    # BalanceSnapshotLogger.ensure_partitions().
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     account_id: Mapped[int] = mapped_column(Integer, ForeignKey("accounts.id"), nullable=False)
     asset: Mapped[str] = mapped_column(String(20), nullable=False)  # 'USDT', 'BTC', etc
-    free: Mapped[float] = mapped_column(Numeric(36, 18), nullable=False)
-    locked: Mapped[float] = mapped_column(Numeric(36, 18), default=0, nullable=False)
-    equity: Mapped[float] = mapped_column(Numeric(36, 18), nullable=False)
-    ts: Mapped[datetime] = mapped_column(DateTime(timezone=False), server_default=func.now(), nullable=False)
+    # DOUBLE PRECISION: значения приходят от биржи как float, Decimal на горячем пути не нужен
+    free: Mapped[float] = mapped_column(Double, nullable=False)
+    locked: Mapped[float] = mapped_column(Double, default=0, nullable=False)
+    equity: Mapped[float] = mapped_column(Double, nullable=False)
+    ts: Mapped[datetime] = mapped_column(DateTime(timezone=False), server_default=func.now(), primary_key=True)
 
-    account = relationship("Accounts", lazy="joined")
+    account = relationship("Accounts", lazy="raise")
 
     __table_args__ = (
-        Index("ix_balance_snapshots_account_id", "account_id"),
         Index("ix_balance_snapshots_ts", "ts"),
+        # Ведущий account_id покрывает и поиск только по аккаунту
         Index("ix_balance_snapshots_account_ts", "account_id", "ts"),  # Составной индекс
+        # Покрывающий индекс под «последний снимок» / историю / PnL 24h:
+        # WHERE account_id, asset ORDER BY ts DESC LIMIT N → index-only scan
+        Index(
+            "ix_balsnap_acc_asset_ts",
+            "account_id", "asset", text("ts DESC"),
+            postgresql_include=["free", "locked", "equity"],
+        ),
+        {"postgresql_partition_by": "RANGE (ts)"},
     )
 
 # ========== sys_events ==========
 class SysEvents(Base):
     __tablename__ = "sys_events"
 
-    id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    level: Mapped[str] = mapped_column(String(16), nullable=False)       # INFO|WARN|ERROR
+    # Append-only поток наблюдаемости: таблица партиционирована по дням
+    # (PARTITION BY RANGE (created_at)), партиции создаются UNLOGGED —
+    # без WAL на вставке, ценой потери свежих событий при падении PostgreSQL.
+    # Партиции ведёт SystemEventLogger.ensure_partitions(); created_at в PK.
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    level: Mapped[str] = mapped_column(EVENT_LEVEL_CODES, nullable=False)  # INFO|WARN|ERROR
     component: Mapped[str] = mapped_column(String(64), nullable=False)
     message: Mapped[str] = mapped_column(String(255), nullable=False)
     details_json: Mapped[Optional[dict]] = mapped_column(JSONB, nullable=True)
-    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=False), server_default=func.now(), nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=False), server_default=func.now(), primary_key=True)
 
     __table_args__ = (
         Index("ix_sys_events_component", "component"),
         Index("ix_sys_events_level", "level"),
+        Index(
+            "ix_sys_events_details_json_gin", "details_json",
+            postgresql_using="gin", postgresql_ops={"details_json": "jsonb_path_ops"},
+        ),
+        {"postgresql_partition_by": "RANGE (created_at)"},
     )
+
+# ---------- денормализованный accounts.env ----------
+# api_credentials / risk_profiles хранят env аккаунта, чтобы чтение не
+# JOIN-ило accounts. Значение ставит BEFORE INSERT триггер, если writer его
+# не передал; смена accounts.env переносится в обе таблицы. balance_snapshots
+# сюда не входит: построчный триггер на горячей вставке снимков, а env
+# снимка пока никто не читает.
+#
+# Существующая БД (функции и триггеры — из DDL ниже), для каждой из таблиц:
+#   ALTER TABLE api_credentials ADD COLUMN env varchar(16);
+#   UPDATE api_credentials c SET env = a.env FROM accounts a WHERE a.id = c.account_id;
+#   ALTER TABLE api_credentials ALTER COLUMN env SET NOT NULL;
+ENV_DENORMALIZED_TABLES = ("api_credentials", "risk_profiles")
+
+event.listen(
+    Base.metadata,
+    "before_create",
+    DDL(
+        "CREATE OR REPLACE FUNCTION fill_account_env() RETURNS trigger AS $$ "
+        "BEGIN "
+        "IF NEW.env IS NULL THEN "
+        "SELECT env INTO NEW.env FROM accounts WHERE id = NEW.account_id; "
+        "END IF; "
+        "RETURN NEW; "
+        "END $$ LANGUAGE plpgsql"
+    ).execute_if(dialect="postgresql"),
+)
+event.listen(
+    Base.metadata,
+    "before_create",
+    DDL(
+        "CREATE OR REPLACE FUNCTION propagate_account_env() RETURNS trigger AS $$ "
+        "BEGIN "
+        + "".join(
+            f"UPDATE {table} SET env = NEW.env WHERE account_id = NEW.id; "
+            for table in ENV_DENORMALIZED_TABLES
+        )
+        + "RETURN NULL; "
+        "END $$ LANGUAGE plpgsql"
+    ).execute_if(dialect="postgresql"),
+)
+for _table in ENV_DENORMALIZED_TABLES:
+    event.listen(
+        Base.metadata.tables[_table],
+        "after_create",
+        DDL(
+            f"CREATE TRIGGER trg_{_table}_fill_env BEFORE INSERT ON {_table} "
+            "FOR EACH ROW EXECUTE FUNCTION fill_account_env()"
+        ).execute_if(dialect="postgresql"),
+    )
+event.listen(
+    Accounts.__table__,
+    "after_create",
+    DDL(
+        "CREATE TRIGGER trg_accounts_env_propagate AFTER UPDATE OF env ON accounts "
+        "FOR EACH ROW WHEN (OLD.env IS DISTINCT FROM NEW.env) "
+        "EXECUTE FUNCTION propagate_account_env()"
+    ).execute_if(dialect="postgresql"),
+)
+
+# ---------- LIST-партиции по аккаунтам ----------
+# Новый аккаунт сразу получает signals_log_p{id} / orders_log_p{id};
+# DEFAULT-партиции ловят строки аккаунтов, созданных до триггера.
+ACCOUNT_PARTITIONED_TABLES = ("signals_log", "orders_log")
+
+event.listen(
+    Base.metadata,
+    "before_create",
+    DDL(
+        "CREATE OR REPLACE FUNCTION create_account_partitions() RETURNS trigger AS $$ "
+        "BEGIN "
+        + "".join(
+            # %% — экранирование для DDL (строка проходит через %-форматирование)
+            f"EXECUTE format('CREATE TABLE IF NOT EXISTS {table}_p%%s PARTITION OF {table} "
+            f"FOR VALUES IN (%%s)', NEW.id, NEW.id); "
+            for table in ACCOUNT_PARTITIONED_TABLES
+        )
+        + "RETURN NULL; "
+        "END $$ LANGUAGE plpgsql"
+    ).execute_if(dialect="postgresql"),
+)
+for _table in ACCOUNT_PARTITIONED_TABLES:
+    event.listen(
+        Base.metadata.tables[_table],
+        "after_create",
+        DDL(
+            f"CREATE TABLE IF NOT EXISTS {_table}_default PARTITION OF {_table} DEFAULT"
+        ).execute_if(dialect="postgresql"),
+    )
+event.listen(
+    Accounts.__table__,
+    "after_create",
+    DDL(
+        "CREATE TRIGGER trg_accounts_create_partitions AFTER INSERT ON accounts "
+        "FOR EACH ROW EXECUTE FUNCTION create_account_partitions()"
+    ).execute_if(dialect="postgresql"),
+)
+
+# Изменение api_credentials → NOTIFY: процессы с кэшем расшифрованных
+# ключей (database_security_implementation) сбрасывают запись аккаунта
+event.listen(
+    Base.metadata,
+    "before_create",
+    DDL(
+        "CREATE OR REPLACE FUNCTION notify_api_credentials_changed() RETURNS trigger AS $$ "
+        "BEGIN "
+        "PERFORM pg_notify('api_credentials_changed', COALESCE(NEW.account_id, OLD.account_id)::text); "
+        "RETURN NULL; "
+        "END $$ LANGUAGE plpgsql"
+    ).execute_if(dialect="postgresql"),
+)
+event.listen(
+    ApiCredentials.__table__,
+    "after_create",
+    DDL(
+        "CREATE TRIGGER trg_api_credentials_notify AFTER INSERT OR UPDATE OR DELETE ON api_credentials "
+        "FOR EACH ROW EXECUTE FUNCTION notify_api_credentials_changed()"
+    ).execute_if(dialect="postgresql"),
+)
+
+# DEFAULT-партиция создаётся вместе с таблицей: прямые вставки SysEvents
+# не падают, даже если дневные партиции ещё не созданы
+event.listen(
+    SysEvents.__table__,
+    "after_create",
+    DDL("CREATE UNLOGGED TABLE IF NOT EXISTS sys_events_default PARTITION OF sys_events DEFAULT").execute_if(
+        dialect="postgresql"
+    ),
+)
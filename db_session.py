@@ -1,9 +1,22 @@
 # app/db_session.py
 # -*- coding: utf-8 -*-
 import os
+import json
+import asyncio
 import logging
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
 from sqlalchemy import create_engine, text
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import sessionmaker, scoped_session
+
+try:
+    # Опционально: orjson для JSONB (details_json, parsed_json) в ~5 раз быстрее json
+    import orjson
+except ImportError:
+    orjson = None
 
 logger = logging.getLogger(__name__)
 
@@ -17,14 +30,80 @@ DB_URL = (
 if not DB_URL:
     raise RuntimeError("DATABASE_URL is not set (also checked DB_URL, PSQL_URL)")
 
+# psycopg 3 (pip install "psycopg[binary,pool]>=3.1") — если установлен и
+# драйвер в URL не указан явно, используем его вместо psycopg2:
+# серверный PREPARE и pipeline mode (см. pipeline() ниже)
+try:
+    import psycopg  # noqa: F401
+    _HAS_PSYCOPG3 = True
+except Exception:
+    _HAS_PSYCOPG3 = False
+
+_url = make_url(DB_URL)
+if _url.drivername in ("postgresql", "postgres") and _HAS_PSYCOPG3:
+    DB_URL = _url.set(drivername="postgresql+psycopg").render_as_string(hide_password=False)
+
+# Размер пула: постоянные соединения + временные сверх лимита
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "20"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "40"))
+
+# Кэш скомпилированных statement'ов SQLAlchemy: горячие INSERT/SELECT
+# компилируются один раз на форму запроса (по умолчанию 500 записей)
+DB_QUERY_CACHE_SIZE = int(os.getenv("DB_QUERY_CACHE_SIZE", "1200"))
+
+# psycopg 3: серверный PREPARE после N выполнений одного и того же SQL,
+# дальше PostgreSQL пропускает parse/plan. У psycopg2 такого режима нет.
+DB_PREPARE_THRESHOLD = int(os.getenv("DB_PREPARE_THRESHOLD", "2"))
+
+# Все timestamp-колонки (without time zone) хранят наивный UTC: сессия
+# работает в UTC, поэтому server_default now() и utc_now() в Python дают
+# одну шкалу независимо от часового пояса хоста и сервера БД.
+# Строки, записанные раньше в локальном поясе <tz> (для sys_events,
+# signals_log и колонок с server_default — пояс хоста/сервера), переводятся
+# разово, до момента перехода <cutover>:
+#   UPDATE sys_events SET created_at = (created_at AT TIME ZONE '<tz>') AT TIME ZONE 'UTC'
+#   WHERE created_at < '<cutover>';
+_connect_args = {"options": "-c timezone=UTC"}
+USE_PSYCOPG3 = make_url(DB_URL).get_driver_name() == "psycopg"
+if USE_PSYCOPG3:
+    _connect_args["prepare_threshold"] = DB_PREPARE_THRESHOLD
+
+def utc_now() -> datetime:
+    """Текущий момент как наивный UTC — в формате timestamp-колонок БД"""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def utc_from_timestamp(ts: float) -> datetime:
+    """Unix-время → наивный UTC"""
+    return datetime.fromtimestamp(ts, timezone.utc).replace(tzinfo=None)
+
+
+def _json_serializer(obj) -> str:
+    """Сериализация JSON/JSONB-параметров: orjson, если есть; иначе stdlib json"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+        except TypeError:
+            pass  # например, int > 64 бит — stdlib json справится
+    return json.dumps(obj)
+
+
 # 2) Делаем коннект «живучим»
 engine = create_engine(
     DB_URL,
     future=True,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
     pool_pre_ping=True,     # прозванивать соединение перед запросом
     pool_recycle=1800,      # раз в 30 минут реюз соединения
+    query_cache_size=DB_QUERY_CACHE_SIZE,
+    connect_args=_connect_args,
+    json_serializer=_json_serializer,
 )
 
+# Тот же пул, но без BEGIN/COMMIT — для read-only запросов
+read_engine = engine.execution_options(isolation_level="AUTOCOMMIT")
+
 SessionLocal = sessionmaker(
     bind=engine,
     autoflush=False,
@@ -33,13 +112,98 @@ SessionLocal = sessionmaker(
     future=True,
 )
 
+# 3) Одна Session на поток — горячие пути не создают сессию на каждый вызов
+ScopedSession = scoped_session(SessionLocal)
+
+ReadSessionLocal = sessionmaker(
+    bind=read_engine,
+    autoflush=False,
+    autocommit=False,
+    expire_on_commit=False,
+    future=True,
+)
+ReadScopedSession = scoped_session(ReadSessionLocal)
+
+@contextmanager
+def pipeline():
+    """
+    Connection в одной транзакции (COMMIT на выходе), для пакетной записи
+    нескольких executemany подряд. На psycopg 3 соединение переводится в
+    pipeline mode: statement'ы уходят без ожидания ответа на каждый,
+    синхронизация — один раз на выходе. На psycopg2 — обычная транзакция.
+
+    Результаты внутри блока недоступны до синхронизации, поэтому INSERT'ы
+    строятся через .inline() (без RETURNING первичного ключа).
+    """
+    with engine.begin() as conn:
+        if USE_PSYCOPG3:
+            with conn.connection.driver_connection.pipeline():
+                yield conn
+        else:
+            yield conn
+
+
+# Результат health-check'а кэшируется: сколько бы потребителей (HealthSupervisor,
+# Telegram-хэндлеры, /healthz) ни опрашивали БД, SELECT 1 уходит не чаще раза в TTL
+DB_HEALTH_TTL_SEC = float(os.getenv("DB_HEALTH_TTL_SEC", "1.0"))
+DB_HEALTH_INTERVAL_SEC = float(os.getenv("DB_HEALTH_INTERVAL_SEC", "60"))
+
+
+class DbHealth:
+    """
+    Общий кэшированный probe БД. Одновременные промахи кэша не порождают
+    параллельных SELECT 1: probe выполняет один поток, остальные ждут на
+    блокировке и получают его результат. Async-потребители вызывают get() —
+    probe уходит в поток и не блокирует event loop.
+    """
+
+    def __init__(self, ttl: float = DB_HEALTH_TTL_SEC):
+        self._ttl = ttl
+        self._ok = False
+        self._ts = float("-inf")
+        self._lock = threading.Lock()
+
+    def _fresh(self) -> bool:
+        return time.monotonic() - self._ts < self._ttl
+
+    def probe(self) -> bool:
+        """Безусловная проверка (SELECT 1) с обновлением кэша"""
+        with self._lock:
+            try:
+                with engine.connect() as conn:
+                    conn.execute(text("SELECT 1"))
+                self._ok = True
+            except Exception as e:
+                logger.exception("DB health check failed: %s", e)
+                self._ok = False
+            self._ts = time.monotonic()
+            return self._ok
+
+    def check(self) -> bool:
+        """Результат из кэша, если он свежее TTL, иначе probe()"""
+        if self._fresh():
+            return self._ok
+        with self._lock:
+            if self._fresh():
+                return self._ok
+        return self.probe()
+
+    async def get(self) -> bool:
+        if self._fresh():
+            return self._ok
+        return await asyncio.to_thread(self.check)
+
+    async def run(self, interval: float = DB_HEALTH_INTERVAL_SEC) -> None:
+        """Фоновое обновление: asyncio.create_task(db_health.run())"""
+        while True:
+            await asyncio.to_thread(self.probe)
+            await asyncio.sleep(interval)
+
+
+db_health = DbHealth()
+
+
 def check_db_health() -> bool:
-    """Простой self-check подключения к БД."""
-    try:
-        with engine.connect() as conn:
-            conn.execute(text("SELECT 1"))
-        return True
-    except Exception as e:
-        logger.exception("DB health check failed: %s", e)
-        return False
+    """Простой self-check подключения к БД (результат кэшируется, см. DbHealth)."""
+    return db_health.check()
 
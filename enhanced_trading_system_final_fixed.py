@@ -16,11 +16,15 @@ BYBIT COPY TRADING SYSTEM - ЭТАП 1 (ОКОНЧАТЕЛЬНО ИСПРАВЛ
 """
 
 import asyncio, random, functools
+import atexit
+import copy
+import queue
+import threading
 import time
 import json
 import hmac
+import math
 import numpy as np
-import hashlib
 import logging, logging.handlers
 import requests
 import websockets
@@ -28,16 +32,19 @@ import aiohttp
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple, Any, Union, Callable
 from urllib.parse import urlencode
-from dataclasses import dataclass
+from dataclasses import asdict, dataclass, field, fields
 from enum import Enum, auto
 import psutil
 import gc
-from collections import deque, defaultdict, OrderedDict
+import gzip
+from collections import OrderedDict, deque, defaultdict
 import traceback
 import sys
 import weakref
 import signal
 import os
+import re
+import shutil
 import statistics
 import uuid
 import os, socket
@@ -82,7 +89,7 @@ if not logger.handlers:
 # ================================
 # 1) безопасные импорты: берём recv_window из старого конфига,
 #    а ключи — только из БД через CredentialsStore (обёртка в config.py)
-from config import get_api_credentials, BYBIT_RECV_WINDOW, DEFAULT_TRADE_ACCOUNT_ID
+from config import get_api_credentials, resolve_endpoints, BYBIT_RECV_WINDOW, DEFAULT_TRADE_ACCOUNT_ID
 
 log = logging.getLogger(__name__)
 
@@ -125,13 +132,13 @@ else:
     SOURCE_API_KEY = None
     SOURCE_API_SECRET = None
 
-# 5) Адреса/эндпойнты — можно переопределить через .env, но дефолты те же, что были
-SOURCE_API_URL = os.getenv("SOURCE_API_URL", "https://api.bybit.com")          # донор (mainnet, read-only)
-MAIN_API_URL   = os.getenv("MAIN_API_URL",   "https://api-demo.bybit.com")     # основной (demo по умолчанию)
-
-# WebSocket URLs (Bybit v5) — тоже допускаем override через .env
-SOURCE_WS_URL  = os.getenv("SOURCE_WS_URL",  "wss://stream.bybit.com/v5/private")
-PUBLIC_WS_URL  = os.getenv("PUBLIC_WS_URL",  "wss://stream.bybit.com/v5/public/linear")
+# 5) Адреса/эндпойнты — из таблицы config.BYBIT_ENDPOINTS, override через .env сохраняется.
+#    Основной аккаунт — demo по умолчанию (как и было), донор и WS — mainnet.
+MAIN_API_URL, SOURCE_API_URL, SOURCE_WS_URL, PUBLIC_WS_URL = resolve_endpoints("demo")
+log.info(
+    "Endpoints: main=%s source=%s source_ws=%s public_ws=%s",
+    MAIN_API_URL, SOURCE_API_URL, SOURCE_WS_URL, PUBLIC_WS_URL,
+)
 
 # дальше идёт твой существующий код: RATE_LIMITS, тайминги, константы и т.д.
 
@@ -171,15 +178,25 @@ class RiskDataContext:
         self.daily_dd_percent = 0.0
         self.high_watermark: Optional[float] = None
         self._last_valid_equity: Optional[float] = None
-        self.last_equity_ok_ts = 0.0
+        self.last_equity_ok_ts = float("-inf")  # time.monotonic() последнего валидного equity
         self.equity_state = DataState.UNAVAILABLE
         self._dd_hits = 0
+        # Пороги читаются из конфига один раз, а не на каждом тике
+        self._stale_ttl = cfg.SAFE_MODE["data_stale_ttl_sec"]
+        self._dd_limit = cfg.RISK["drawdown_limit"]
+        self._confirm_reads = cfg.SAFE_MODE["risk_confirm_reads"]
 
-    def update_equity(self, equity: Optional[float]) -> None:
-        now = time.time()
+    def update_equity(self, equity: Optional[float], now: Optional[float] = None) -> None:
+        """
+        Обновление equity на каждом тике: high watermark и просадка считаются
+        инкрементально за O(1). now — time.monotonic(), может передаваться
+        один раз на пачку WS-сообщений.
+        """
+        if now is None:
+            now = time.monotonic()
         if equity is None:
             self.equity_state = (
-                DataState.UNAVAILABLE if now - self.last_equity_ok_ts > self.cfg.SAFE_MODE["data_stale_ttl_sec"]
+                DataState.UNAVAILABLE if now - self.last_equity_ok_ts > self._stale_ttl
                 else DataState.STALE
             )
             self._dd_hits = 0
@@ -187,13 +204,10 @@ class RiskDataContext:
         self.equity_state = DataState.OK
         self.last_equity_ok_ts = now
         self._last_valid_equity = equity
-        if self.high_watermark is None:
-            self.high_watermark = equity
-        self.high_watermark = max(self.high_watermark, equity)
-        if self.high_watermark > 0:
-            self.dd_percent = max(0.0, (self.high_watermark - equity) / self.high_watermark)
-        else:
-            self.dd_percent = 0.0
+        hwm = self.high_watermark
+        if hwm is None or equity > hwm:
+            hwm = self.high_watermark = equity
+        self.dd_percent = (hwm - equity) / hwm if hwm > 0 else 0.0
 
     def update_daily_dd(self, daily_equity: Optional[float], daily_high: Optional[float]) -> None:
         if daily_equity and daily_high and daily_high > 0:
@@ -204,11 +218,11 @@ class RiskDataContext:
             self._dd_hits = 0
             return False
         dd2 = self.dd_percent if positional_dd is None else positional_dd
-        if self.dd_percent >= self.cfg.RISK["drawdown_limit"] and dd2 >= self.cfg.RISK["drawdown_limit"]:
+        if self.dd_percent >= self._dd_limit and dd2 >= self._dd_limit:
             self._dd_hits += 1
         else:
             self._dd_hits = 0
-        return self._dd_hits >= self.cfg.SAFE_MODE["risk_confirm_reads"]
+        return self._dd_hits >= self._confirm_reads
 
     def is_data_reliable(self) -> bool:
         return self.equity_state is DataState.OK
@@ -280,25 +294,35 @@ class HealthSupervisor:
         factor = _SM["api_backoff_factor"] if factor is None else factor
         max_delay = _SM["api_backoff_max"] if max_delay is None else max_delay
 
+        # Расписание backoff считается один раз при сборке декоратора:
+        # delays[i] = min(base * factor**i, max_delay)
+        delays = []
+        delay = base
+        for _ in range(retries):
+            delays.append(delay)
+            delay = min(delay * factor, max_delay)
+        delays = tuple(delays)
+        # Jitter тянется на каждую попытку заново: общий предвычисленный
+        # jitter синхронизировал бы ретраи всех вызывающих
+        jitter_spans = tuple(0.2 * d for d in delays)
+        last_attempt = retries - 1
+
         def decorator(func):
             @functools.wraps(func)
             async def wrapper(*a, **kw):
-                delay = base
                 last = None
                 for attempt in range(retries):
                     try:
                         return await func(*a, **kw)
                     except retriable as e:
                         last = e
-                        if attempt == retries - 1:
+                        if attempt == last_attempt:
                             logger.error("%s failed after %d attempts: %s", func.__name__, retries, e)
                             raise
-                        jitter = random.random() * 0.2 * delay
-                        sleep_sec = min(delay + jitter, max_delay)
+                        sleep_sec = min(delays[attempt] + random.random() * jitter_spans[attempt], max_delay)
                         logger.warning("%s attempt %d/%d failed: %s. Retry in %.2fs",
                                        func.__name__, attempt+1, retries, e, sleep_sec)
                         await asyncio.sleep(sleep_sec)
-                        delay = min(delay * factor, max_delay)
                 raise last
             return wrapper
         return decorator
@@ -307,6 +331,66 @@ class HealthSupervisor:
 # 1.4 PRODUCTION LOGGING SYSTEM
 # ================================
 
+try:
+    # Опционально: orjson (Rust) сериализует JSON-записи логов в 5-10 раз быстрее json
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _log_json_default(obj):
+    """Типы, которых нет в JSON: datetime → ISO-8601, остальное (Decimal, Exception...) → str"""
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    return str(obj)
+
+
+def _log_json_dumps(obj) -> str:
+    """JSON-строка для лог-записи (handlers ждут str, а не bytes)"""
+    if orjson is not None:
+        return orjson.dumps(obj, default=_log_json_default, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+    return json.dumps(obj, ensure_ascii=False, default=_log_json_default)
+
+
+try:
+    # Опционально: msgspec кодирует записи JSONFormatter по фиксированной схеме
+    # (Struct) — быстрее, чем сборка dict'а + orjson
+    import msgspec
+except ImportError:
+    msgspec = None
+
+if msgspec is not None:
+    class _LogRecordStruct(msgspec.Struct, omit_defaults=True):
+        """Обязательные поля JSON-записи лога (exception — только если есть)"""
+        timestamp: str
+        level: str
+        logger: str
+        message: str
+        module: str
+        function: Optional[str]
+        line: int
+        exception: Optional[str] = None
+
+    _LOG_STRUCT_FIELDS = frozenset(_LogRecordStruct.__struct_fields__)
+    _LOG_ENCODER = msgspec.json.Encoder(enc_hook=_log_json_default)
+
+
+def _gzip_log_namer(name: str) -> str:
+    """Имя ротированного лога: app.log.1 -> app.log.1.gz"""
+    return name + ".gz"
+
+
+def _gzip_log_rotator(source: str, dest: str) -> None:
+    """Ротация со сжатием (рецепт из logging cookbook)"""
+    with open(source, "rb") as f_in, gzip.open(dest, "wb") as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    os.remove(source)
+
+
+# Неизменное начало JSON-записи log_performance
+_PERF_LOG_PREFIX = '{"event_type":"performance","operation":'
+
+
 class ProductionLogger:
     """
     📝 ENTERPRISE-GRADE СИСТЕМА ЛОГИРОВАНИЯ
@@ -402,6 +486,11 @@ class ProductionLogger:
             encoding='utf-8'
         )
         
+        # Ротированные файлы сжимаются gzip'ом (ротация идёт в потоке QueueListener)
+        for handler in (main_handler, error_handler, perf_handler):
+            handler.namer = _gzip_log_namer
+            handler.rotator = _gzip_log_rotator
+        
         # JSON форматтеры для structured logging
         if self.enable_json:
             json_formatter = JSONFormatter()
@@ -409,22 +498,33 @@ class ProductionLogger:
             error_handler.setFormatter(json_formatter)
             perf_handler.setFormatter(json_formatter)
         else:
-            standard_formatter = logging.Formatter(
+            standard_formatter = CachingFormatter(
                 '%(asctime)s [%(levelname)8s] %(name)s:%(lineno)d - %(message)s'
             )
             main_handler.setFormatter(standard_formatter)
             error_handler.setFormatter(standard_formatter)
             perf_handler.setFormatter(standard_formatter)
         
-        # Добавляем handlers
-        self.logger.addHandler(main_handler)
-        self.logger.addHandler(error_handler)
+        # Добавляем handlers: на logger'е только QueueHandler, запись на диск
+        # (и ротация) — в фоновом потоке QueueListener, не в вызывающем потоке
+        self._listeners = []
+        self.logger.addHandler(self._queue_handler(main_handler, error_handler))
         
-        # Отдельный logger для performance
+        # Отдельный logger для performance (своя очередь — своя почасовая ротация)
         self.perf_logger = logging.getLogger(f"{self.app_name}.performance")
-        self.perf_logger.addHandler(perf_handler)
+        self.perf_logger.addHandler(self._queue_handler(BatchingFileHandler(perf_handler)))
         self.perf_logger.setLevel(logging.INFO)
     
+    def _queue_handler(self, *handlers: logging.Handler) -> logging.Handler:
+        """QueueHandler + запущенный QueueListener над handlers (остановка — atexit)"""
+        log_queue = queue.Queue(-1)
+        listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+        listener.start()
+        self._listeners.append(listener)
+        # stop() дописывает всё, что осталось в очереди
+        atexit.register(listener.stop)
+        return DeferredQueueHandler(log_queue)
+    
     def log_performance(self, 
                        operation: str,
                        duration: float,
@@ -437,130 +537,450 @@ class ProductionLogger:
         # Обновляем внутренние метрики
         self.metrics.record_operation(operation, duration, success)
         
-        # Structured log entry
-        log_entry = {
-            'event_type': 'performance',
-            'operation': operation,
-            'duration_ms': round(duration * 1000, 2),
-            'success': success,
-            'timestamp': datetime.utcnow().isoformat(),
-            'metadata': metadata or {}
-        }
+        # Запись отфильтрована уровнем — не собираем и не сериализуем payload
+        perf_logger = getattr(self, 'perf_logger', None)
+        if perf_logger is None or not perf_logger.isEnabledFor(logging.INFO):
+            return
         
-        if hasattr(self, 'perf_logger'):
-            self.perf_logger.info(json.dumps(log_entry))
+        # Structured log entry: ключи и event_type неизменны, поэтому JSON
+        # собирается из готовых фрагментов, сериализуются только значения.
+        # NaN/inf в JSON не существуют — как и orjson, пишем null
+        duration_ms = float(round(duration * 1000, 2))
+        perf_logger.info(
+            f'{_PERF_LOG_PREFIX}{_log_json_dumps(operation)}'
+            f',"duration_ms":{repr(duration_ms) if math.isfinite(duration_ms) else "null"}'
+            f',"success":{"true" if success else "false"}'
+            f',"timestamp":"{datetime.utcnow().isoformat()}"'
+            f',"metadata":{_log_json_dumps(metadata) if metadata else "{}"}}}'
+        )
     
     def log_error(self, 
                   error: Exception,
                   context: Dict[str, Any] = None,
                   send_alert: bool = True):
         """Расширенное логирование ошибок с alerting"""
+        # Severity — первым: от неё зависит, нужен ли alert. Без записи в лог
+        # и без alert'а payload (с traceback'ом) не нужен
+        severity = self.error_alerter._classify_error_severity(error)
+        log_enabled = self.logger.isEnabledFor(logging.ERROR)
+        alert = send_alert and severity in ('high', 'critical')
+        if not log_enabled and not alert:
+            return
         
+        # Traceback попадает только в JSON-запись лога: в текстовый лог
+        # и в alert он не идёт, и стек в этих случаях не обходим
+        with_traceback = log_enabled and self.enable_json
         error_info = {
             'event_type': 'error',
             'error_type': type(error).__name__,
             'error_message': str(error),
-            'traceback': traceback.format_exc(),
+            'traceback': traceback.format_exc() if with_traceback else None,
             'context': context or {},
             'timestamp': datetime.utcnow().isoformat(),
-            'severity': self.error_alerter._classify_error_severity(error)
+            'severity': severity
         }
         
-        # Логируем
-        self.logger.error(json.dumps(error_info) if self.enable_json else error_info['error_message'])
+        # Логируем. В JSON-режиме поля уходят в extra и попадают в запись
+        # JSONFormatter'а на верхний уровень — сериализация одна, без
+        # JSON-строки внутри JSON. timestamp записи ставит сам formatter
+        if log_enabled:
+            if self.enable_json:
+                self.logger.error(error_info['error_message'], extra={
+                    key: value for key, value in error_info.items()
+                    if key not in ('error_message', 'timestamp')
+                })
+            else:
+                self.logger.error(error_info['error_message'])
         
         # Отправляем alert для критичных ошибок
-        if send_alert and error_info['severity'] in ['high', 'critical']:
-            asyncio.create_task(self.error_alerter.send_alert(error_info))
+        if alert:
+            self.error_alerter.enqueue_alert(error_info)
 
-class JSONFormatter(logging.Formatter):
-    """JSON форматтер для structured logging"""
+class CachingFormatter(logging.Formatter):
+    """
+    Formatter, который форматирует запись один раз: результат кэшируется
+    на самой записи и переиспользуется другими handler'ами с тем же
+    formatter'ом (main_handler + error_handler для ERROR-записей).
+    """
     
     def format(self, record):
+        cached = record.__dict__.get('_formatted')
+        if cached is not None and cached[0] is self:
+            return cached[1]
+        text = self._format_record(record)
+        record._formatted = (self, text)
+        return text
+    
+    def _format_record(self, record) -> str:
+        return super().format(record)
+
+class JSONFormatter(CachingFormatter):
+    """JSON форматтер для structured logging"""
+    
+    # Стандартные атрибуты LogRecord — всё остальное считается extra-полями
+    _RESERVED = frozenset({
+        'name', 'msg', 'args', 'levelname', 'levelno', 'pathname',
+        'filename', 'module', 'lineno', 'funcName', 'created',
+        'msecs', 'relativeCreated', 'thread', 'threadName',
+        'processName', 'process', 'taskName', 'getMessage', 'exc_info',
+        'exc_text', 'stack_info', 'message', 'asctime', '_formatted',
+    })
+    
+    # (секунда, ISO-строка до секунд): datetime строится раз в секунду, а не на запись
+    _ts_cache: Tuple[int, str] = (-1, '')
+    
+    @classmethod
+    def _format_timestamp(cls, created: float) -> str:
+        """record.created -> ISO-8601 UTC с микросекундами"""
+        sec = int(created)
+        cached_sec, cached_str = cls._ts_cache
+        if sec != cached_sec:
+            cached_str = datetime.utcfromtimestamp(sec).isoformat()
+            cls._ts_cache = (sec, cached_str)
+        return f"{cached_str}.{int((created - sec) * 1e6):06d}"
+    
+    def _format_record(self, record):
+        # время создания записи, а не форматирования (оно идёт в потоке QueueListener)
+        timestamp = self._format_timestamp(record.created)
+        message = record.getMessage()
+        
+        # Добавляем exception info если есть; traceback форматируется один раз
+        # и кэшируется в record.exc_text, как в logging.Formatter.format
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        
+        # Extra fields если есть
+        extras = {
+            key: value for key, value in record.__dict__.items()
+            if key not in self._RESERVED
+        }
+        
+        # msgspec: обязательные поля кодируются по схеме Struct без промежуточного
+        # dict'а; extras дописываются в тот же JSON-объект. Если extra-поле
+        # перекрывает стандартное — общий путь через dict (extra побеждает)
+        if msgspec is not None and not extras.keys() & _LOG_STRUCT_FIELDS:
+            data = _LOG_ENCODER.encode(_LogRecordStruct(
+                timestamp, record.levelname, record.name, message,
+                record.module, record.funcName, record.lineno, record.exc_text or None,
+            ))
+            if extras:
+                data = data[:-1] + b',' + _LOG_ENCODER.encode(extras)[1:]
+            return data.decode("utf-8")
+        
         log_entry = {
-            'timestamp': datetime.utcnow().isoformat(),
+            'timestamp': timestamp,
             'level': record.levelname,
             'logger': record.name,
-            'message': record.getMessage(),
+            'message': message,
             'module': record.module,
             'function': record.funcName,
             'line': record.lineno
         }
+        if record.exc_text:
+            log_entry['exception'] = record.exc_text
+        log_entry.update(extras)
         
-        # Добавляем exception info если есть
-        if record.exc_info:
-            log_entry['exception'] = self.formatException(record.exc_info)
-        
-        # Добавляем extra fields если есть
-        for key, value in record.__dict__.items():
-            if key not in ['name', 'msg', 'args', 'levelname', 'levelno', 'pathname', 
-                          'filename', 'module', 'lineno', 'funcName', 'created', 
-                          'msecs', 'relativeCreated', 'thread', 'threadName', 
-                          'processName', 'process', 'getMessage', 'exc_info', 'exc_text']:
-                log_entry[key] = value
-        
-        return json.dumps(log_entry, ensure_ascii=False)
+        return _log_json_dumps(log_entry)
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler без форматирования в вызывающем потоке. Стандартный
+    prepare() форматирует запись (включая traceback) и кладёт текст в msg,
+    обнуляя exc_info/exc_text — JSON-логи теряют поле exception, а стоимость
+    форматирования остаётся на горячем пути. Здесь в вызывающем потоке
+    только подставляются args; exc_info сохраняется, и traceback форматирует
+    formatter целевого handler'а в потоке QueueListener.
+    """
+    
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        # args могут быть изменяемыми объектами — фиксируем текст сейчас
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+class BatchingFileHandler(logging.handlers.BufferingHandler):
+    """
+    Копит записи и пишет их в файловый handler пачкой — одним write() на
+    capacity записей или на flush_interval секунд, а не на каждую запись.
+    Записи уровня ERROR и выше сбрасываются сразу. Ротация — по правилам
+    target (проверяется по первой записи пачки).
+    """
+    
+    def __init__(self, target: logging.StreamHandler, capacity: int = 200,
+                 flush_interval: float = 0.1):
+        super().__init__(capacity)
+        self.target = target
+        self.flush_interval = flush_interval
+        self._last_flush = time.monotonic()
+        # Хвост пачки дописывается по таймеру, даже если новых записей нет
+        self._stop_event = threading.Event()
+        self._flusher = threading.Thread(
+            target=self._flusher_loop, name="LogBatchFlusher", daemon=True
+        )
+        self._flusher.start()
+    
+    def shouldFlush(self, record: logging.LogRecord) -> bool:
+        return (
+            len(self.buffer) >= self.capacity
+            or record.levelno >= logging.ERROR
+            or time.monotonic() - self._last_flush >= self.flush_interval
+        )
+    
+    def flush(self):
+        self.acquire()
+        try:
+            if self.buffer:
+                target = self.target
+                try:
+                    if isinstance(target, logging.handlers.BaseRotatingHandler) \
+                            and target.shouldRollover(self.buffer[0]):
+                        target.doRollover()
+                    terminator = target.terminator
+                    text = terminator.join(target.format(r) for r in self.buffer) + terminator
+                    if target.stream is None:
+                        target.stream = target._open()
+                    target.stream.write(text)
+                    target.flush()
+                except Exception:
+                    self.handleError(self.buffer[0])
+                self.buffer.clear()
+            self._last_flush = time.monotonic()
+        finally:
+            self.release()
+    
+    def _flusher_loop(self):
+        while not self._stop_event.wait(self.flush_interval):
+            self.flush()
+    
+    def close(self):
+        self._stop_event.set()
+        try:
+            self.flush()
+            self.target.close()
+        finally:
+            super().close()
 
 class LogMetrics:
     """Сбор и анализ метрик логирования"""
     
+    # Долгоживущий singleton на горячем пути: без __dict__ у экземпляра
+    __slots__ = (
+        '_op_ids', '_count', '_success', '_total', '_max', '_min',
+        '_hist', '_hist_idx', '_epoch_ns', 'error_counts',
+    )
+    
+    HISTORY_SIZE = 1000
+    _HIST_DTYPE = np.dtype([
+        ('op_id', 'i4'),
+        ('duration', 'f4'),
+        ('success', '?'),
+        ('ts', 'u8'),   # time.monotonic_ns()
+    ])
+    
     def __init__(self):
-        self.operation_stats = defaultdict(lambda: {
-            'count': 0,
-            'success_count': 0,
-            'total_duration': 0,
-            'max_duration': 0,
-            'min_duration': float('inf')
-        })
+        # Structure-of-arrays: id операции -> индекс в параллельных массивах.
+        # Горячий путь обновляет скаляры в списках (это дешевле поэлементной
+        # записи в np.ndarray), сводка считается векторно через NumPy.
+        self._op_ids: Dict[str, int] = {}
+        self._count: List[int] = []
+        self._success: List[int] = []
+        self._total: List[float] = []
+        self._max: List[float] = []
+        self._min: List[float] = []
         
         self.error_counts = defaultdict(int)
-        self.performance_history = deque(maxlen=1000)
+        
+        # История для анализа трендов: кольцевой буфер фиксированного размера,
+        # без dict'а на каждую запись
+        self._hist = np.zeros(self.HISTORY_SIZE, dtype=self._HIST_DTYPE)
+        self._hist_idx = 0
+        # Смещение monotonic -> wall clock (ns), фиксируется один раз
+        self._epoch_ns = time.time_ns() - time.monotonic_ns()
     
     def record_operation(self, operation: str, duration: float, success: bool):
         """Записать метрику операции"""
-        stats = self.operation_stats[operation]
-        stats['count'] += 1
-        stats['total_duration'] += duration
+        i = self._op_ids.get(operation)
+        if i is None:
+            i = self._op_ids[operation] = len(self._count)
+            self._count.append(0)
+            self._success.append(0)
+            self._total.append(0.0)
+            self._max.append(0.0)
+            self._min.append(float('inf'))
+        
+        self._count[i] += 1
+        self._total[i] += duration
         
         if success:
-            stats['success_count'] += 1
+            self._success[i] += 1
         
-        stats['max_duration'] = max(stats['max_duration'], duration)
-        stats['min_duration'] = min(stats['min_duration'], duration)
+        if duration > self._max[i]:
+            self._max[i] = duration
+        if duration < self._min[i]:
+            self._min[i] = duration
         
         # История для анализа трендов
-        self.performance_history.append({
-            'operation': operation,
-            'duration': duration,
-            'success': success,
-            'timestamp': time.time()
-        })
+        self._hist[self._hist_idx % self.HISTORY_SIZE] = (i, duration, success, time.monotonic_ns())
+        self._hist_idx += 1
+    
+    @property
+    def performance_history(self) -> np.ndarray:
+        """
+        Последние HISTORY_SIZE записей (op_id, duration, success, ts) от старых
+        к новым; ts — time.monotonic_ns(), см. to_wall_time()
+        """
+        if self._hist_idx <= self.HISTORY_SIZE:
+            return self._hist[:self._hist_idx]
+        return np.roll(self._hist, -(self._hist_idx % self.HISTORY_SIZE))
+    
+    def to_wall_time(self, ts_ns) -> float:
+        """Monotonic-тики из истории -> Unix time (секунды)"""
+        return (ts_ns + self._epoch_ns) / 1e9
+    
+    def get_history_stats(self, operation: str) -> Dict[str, Any]:
+        """Статистика по окну истории для одной операции"""
+        i = self._op_ids.get(operation)
+        if i is None:
+            return {}
+        hist = self.performance_history
+        samples = hist[hist['op_id'] == i]
+        if samples.size == 0:
+            return {}
+        durations = samples['duration']
+        return {
+            'samples': int(samples.size),
+            'success_rate': round(float(samples['success'].mean()) * 100, 2),
+            'avg_duration_ms': round(float(durations.mean()) * 1000, 2),
+            'p95_duration_ms': round(float(np.percentile(durations, 95)) * 1000, 2),
+            'last_seen': self.to_wall_time(int(samples['ts'][-1]))
+        }
     
     def get_performance_summary(self) -> Dict[str, Any]:
         """Получить сводку производительности"""
-        summary = {}
-        
-        for operation, stats in self.operation_stats.items():
-            if stats['count'] > 0:
-                avg_duration = stats['total_duration'] / stats['count']
-                success_rate = stats['success_count'] / stats['count']
-                
-                summary[operation] = {
-                    'total_calls': stats['count'],
-                    'success_rate': round(success_rate * 100, 2),
-                    'avg_duration_ms': round(avg_duration * 1000, 2),
-                    'max_duration_ms': round(stats['max_duration'] * 1000, 2),
-                    'min_duration_ms': round(stats['min_duration'] * 1000, 2)
-                }
+        if not self._op_ids:
+            return {}
+        
+        # Снимок: операции, добавленные во время расчёта, войдут в следующую сводку
+        names = list(self._op_ids)
+        n = len(names)
+        count = np.asarray(self._count[:n], dtype=np.float64)
+        
+        # Вся арифметика и округление — векторно, в Python только сборка dict'а
+        columns = (
+            self._count[:n],
+            np.round(np.asarray(self._success[:n]) / count * 100, 2).tolist(),
+            np.round(np.asarray(self._total[:n]) / count * 1000, 2).tolist(),
+            np.round(np.asarray(self._max[:n]) * 1000, 2).tolist(),
+            np.round(np.asarray(self._min[:n]) * 1000, 2).tolist(),
+        )
         
-        return summary
+        return {
+            operation: {
+                'total_calls': calls,
+                'success_rate': success_rate,
+                'avg_duration_ms': avg_ms,
+                'max_duration_ms': max_ms,
+                'min_duration_ms': min_ms
+            }
+            for operation, calls, success_rate, avg_ms, max_ms, min_ms in zip(names, *columns)
+        }
+
+def _keywords_re(*keywords: str) -> "re.Pattern":
+    """Одна regex-альтернатива вместо цикла `keyword in message`"""
+    return re.compile('|'.join(map(re.escape, keywords)))
 
 class ErrorAlerter:
     """Система отправки alerts для критичных ошибок"""
     
+    __slots__ = ('alert_cooldown', 'recent_alerts', '_queue', '_worker')
+    
+    # Критические ошибки - требуют немедленного внимания
+    _CRITICAL_ERRORS = frozenset({
+        'ConnectionError', 'TimeoutError', 'AuthenticationError',
+        'ConnectionResetError', 'ConnectionRefusedError', 'OSError'
+    })
+    
+    # Высокоприоритетные ошибки - влияют на торговлю
+    _HIGH_ERRORS = frozenset({
+        'RateLimitError', 'APIError', 'ValidationError', 'HTTPError',
+        'InvalidSignatureError', 'InsufficientBalanceError'
+    })
+    
+    # Средние ошибки - требуют внимания но не критичны
+    _MEDIUM_ERRORS = frozenset({
+        'ValueError', 'KeyError', 'TypeError', 'AttributeError',
+        'JSONDecodeError', 'ParseError'
+    })
+    
+    # Ключевые слова в тексте ошибки (сообщение приводится к lower())
+    _CRITICAL_RE = _keywords_re(
+        'connection refused', 'connection reset', 'network unreachable',
+        'authentication failed', 'invalid api key', 'signature verification failed',
+        'server error', 'internal server error', 'service unavailable'
+    )
+    _HIGH_RE = _keywords_re(
+        'rate limit', 'too many requests', 'quota exceeded',
+        'insufficient balance', 'position not found', 'order failed',
+        'market closed', 'trading suspended'
+    )
+    _MEDIUM_RE = _keywords_re(
+        'invalid parameter', 'missing field', 'validation error',
+        'parse error', 'format error', 'data error'
+    )
+    _FALLBACK_HIGH_RE = _keywords_re('network', 'connection', 'socket')
+    _FALLBACK_MEDIUM_RE = _keywords_re('bybit', 'api')
+    
+    _SEVERITY_EMOJI = {
+        'critical': '🚨',
+        'high': '⚠️',
+        'medium': '🔶',
+        'low': 'ℹ️'
+    }
+    
+    MAX_RECENT_ALERTS = 4096
+    ALERT_QUEUE_SIZE = 256
+    
     def __init__(self):
         self.alert_cooldown = 300  # 5 минут между одинаковыми алертами
-        self.recent_alerts = {}
+        # alert_key -> время отправки, в порядке отправки (старые в начале)
+        self.recent_alerts: "OrderedDict[str, float]" = OrderedDict()
+        # Очередь alert'ов и её единственный worker — создаются лениво
+        # в event loop'е первого вызова enqueue_alert
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+    
+    def enqueue_alert(self, error_info: Dict[str, Any]) -> bool:
+        """
+        Ставит alert в ограниченную очередь, не блокируя вызывающего.
+        Alert'ы отправляет один worker по очереди; при переполнении очереди
+        или без запущенного event loop alert отбрасывается.
+        """
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            logging.getLogger('error_alerter').debug("No running event loop, alert dropped")
+            return False
+        
+        if self._worker is None or self._worker.done() or self._worker.get_loop() is not loop:
+            self._queue = asyncio.Queue(maxsize=self.ALERT_QUEUE_SIZE)
+            self._worker = loop.create_task(self._alert_worker(self._queue))
+        
+        try:
+            self._queue.put_nowait(error_info)
+            return True
+        except asyncio.QueueFull:
+            logging.getLogger('error_alerter').debug("Alert queue full, alert dropped")
+            return False
+    
+    async def _alert_worker(self, alert_queue: asyncio.Queue):
+        """Единственный потребитель очереди alert'ов"""
+        while True:
+            error_info = await alert_queue.get()
+            try:
+                await self.send_alert(error_info)
+            finally:
+                alert_queue.task_done()
     
     async def send_alert(self, error_info: Dict[str, Any]):
         """Отправка alert"""
@@ -569,11 +989,20 @@ class ErrorAlerter:
             alert_key = f"{error_info['error_type']}:{error_info.get('operation', 'unknown')}"
             now = time.time()
             
-            if alert_key in self.recent_alerts:
-                if now - self.recent_alerts[alert_key] < self.alert_cooldown:
-                    return  # Слишком рано для повторного алерта
+            # Выбрасываем ключи с истёкшим cooldown — они всегда в начале
+            recent = self.recent_alerts
+            while recent:
+                oldest_key, sent_at = next(iter(recent.items()))
+                if now - sent_at < self.alert_cooldown:
+                    break
+                recent.popitem(last=False)
+            
+            if alert_key in recent:
+                return  # Слишком рано для повторного алерта
             
-            self.recent_alerts[alert_key] = now
+            recent[alert_key] = now
+            if len(recent) > self.MAX_RECENT_ALERTS:
+                recent.popitem(last=False)
             
             # Формируем сообщение
             alert_message = self._format_alert_message(error_info)
@@ -589,14 +1018,7 @@ class ErrorAlerter:
     
     def _format_alert_message(self, error_info: Dict[str, Any]) -> str:
         """Форматирование сообщения алерта"""
-        severity_emoji = {
-            'critical': '🚨',
-            'high': '⚠️',
-            'medium': '🔶',
-            'low': 'ℹ️'
-        }
-        
-        emoji = severity_emoji.get(error_info['severity'], '❗')
+        emoji = self._SEVERITY_EMOJI.get(error_info['severity'], '❗')
         
         message = f"""{emoji} **TRADING SYSTEM ALERT** {emoji}
 
@@ -605,82 +1027,48 @@ class ErrorAlerter:
 **Message:** {error_info['error_message']}
 **Time:** {error_info['timestamp']}
 
-**Context:** {json.dumps(error_info.get('context', {}), indent=2)}
+**Context:** {self._format_context(error_info.get('context', {}))}
 """
         
         return message
     
+    @staticmethod
+    def _format_context(context: Dict[str, Any]) -> str:
+        """Контекст алерта как JSON с отступами (orjson, если есть)"""
+        if orjson is not None:
+            return orjson.dumps(
+                context,
+                default=_log_json_default,
+                option=orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS,
+            ).decode("utf-8")
+        return json.dumps(context, indent=2, sort_keys=True, ensure_ascii=False, default=_log_json_default)
+    
     def _classify_error_severity(self, error: Exception) -> str:
         """Классификация серьезности ошибки"""
         try:
             error_type = type(error).__name__
-            error_message = str(error).lower()
-        
-            # Критические ошибки - требуют немедленного внимания
-            critical_errors = [
-                'ConnectionError', 'TimeoutError', 'AuthenticationError',
-                'ConnectionResetError', 'ConnectionRefusedError', 'OSError'
-            ]
-        
-            # Высокоприоритетные ошибки - влияют на торговлю
-            high_errors = [
-                'RateLimitError', 'APIError', 'ValidationError', 'HTTPError',
-                'InvalidSignatureError', 'InsufficientBalanceError'
-            ]
-        
-            # Средние ошибки - требуют внимания но не критичны
-            medium_errors = [
-                'ValueError', 'KeyError', 'TypeError', 'AttributeError',
-                'JSONDecodeError', 'ParseError'
-            ]
         
             # Проверяем по типу ошибки
-            if error_type in critical_errors:
+            if error_type in self._CRITICAL_ERRORS:
                 return 'critical'
-            elif error_type in high_errors:
+            elif error_type in self._HIGH_ERRORS:
                 return 'high'
-            elif error_type in medium_errors:
+            elif error_type in self._MEDIUM_ERRORS:
                 return 'medium'
         
-            # Проверяем по содержанию сообщения
-            critical_keywords = [
-                'connection refused', 'connection reset', 'network unreachable',
-                'authentication failed', 'invalid api key', 'signature verification failed',
-                'server error', 'internal server error', 'service unavailable'
-            ]
-        
-            high_keywords = [
-                'rate limit', 'too many requests', 'quota exceeded',
-                'insufficient balance', 'position not found', 'order failed',
-                'market closed', 'trading suspended'
-            ]
-        
-            medium_keywords = [
-                'invalid parameter', 'missing field', 'validation error',
-                'parse error', 'format error', 'data error'
-            ]
-        
-            # Проверяем критические ключевые слова
-            for keyword in critical_keywords:
-                if keyword in error_message:
-                    return 'critical'
-        
-            # Проверяем высокоприоритетные ключевые слова
-            for keyword in high_keywords:
-                if keyword in error_message:
-                    return 'high'
-        
-            # Проверяем средние ключевые слова
-            for keyword in medium_keywords:
-                if keyword in error_message:
-                    return 'medium'
-        
-            # Дополнительные проверки
-            if 'network' in error_message or 'connection' in error_message:
+            # Проверяем по содержанию сообщения: один проход regex на уровень
+            error_message = str(error).lower()
+            if self._CRITICAL_RE.search(error_message):
+                return 'critical'
+            elif self._HIGH_RE.search(error_message):
                 return 'high'
-            elif 'websocket' in error_message or 'socket' in error_message:
+            elif self._MEDIUM_RE.search(error_message):
+                return 'medium'
+        
+            # Дополнительные проверки (network/connection/websocket/socket, bybit/api)
+            if self._FALLBACK_HIGH_RE.search(error_message):
                 return 'high'
-            elif 'bybit' in error_message or 'api' in error_message:
+            elif self._FALLBACK_MEDIUM_RE.search(error_message):
                 return 'medium'
         
             # По умолчанию - низкий приоритет
@@ -755,6 +1143,121 @@ class CircuitBreakerConfig:
     expected_exception: Exception = Exception
     half_open_max_calls: int = 3        # Max calls in half-open state
 
+# Response time EMA weights (new sample / previous average)
+EMA_ALPHA = 0.1
+EMA_DECAY = 1 - EMA_ALPHA
+
+@dataclass(slots=True)
+class ConnectionStats:
+    """Connection pool statistics of EnterpriseBybitConnector"""
+    total_requests: int = 0
+    reused_connections: int = 0
+    new_connections: int = 0
+    avg_response_time: float = 0.0
+    connection_pool_hits: int = 0
+    connection_pool_misses: int = 0
+    active_connections: int = 0
+    max_connections_used: int = 0
+
+@dataclass(slots=True)
+class ConnectorHealthMetrics:
+    """Request outcome counters of EnterpriseBybitConnector"""
+    successful_requests: int = 0
+    failed_requests: int = 0
+    timeout_errors: int = 0
+    connection_errors: int = 0
+    last_health_check: float = field(default_factory=time.time)
+
+@dataclass(slots=True)
+class NetworkHealth:
+    """Network health tracking of NetworkResilienceManager"""
+    consecutive_successes: int = 0
+    consecutive_failures: int = 0
+    avg_response_time: float = 0.0
+    total_requests: int = 0
+    success_rate: float = 100.0
+    last_success_time: float = field(default_factory=time.time)
+    last_failure_time: float = 0
+
+@dataclass(slots=True)
+class FailureAnalysis:
+    """Failure counters by error type (unknown types go to unknown_errors)"""
+    timeout_errors: int = 0
+    connection_errors: int = 0
+    http_errors: int = 0
+    api_errors: int = 0
+    unknown_errors: int = 0
+    
+    def record(self, error_type: str):
+        if error_type not in _FAILURE_TYPES:
+            error_type = 'unknown_errors'
+        setattr(self, error_type, getattr(self, error_type) + 1)
+
+_FAILURE_TYPES = frozenset(f.name for f in fields(FailureAnalysis))
+
+RESPONSE_WINDOW = 100
+
+@dataclass(slots=True)
+class ResilienceMetrics:
+    """Response time and circuit breaker metrics of NetworkResilienceManager"""
+    # Last RESPONSE_WINDOW response times: preallocated ring buffer,
+    # min/max/percentiles are computed over it only at report time
+    response_times: np.ndarray = field(default_factory=lambda: np.empty(RESPONSE_WINDOW, dtype=np.float64))
+    rt_idx: int = 0
+    rt_count: int = 0
+    hourly_success_rate: float = 100.0
+    circuit_breaker_activations: int = 0
+    
+    def record_response_time(self, response_time: float):
+        self.response_times[self.rt_idx] = response_time
+        self.rt_idx = (self.rt_idx + 1) % RESPONSE_WINDOW
+        if self.rt_count < RESPONSE_WINDOW:
+            self.rt_count += 1
+    
+    def window(self) -> np.ndarray:
+        """Filled part of the ring buffer (order does not matter for the stats)"""
+        return self.response_times[:self.rt_count]
+
+_SHARED_CONNECTOR: Optional[aiohttp.TCPConnector] = None
+
+def _get_shared_connector() -> aiohttp.TCPConnector:
+    """Process-wide TCPConnector for Bybit sessions (recreated if closed or bound to another loop)"""
+    global _SHARED_CONNECTOR
+    
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+    
+    connector = _SHARED_CONNECTOR
+    if connector is not None and not connector.closed and (loop is None or connector._loop is loop):
+        return connector
+    
+    # FIXED: Remove unsupported parameters for aiohttp TCPConnector
+    _SHARED_CONNECTOR = aiohttp.TCPConnector(
+        limit=200,                    # Total connections
+        limit_per_host=50,           # Per-host limit  
+        ttl_dns_cache=300,           # DNS cache TTL (5 minutes)
+        use_dns_cache=True,          # Enable DNS caching
+        # Idle keep-alive below the AWS load balancer idle timeout (Bybit is
+        # AWS-hosted): a connection the LB has already dropped is never reused,
+        # so requests don't hit ServerDisconnectedError + retry + new TLS handshake
+        keepalive_timeout=20,
+        enable_cleanup_closed=True,  # Clean up closed connections
+        force_close=False,           # Reuse connections (critical)
+        #ssl=True                     # Enable SSL for HTTPS
+    )
+    return _SHARED_CONNECTOR
+
+async def shutdown_shared_connector():
+    """Close the shared Bybit TCPConnector (final teardown)"""
+    global _SHARED_CONNECTOR
+    
+    connector, _SHARED_CONNECTOR = _SHARED_CONNECTOR, None
+    if connector is not None and not connector.closed:
+        await connector.close()
+        logger.debug("Shared enterprise connector closed")
+
 class EnterpriseBybitConnector:
     """
     🏭 ENTERPRISE-GRADE CONNECTION MANAGER
@@ -774,25 +1277,10 @@ class EnterpriseBybitConnector:
         self._setup_enterprise_connector()
         
         # Performance tracking
-        self.connection_stats = {
-            'total_requests': 0,
-            'reused_connections': 0,
-            'new_connections': 0,
-            'avg_response_time': 0.0,
-            'connection_pool_hits': 0,
-            'connection_pool_misses': 0,
-            'active_connections': 0,
-            'max_connections_used': 0
-        }
+        self.connection_stats = ConnectionStats()
         
         # Connection health monitoring
-        self.health_metrics = {
-            'successful_requests': 0,
-            'failed_requests': 0,
-            'timeout_errors': 0,
-            'connection_errors': 0,
-            'last_health_check': time.time()
-        }
+        self.health_metrics = ConnectorHealthMetrics()
         
         logger.info("EnterpriseBybitConnector initialized with optimized settings")
     
@@ -800,22 +1288,14 @@ class EnterpriseBybitConnector:
         """Setup production-grade TCP connector based on Bybit specifications"""
     
         try:
-            # FIXED: Remove unsupported parameters for aiohttp TCPConnector
-            self.connector = aiohttp.TCPConnector(
-                limit=200,                    # Total connections
-                limit_per_host=50,           # Per-host limit  
-                ttl_dns_cache=300,           # DNS cache TTL (5 minutes)
-                use_dns_cache=True,          # Enable DNS caching
-                keepalive_timeout=30,        # Keep connections alive for 30s
-                enable_cleanup_closed=True,  # Clean up closed connections
-                force_close=False,           # Reuse connections (critical)
-                #ssl=True                     # Enable SSL for HTTPS
-            )
+            # Shared across all connector instances: pooled keep-alive/TLS
+            # connections and the DNS cache survive re-inits
+            self.connector = _get_shared_connector()
         
             logger.info("Enterprise TCP connector configured successfully for Bybit API")
         
         except Exception as e:
-            logger.error(f"Failed to create enterprise TCP connector: {e}")
+            logger.error("Failed to create enterprise TCP connector: %s", e)
             # CRITICAL FIX: Set connector to None to trigger fallback
             self.connector = None
 
@@ -827,6 +1307,11 @@ class EnterpriseBybitConnector:
             aiohttp.ClientSession: Optimized session for Bybit API
         """
     
+        # Shared connector may have been released by close() or not yet
+        # created (no running loop at __init__) - acquire it now
+        if self.connector is None or self.connector.closed:
+            self._setup_enterprise_connector()
+        
         # CRITICAL FIX: Check if connector exists
         if self.connector is None:
             logger.warning("Enterprise connector is None, creating basic session")
@@ -842,21 +1327,21 @@ class EnterpriseBybitConnector:
                 headers={'User-Agent': 'Bybit-Trading-Bot-Basic/1.0'}
             )
         
-            self.connection_stats['new_connections'] += 1
-            self.connection_stats['connection_pool_misses'] += 1
+            self.connection_stats.new_connections += 1
+            self.connection_stats.connection_pool_misses += 1
         
             logger.warning("Created basic session without enterprise connector")
             return self.session
     
         if self.session and not self.session.closed:
             # Session reuse - update stats
-            self.connection_stats['reused_connections'] += 1
-            self.connection_stats['connection_pool_hits'] += 1
+            self.connection_stats.reused_connections += 1
+            self.connection_stats.connection_pool_hits += 1
             return self.session
     
         # Create new session - update stats
-        self.connection_stats['new_connections'] += 1
-        self.connection_stats['connection_pool_misses'] += 1
+        self.connection_stats.new_connections += 1
+        self.connection_stats.connection_pool_misses += 1
     
         # CRITICAL FIX: Optimized timeout configuration for Bybit API
         timeout = aiohttp.ClientTimeout(
@@ -870,6 +1355,7 @@ class EnterpriseBybitConnector:
             # Create session with enterprise connector
             self.session = aiohttp.ClientSession(
                 connector=self.connector,
+                connector_owner=False,  # shared - see shutdown_shared_connector()
                 timeout=timeout,
             
                 # Performance optimizations
@@ -889,19 +1375,19 @@ class EnterpriseBybitConnector:
             if self.connector and hasattr(self.connector, '_conns'):
                 try:
                     active_connections = len(self.connector._conns)
-                    self.connection_stats['active_connections'] = active_connections
-                    self.connection_stats['max_connections_used'] = max(
-                        self.connection_stats['max_connections_used'], 
+                    self.connection_stats.active_connections = active_connections
+                    self.connection_stats.max_connections_used = max(
+                        self.connection_stats.max_connections_used, 
                         active_connections
                     )
                 except Exception as e:
-                    logger.debug(f"Could not get connection stats: {e}")
+                    logger.debug("Could not get connection stats: %s", e)
         
-            logger.info(f"Enterprise session created successfully")
+            logger.info("Enterprise session created successfully")
             return self.session
         
         except Exception as e:
-            logger.error(f"Failed to create enterprise session: {e}")
+            logger.error("Failed to create enterprise session: %s", e)
         
             # Fallback to basic session
             timeout = aiohttp.ClientTimeout(
@@ -926,10 +1412,8 @@ class EnterpriseBybitConnector:
                 await self.session.close()
                 logger.debug("Enterprise session closed")
             
-            # Close connector
-            if self.connector:
-                await self.connector.close()
-                logger.debug("Enterprise connector closed")
+            # The connector is shared - only release the reference here,
+            # it is closed by shutdown_shared_connector() at system shutdown
             
             # Give time for connections to close properly (important for cleanup)
             await asyncio.sleep(0.1)
@@ -941,62 +1425,93 @@ class EnterpriseBybitConnector:
             logger.info("Enterprise connector cleanup completed")
             
         except Exception as e:
-            logger.error(f"Error during enterprise connector cleanup: {e}")
+            logger.error("Error during enterprise connector cleanup: %s", e)
             # Don't raise - cleanup should be fault-tolerant
     
     def get_health_status(self) -> Dict[str, Any]:
         """Get comprehensive health status of the connector"""
         
-        total_requests = (self.health_metrics['successful_requests'] + 
-                         self.health_metrics['failed_requests'])
+        total_requests = (self.health_metrics.successful_requests + 
+                         self.health_metrics.failed_requests)
         
         success_rate = 0.0
         if total_requests > 0:
-            success_rate = (self.health_metrics['successful_requests'] / total_requests) * 100
+            success_rate = (self.health_metrics.successful_requests / total_requests) * 100
         
         connection_efficiency = 0.0
-        if self.connection_stats['total_requests'] > 0:
-            connection_efficiency = (self.connection_stats['reused_connections'] / 
-                                   self.connection_stats['total_requests']) * 100
+        if self.connection_stats.total_requests > 0:
+            connection_efficiency = (self.connection_stats.reused_connections / 
+                                   self.connection_stats.total_requests) * 100
         
         return {
             'status': 'healthy' if success_rate > 90 else 'degraded' if success_rate > 50 else 'unhealthy',
             'success_rate_pct': success_rate,
             'connection_efficiency_pct': connection_efficiency,
-            'active_connections': self.connection_stats['active_connections'],
-            'max_connections_used': self.connection_stats['max_connections_used'],
+            'active_connections': self.connection_stats.active_connections,
+            'max_connections_used': self.connection_stats.max_connections_used,
             'total_requests': total_requests,
-            'avg_response_time': self.connection_stats['avg_response_time'],
-            'last_health_check': self.health_metrics['last_health_check']
+            'avg_response_time': self.connection_stats.avg_response_time,
+            'last_health_check': self.health_metrics.last_health_check
         }
     
     def update_health_metrics(self, success: bool, response_time: float, error_type: str = None):
         """Update health metrics after each request"""
         
         if success:
-            self.health_metrics['successful_requests'] += 1
+            self.health_metrics.successful_requests += 1
         else:
-            self.health_metrics['failed_requests'] += 1
+            self.health_metrics.failed_requests += 1
             
             # Categorize error types
             if error_type:
                 if 'timeout' in error_type.lower():
-                    self.health_metrics['timeout_errors'] += 1
+                    self.health_metrics.timeout_errors += 1
                 elif 'connection' in error_type.lower():
-                    self.health_metrics['connection_errors'] += 1
+                    self.health_metrics.connection_errors += 1
         
         # Update average response time (exponential moving average)
-        alpha = 0.1
-        if self.connection_stats['avg_response_time'] == 0:
-            self.connection_stats['avg_response_time'] = response_time
-        else:
-            self.connection_stats['avg_response_time'] = (
-                alpha * response_time + 
-                (1 - alpha) * self.connection_stats['avg_response_time']
-            )
+        # 0.0 = no samples yet: the first sample seeds the average
+        prev = self.connection_stats.avg_response_time
+        self.connection_stats.avg_response_time = (
+            EMA_ALPHA * response_time + EMA_DECAY * prev if prev else response_time
+        )
         
-        self.health_metrics['last_health_check'] = time.time()
+        self.health_metrics.last_health_check = time.time()
+
 
+class RateLimitExceeded(Exception):
+    """HTTP 429 from Bybit; retry_after - seconds until the quota resets (if known)"""
+    
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+def _retry_after_from_headers(headers, max_wait: float = 60.0) -> Optional[float]:
+    """Wait time from Retry-After (seconds) or X-Bapi-Limit-Reset-Timestamp (ms)"""
+    try:
+        if 'Retry-After' in headers:
+            wait = float(headers['Retry-After'])
+        elif 'X-Bapi-Limit-Reset-Timestamp' in headers:
+            wait = int(headers['X-Bapi-Limit-Reset-Timestamp']) / 1000 - time.time()
+        else:
+            return None
+    except (TypeError, ValueError):
+        return None
+    return min(max(wait, 0.0), max_wait)
+
+# Exception class -> FailureAnalysis counter, checked in order (first match wins).
+# aiohttp.ServerTimeoutError is also an asyncio.TimeoutError
+_FAILURE_TYPE_BY_EXCEPTION = (
+    (asyncio.TimeoutError, 'timeout_errors'),
+    (aiohttp.ClientConnectionError, 'connection_errors'),
+    (aiohttp.ClientResponseError, 'http_errors'),
+)
+
+def _failure_type(exc: Exception) -> str:
+    for exc_class, failure_type in _FAILURE_TYPE_BY_EXCEPTION:
+        if isinstance(exc, exc_class):
+            return failure_type
+    return 'unknown_errors'
 
 class NetworkResilienceManager:
     """
@@ -1013,51 +1528,37 @@ class NetworkResilienceManager:
     - Intelligent failure categorization
     """
     
-    def __init__(self, config: CircuitBreakerConfig = CircuitBreakerConfig()):
+    def __init__(self, config: CircuitBreakerConfig = CircuitBreakerConfig(),
+                 rate_limiter: Optional['AdvancedRateLimiterPro'] = None):
         self.config = config
+        # Retries go through the client's rate limiter too (the first attempt
+        # is already gated by the caller), so they never exceed the Bybit quota
+        self.rate_limiter = rate_limiter
         self.state = CircuitState.CLOSED
         self.failure_count = 0
         self.last_failure_time = 0
         self.half_open_calls = 0
         
         # Network health tracking
-        self.network_health = {
-            'consecutive_successes': 0,
-            'consecutive_failures': 0,
-            'avg_response_time': 0.0,
-            'total_requests': 0,
-            'success_rate': 100.0,
-            'last_success_time': time.time(),
-            'last_failure_time': 0
-        }
+        self.network_health = NetworkHealth()
         
         # Failure analysis
-        self.failure_analysis = {
-            'timeout_errors': 0,
-            'connection_errors': 0,
-            'http_errors': 0,
-            'api_errors': 0,
-            'unknown_errors': 0
-        }
+        self.failure_analysis = FailureAnalysis()
+        self._total_failures = 0  # == sum of failure_analysis counters
         
         # Performance metrics
-        self.performance_metrics = {
-            'fastest_response': float('inf'),
-            'slowest_response': 0.0,
-            'response_times': deque(maxlen=100),  # Last 100 response times
-            'hourly_success_rate': 100.0,
-            'circuit_breaker_activations': 0
-        }
+        self.performance_metrics = ResilienceMetrics()
         
         logger.info("Network Resilience Manager initialized with circuit breaker pattern")
     
-    async def call_with_circuit_breaker(self, func: Callable, *args, **kwargs) -> Any:
+    async def call_with_circuit_breaker(self, func: Callable, *args, priority: str = 'normal', **kwargs) -> Any:
         """
         Execute function with circuit breaker protection
     
         Args:
             func: Function to execute with protection
             *args: Function arguments
+            priority: Rate limiter priority for retry attempts
             **kwargs: Function keyword arguments
         
         Returns:
@@ -1067,11 +1568,16 @@ class NetworkResilienceManager:
             Exception: If circuit is open or function fails after retries
         """
     
+        # Monotonic clock: intervals are immune to wall-clock adjustments
+        now = time.monotonic()
+        
         # Check circuit state
-        if self.state == CircuitState.OPEN:
-            if time.time() - self.last_failure_time < self.config.recovery_timeout:
-                self.performance_metrics['circuit_breaker_activations'] += 1
-                raise Exception(f"Circuit breaker OPEN - failing fast. Recovery in {self.config.recovery_timeout - (time.time() - self.last_failure_time):.1f}s")
+        if self.state is CircuitState.OPEN:
+            recovery_timeout = self.config.recovery_timeout
+            since_failure = now - self.last_failure_time
+            if since_failure < recovery_timeout:
+                self.performance_metrics.circuit_breaker_activations += 1
+                raise Exception(f"Circuit breaker OPEN - failing fast. Recovery in {recovery_timeout - since_failure:.1f}s")
             else:
                 # Transition to half-open for testing
                 self.state = CircuitState.HALF_OPEN
@@ -1079,74 +1585,58 @@ class NetworkResilienceManager:
                 logger.info("Circuit breaker transitioning to HALF_OPEN for testing")
     
         # Execute with timeout and retry logic
-        start_time = time.time()
+        start_time = now
         last_exception = None
+        
+        # Bound once for the retry loop
+        wait_for = asyncio.wait_for
+        record_failure = self._record_failure
+        backoff = self._exponential_backoff
+        rate_limiter = self.rate_limiter
     
         for retry_attempt in range(3):  # Max 3 attempts
             try:
+                if retry_attempt and rate_limiter is not None:
+                    await rate_limiter.acquire(priority)
+                
                 # CRITICAL FIX: Implement graduated timeouts based on network health
                 timeout = self._calculate_adaptive_timeout()
             
                 # FIXED: Remove retry_attempt from kwargs - not all functions support it
-                result = await asyncio.wait_for(func(*args, **kwargs), timeout=timeout)
+                result = await wait_for(func(*args, **kwargs), timeout=timeout)
             
                 # Record success
-                response_time = time.time() - start_time
+                response_time = time.monotonic() - start_time
                 self._record_success(response_time)
             
                 return result
             
-            except asyncio.TimeoutError as e:
+            except RateLimitExceeded as e:
                 last_exception = e
-                self._record_failure(e, 'timeout')
-            
-                if retry_attempt < 2:  # Don't wait after last attempt
-                    await self._exponential_backoff(retry_attempt)
+                record_failure(e, 'api_errors')
                 
-            # FIXED: Replace ClientTimeoutError with ServerTimeoutError
-            except aiohttp.ServerTimeoutError as e:
-                last_exception = e
-                self._record_failure(e, 'server_timeout')
-            
+                # Wait exactly as long as Bybit asks instead of guessing
                 if retry_attempt < 2:
-                    await self._exponential_backoff(retry_attempt)
-                
-            except aiohttp.ClientConnectionError as e:
-                last_exception = e
-                self._record_failure(e, 'connection')
+                    if e.retry_after is not None:
+                        logger.warning("Bybit rate limit (429), retrying in %.2fs", e.retry_after)
+                        await asyncio.sleep(e.retry_after)
+                    else:
+                        await backoff(retry_attempt)
             
-                if retry_attempt < 2:
-                    await self._exponential_backoff(retry_attempt)
-                
-            except aiohttp.ClientResponseError as e:
+            except Exception as e:
                 last_exception = e
-                self._record_failure(e, 'http_response')
+                record_failure(e, _failure_type(e))
             
                 # Don't retry on client errors (4xx)
-                if hasattr(e, 'status') and 400 <= e.status < 500:
+                if isinstance(e, aiohttp.ClientResponseError) and 400 <= e.status < 500:
                     break
                 
-                if retry_attempt < 2:
-                    await self._exponential_backoff(retry_attempt)
-                
-            # FIXED: Catch all aiohttp errors with general ClientError
-            except aiohttp.ClientError as e:
-                last_exception = e
-                self._record_failure(e, 'client_error')
-            
-                if retry_attempt < 2:
-                    await self._exponential_backoff(retry_attempt)
-                
-            except Exception as e:
-                last_exception = e
-                self._record_failure(e, 'unknown')
-            
-                if retry_attempt < 2:
-                    await self._exponential_backoff(retry_attempt)
+                if retry_attempt < 2:  # Don't wait after last attempt
+                    await backoff(retry_attempt)
     
         # All retries failed
-        total_time = time.time() - start_time
-        logger.error(f"All retry attempts failed after {total_time:.2f}s")
+        total_time = time.monotonic() - start_time
+        logger.error("All retry attempts failed after %.2fs", total_time)
         raise last_exception
     
     def _calculate_adaptive_timeout(self) -> float:
@@ -1154,14 +1644,14 @@ class NetworkResilienceManager:
         base_timeout = 10.0
         
         # Adjust based on average response time
-        if self.network_health['avg_response_time'] > 5.0:
+        if self.network_health.avg_response_time > 5.0:
             # Slow network detected - increase timeout
-            multiplier = min(self.network_health['avg_response_time'] / 5.0, 3.0)
+            multiplier = min(self.network_health.avg_response_time / 5.0, 3.0)
             adaptive_timeout = base_timeout * multiplier
-        elif self.network_health['consecutive_failures'] > 2:
+        elif self.network_health.consecutive_failures > 2:
             # Multiple failures - reduce timeout for faster failure detection
             adaptive_timeout = max(base_timeout * 0.5, 5.0)
-        elif self.network_health['success_rate'] < 50.0:
+        elif self.network_health.success_rate < 50.0:
             # Poor success rate - reduce timeout
             adaptive_timeout = max(base_timeout * 0.7, 5.0)
         else:
@@ -1175,81 +1665,72 @@ class NetworkResilienceManager:
         
         # Reset failure tracking
         self.failure_count = 0
-        self.network_health['consecutive_successes'] += 1
-        self.network_health['consecutive_failures'] = 0
-        self.network_health['last_success_time'] = time.time()
-        self.network_health['total_requests'] += 1
+        self.network_health.consecutive_successes += 1
+        self.network_health.consecutive_failures = 0
+        self.network_health.last_success_time = time.time()
+        self.network_health.total_requests += 1
         
         # Update response time metrics
-        self.performance_metrics['response_times'].append(response_time)
-        self.performance_metrics['fastest_response'] = min(
-            self.performance_metrics['fastest_response'], response_time
-        )
-        self.performance_metrics['slowest_response'] = max(
-            self.performance_metrics['slowest_response'], response_time
-        )
+        self.performance_metrics.record_response_time(response_time)
         
         # Update average response time (exponential moving average)
-        alpha = 0.1
-        if self.network_health['avg_response_time'] == 0:
-            self.network_health['avg_response_time'] = response_time
-        else:
-            self.network_health['avg_response_time'] = (
-                alpha * response_time + 
-                (1 - alpha) * self.network_health['avg_response_time']
-            )
+        # 0.0 = no samples yet: the first sample seeds the average
+        prev = self.network_health.avg_response_time
+        self.network_health.avg_response_time = (
+            EMA_ALPHA * response_time + EMA_DECAY * prev if prev else response_time
+        )
         
         # Calculate success rate
-        total_requests = self.network_health['total_requests']
-        total_failures = sum(self.failure_analysis.values())
+        total_requests = self.network_health.total_requests
+        total_failures = self._total_failures
         if total_requests > 0:
-            self.network_health['success_rate'] = ((total_requests - total_failures) / total_requests) * 100
+            self.network_health.success_rate = ((total_requests - total_failures) / total_requests) * 100
         
         # State management for circuit breaker
-        if self.state == CircuitState.HALF_OPEN:
+        if self.state is CircuitState.HALF_OPEN:
             self.half_open_calls += 1
             if self.half_open_calls >= self.config.half_open_max_calls:
                 self.state = CircuitState.CLOSED
                 logger.info("Circuit breaker CLOSED - service recovered")
         
         # Log performance milestones
-        if self.network_health['consecutive_successes'] % 100 == 0:
-            logger.info(f"Network health: {self.network_health['consecutive_successes']} consecutive successes, "
-                       f"avg response time: {self.network_health['avg_response_time']:.3f}s")
+        if logger.isEnabledFor(logging.INFO) and self.network_health.consecutive_successes % 100 == 0:
+            logger.info("Network health: %d consecutive successes, avg response time: %.3fs",
+                        self.network_health.consecutive_successes,
+                        self.network_health.avg_response_time)
     
     def _record_failure(self, exception: Exception, error_type: str):
         """Record failed network operation with detailed analysis"""
         
         self.failure_count += 1
-        self.last_failure_time = time.time()
-        self.network_health['consecutive_failures'] += 1
-        self.network_health['consecutive_successes'] = 0
-        self.network_health['last_failure_time'] = time.time()
-        self.network_health['total_requests'] += 1
+        self.last_failure_time = time.monotonic()
+        self.network_health.consecutive_failures += 1
+        self.network_health.consecutive_successes = 0
+        self.network_health.last_failure_time = time.time()
+        self.network_health.total_requests += 1
         
         # Categorize failure type
-        if error_type in self.failure_analysis:
-            self.failure_analysis[error_type] += 1
-        else:
-            self.failure_analysis['unknown_errors'] += 1
+        self.failure_analysis.record(error_type)
+        self._total_failures += 1
         
         # Calculate success rate
-        total_requests = self.network_health['total_requests']
-        total_failures = sum(self.failure_analysis.values())
+        total_requests = self.network_health.total_requests
+        total_failures = self._total_failures
         if total_requests > 0:
-            self.network_health['success_rate'] = ((total_requests - total_failures) / total_requests) * 100
+            self.network_health.success_rate = ((total_requests - total_failures) / total_requests) * 100
         
         # Circuit breaker state management
         if self.failure_count >= self.config.failure_threshold:
-            if self.state != CircuitState.OPEN:
+            if self.state is not CircuitState.OPEN:
                 self.state = CircuitState.OPEN
-                self.performance_metrics['circuit_breaker_activations'] += 1
-                logger.warning(f"Circuit breaker OPEN - {self.failure_count} failures detected. Error type: {error_type}")
+                self.performance_metrics.circuit_breaker_activations += 1
+                logger.warning("Circuit breaker OPEN - %d failures detected. Error type: %s", self.failure_count, error_type)
         
         # Log failure patterns
-        if self.network_health['consecutive_failures'] % 5 == 0:
-            logger.warning(f"Network degradation: {self.network_health['consecutive_failures']} consecutive failures, "
-                          f"success rate: {self.network_health['success_rate']:.1f}%")
+        if self.network_health.consecutive_failures % 5 == 0:
+            logger.warning("Network degradation: %d consecutive failures, success rate: %.1f%%",
+                           self.network_health.consecutive_failures,
+                           self.network_health.success_rate)
     
     async def _exponential_backoff(self, attempt: int):
         """Implement exponential backoff with jitter and adaptive delays"""
@@ -1259,10 +1740,10 @@ class NetworkResilienceManager:
         max_delay = 30.0
         
         # Adaptive delay based on network health
-        if self.network_health['success_rate'] < 30.0:
+        if self.network_health.success_rate < 30.0:
             # Very poor network - longer delays
             base_delay *= 2.0
-        elif self.network_health['success_rate'] > 80.0:
+        elif self.network_health.success_rate > 80.0:
             # Network mostly good - shorter delays
             base_delay *= 0.5
         
@@ -1270,41 +1751,41 @@ class NetworkResilienceManager:
         
         # Add jitter (±25%) to prevent thundering herd
         jitter_range = delay * 0.25
-        jitter = (hash(time.time()) % 100) / 100 * 2 - 1  # -1 to 1
-        delay += jitter * jitter_range
+        delay += random.uniform(-jitter_range, jitter_range)
         
         # Ensure minimum delay
         delay = max(delay, 0.5)
         
-        logger.debug(f"Exponential backoff: waiting {delay:.2f}s (attempt {attempt + 1})")
+        logger.debug("Exponential backoff: waiting %.2fs (attempt %d)", delay, attempt + 1)
         await asyncio.sleep(delay)
     
     def get_resilience_report(self) -> Dict[str, Any]:
         """Get comprehensive resilience and performance report"""
         
         # Calculate percentiles for response times
-        response_times = list(self.performance_metrics['response_times'])
+        response_times = self.performance_metrics.window()
         percentiles = {}
-        if response_times:
-            percentiles = {
-                'p50': np.percentile(response_times, 50),
-                'p95': np.percentile(response_times, 95),
-                'p99': np.percentile(response_times, 99)
-            }
+        fastest = slowest = 0.0
+        if response_times.size:
+            # One partition of the window for all three quantiles
+            p50, p95, p99 = np.quantile(response_times, [0.5, 0.95, 0.99]).tolist()
+            percentiles = {'p50': p50, 'p95': p95, 'p99': p99}
+            fastest = float(response_times.min())
+            slowest = float(response_times.max())
         
         return {
             'circuit_breaker': {
                 'state': self.state.value,
                 'failure_count': self.failure_count,
-                'activations': self.performance_metrics['circuit_breaker_activations']
+                'activations': self.performance_metrics.circuit_breaker_activations
             },
-            'network_health': self.network_health,
-            'failure_analysis': self.failure_analysis,
+            'network_health': asdict(self.network_health),
+            'failure_analysis': asdict(self.failure_analysis),
             'performance': {
-                'fastest_response': self.performance_metrics['fastest_response'] if self.performance_metrics['fastest_response'] != float('inf') else 0,
-                'slowest_response': self.performance_metrics['slowest_response'],
+                'fastest_response': fastest,
+                'slowest_response': slowest,
                 'percentiles': percentiles,
-                'total_samples': len(response_times)
+                'total_samples': int(response_times.size)
             }
         }
     
@@ -1316,7 +1797,7 @@ class NetworkResilienceManager:
         self.failure_count = 0
         self.half_open_calls = 0
         
-        logger.info(f"Circuit breaker manually reset from {previous_state.value} to CLOSED")
+        logger.info("Circuit breaker manually reset from %s to CLOSED", previous_state.value)
 
 # ================================
 # УНИВЕРСАЛЬНЫЕ УТИЛИТЫ
@@ -1676,6 +2157,11 @@ def safe_float(value, default=0.0):
     except (ValueError, TypeError):
         return default
 
+
+def sign_hmac_sha256(api_secret: str, payload: str) -> str:
+    """HMAC-SHA256 → hex одним вызовом hmac.digest (C-путь OpenSSL, без HMAC-объекта)"""
+    return hmac.digest(api_secret.encode("utf-8"), payload.encode("utf-8"), "sha256").hex()
+
 # Глобальная enterprise сессия для Telegram alerts
 _telegram_enterprise_session: Optional[aiohttp.ClientSession] = None
 
@@ -1779,6 +2265,7 @@ async def cleanup_all_enterprise_sessions():
     """
     try:
         await cleanup_telegram_session()
+        await shutdown_shared_connector()
         logger.info("All enterprise sessions cleaned up")
     except Exception as e:
         logger.error(f"Error cleaning up enterprise sessions: {e}")
@@ -2463,7 +2950,7 @@ class EnhancedBybitClient:
         
         # CRITICAL FIX: Enterprise connection management
         self.enterprise_connector = EnterpriseBybitConnector()
-        self.resilience_manager = NetworkResilienceManager()
+        self.resilience_manager = NetworkResilienceManager(rate_limiter=self.rate_limiter)
         
         # Connection cleanup registration
         import atexit
@@ -2493,12 +2980,8 @@ class EnhancedBybitClient:
     def _generate_signature(self, timestamp: str, recv_window: str, query_string: str = "", body: str = "") -> str:
         """V5: HMAC-SHA256(timestamp + api_key + recv_window + query/body) → hex"""
         signature_payload = f"{timestamp}{self.api_key}{recv_window}{query_string}{body}"
-        signature = hmac.new(
-            self.api_secret.encode("utf-8"),
-            signature_payload.encode("utf-8"),
-            hashlib.sha256
-        ).hexdigest()
-        logger.debug(f"{self.name} - Signature payload length: {len(signature_payload)}")
+        signature = sign_hmac_sha256(self.api_secret, signature_payload)
+        logger.debug("%s - Signature payload length: %d", self.name, len(signature_payload))
         return signature  # <-- ВОЗВРАЩАЕМ СТРОКУ
 
     
@@ -2724,14 +3207,15 @@ class EnhancedBybitClient:
         }
     
         if hasattr(self, 'enterprise_connector'):
-            stats['enterprise_connector'] = self.enterprise_connector.connection_stats
+            stats['enterprise_connector'] = asdict(self.enterprise_connector.connection_stats)
     
         if hasattr(self.rate_limiter, 'get_performance_stats'):
             stats['rate_limiter'] = self.rate_limiter.get_performance_stats()
     
         return stats
 
-    async def _make_request_with_detailed_timing(self, method: str, endpoint: str, params: dict = None, data: dict = None) -> dict:
+    async def _make_request_with_detailed_timing(self, method: str, endpoint: str, params: dict = None, data: dict = None,
+                                                 priority: str = 'normal') -> dict:
         """
         🔬 PERFORMANCE PROFILING: Детальное отслеживание времени запросов
     
@@ -2754,18 +3238,16 @@ class EnhancedBybitClient:
         try:
             # Rate limiting
             rate_start = time.time()
-            await self.rate_limiter.acquire()
+            await self.rate_limiter.acquire(priority)
             timings['rate_limiting'] = time.time() - rate_start
     
             # Time synchronization
             sync_start = time.time()
             await self.time_sync.ensure_time_sync(self.api_url)  # Асинхронно обеспечиваем синхронизацию
-            server_time = self.time_sync.get_server_time()       # Синхронно получаем время
             timings['time_sync'] = time.time() - sync_start
     
             # Request preparation
             prep_start = time.time()
-            timestamp = str(server_time)
             recv_window = str(BYBIT_RECV_WINDOW)
     
             url = f"{self.api_url}/v5/{endpoint}"
@@ -2785,18 +3267,19 @@ class EnhancedBybitClient:
                 url += f"?{query_string}"
             elif method == "POST" and data:
                 body = json.dumps(data)
-    
-            # Generate signature
-            signature = self._generate_signature(timestamp, recv_window, query_string, body)
-    
-            headers = {
-                'X-BAPI-API-KEY': self.api_key,
-                'X-BAPI-SIGN': signature,
-                'X-BAPI-SIGN-TYPE': '2',
-                'X-BAPI-TIMESTAMP': timestamp,
-                'X-BAPI-RECV-WINDOW': recv_window,
-                'Content-Type': 'application/json'
-            }
+
+            # Подпись действует recv_window мс от timestamp, а повтор после 429
+            # может ждать дольше — поэтому подписываем заново на каждую попытку
+            def _signed_headers() -> dict:
+                timestamp = str(self.time_sync.get_server_time())
+                return {
+                    'X-BAPI-API-KEY': self.api_key,
+                    'X-BAPI-SIGN': self._generate_signature(timestamp, recv_window, query_string, body),
+                    'X-BAPI-SIGN-TYPE': '2',
+                    'X-BAPI-TIMESTAMP': timestamp,
+                    'X-BAPI-RECV-WINDOW': recv_window,
+                    'Content-Type': 'application/json'
+                }
     
             timings['request_prep'] = time.time() - prep_start
     
@@ -2810,6 +3293,7 @@ class EnhancedBybitClient:
         
             # CRITICAL FIX: Execute request with resilience manager
             async def _execute_http_request():
+                headers = _signed_headers()
                 if method == "GET":
                     async with session.get(url, headers=headers) as response:
                         timings['http_request'] = time.time() - http_start
@@ -2828,6 +3312,11 @@ class EnhancedBybitClient:
                             except Exception as e:
                                 logger.debug(f"{self.name} - Error processing response headers: {e}")
                 
+                        if response.status == 429:
+                            raise RateLimitExceeded(
+                                f"HTTP 429: {response_text}",
+                                retry_after=_retry_after_from_headers(response.headers)
+                            )
                         if response.status != 200:
                             raise Exception(f"HTTP {response.status}: {response_text}")
                 
@@ -2855,6 +3344,11 @@ class EnhancedBybitClient:
                             except Exception as e:
                                 logger.debug(f"{self.name} - Error processing response headers: {e}")
                 
+                        if response.status == 429:
+                            raise RateLimitExceeded(
+                                f"HTTP 429: {response_text}",
+                                retry_after=_retry_after_from_headers(response.headers)
+                            )
                         if response.status != 200:
                             raise Exception(f"HTTP {response.status}: {response_text}")
                 
@@ -2865,7 +3359,9 @@ class EnhancedBybitClient:
                             raise Exception(f"Invalid JSON: {e}")
         
             # CRITICAL FIX: Execute with circuit breaker protection
-            result, response_text = await self.resilience_manager.call_with_circuit_breaker(_execute_http_request)
+            result, response_text = await self.resilience_manager.call_with_circuit_breaker(
+                _execute_http_request, priority=priority
+            )
     
             # Check API response
             if result.get('retCode') != 0:
@@ -2900,11 +3396,11 @@ class EnhancedBybitClient:
         
             # CRITICAL FIX: Update enterprise connector stats
             if hasattr(self, 'enterprise_connector') and self.enterprise_connector:
-                self.enterprise_connector.connection_stats['total_requests'] += 1
+                self.enterprise_connector.connection_stats.total_requests += 1
                 if timings.get('session_acquire', 0) < 0.001:  # Session was reused
-                    self.enterprise_connector.connection_stats['reused_connections'] += 1
+                    self.enterprise_connector.connection_stats.reused_connections += 1
                 else:  # New connection created
-                    self.enterprise_connector.connection_stats['new_connections'] += 1
+                    self.enterprise_connector.connection_stats.new_connections += 1
     
             logger.debug(f"✅ {method} {endpoint} completed in {timings['total_time']:.3f}s (Enterprise mode)")
     
@@ -3155,11 +3651,6 @@ class FinalFixedWebSocketManager:
         # Инициализация _position_states (используется в _handle_position_update)
         self._position_states = {}
         
-        # Дополнительные атрибуты из патча (опционально, но рекомендуется)
-        self._event_cache = OrderedDict()
-        self._event_cache_ttl = 300  # 5 минут TTL
-        self._max_cache_size = 10000
-        
         # Флаг копирования плеча
         self.copy_leverage = os.getenv('COPY_LEVERAGE', 'true').lower() == 'true'
         
@@ -3241,11 +3732,7 @@ class FinalFixedWebSocketManager:
             
             # Правильная подпись для Bybit API v5
             signature_payload = f"GET/realtime{expires}"
-            signature = hmac.new(
-                self.api_secret.encode("utf-8"),
-                signature_payload.encode("utf-8"),
-                hashlib.sha256
-            ).hexdigest()
+            signature = sign_hmac_sha256(self.api_secret, signature_payload)
             
             auth_message = {
                 "op": "auth",
@@ -5164,10 +5651,10 @@ class ProductionSignalProcessor:
         try:
             logger.info(f"Processing signal: {signal.signal_type.value} {signal.symbol} {signal.side} {signal.size}")
         
-            # Логируем сигнал в БД для дедупликации
+            # Логируем сигнал в БД для дедупликации (буферизованно, без round-trip)
             account_id = 1 if signal.metadata.get('source') == 'source_account' else 2
         
-            signal_logged = signals_logger.log_signal(
+            signal_logged = signals_logger.enqueue_signal(
                 account_id=account_id,
                 symbol=signal.symbol,
                 side=signal.side,
@@ -6098,6 +6585,8 @@ class FinalTradingMonitor:
                         res = client.cleanup()
                         if asyncio.iscoroutine(res):
                             await res
+                # Общий TCPConnector клиентов закрывается после всех сессий
+                await shutdown_shared_connector()
             except Exception as e:
                 logger.error(f"Error during client cleanup: {e}")
 
@@ -85,7 +85,7 @@ def _has_module(name: str) -> bool:
 from datetime import datetime
 
 try:
-    from app.database_security_implementation import CredentialsStore  # боевой стор (шифрование + SQLAlchemy)
+    from app.database_security_implementation import CredentialsStore, create_credentials_store  # боевой стор (шифрование + SQLAlchemy)
     from app.db_session import SessionLocal
     from app.db_models import SysEvents, EventLevelEnum
     logger.info("Database components imported successfully (secure store)")
@@ -529,8 +529,8 @@ class IntegratedTradingSystem:
         if not ws:
             return False
         try:
-            from app.crypto_store import CredentialsStore
-            store = CredentialsStore()
+            from app.crypto_store import get_credentials_store
+            store = get_credentials_store()
             # Donor id=2, fallback id=1
             src = store.get_account_credentials(2) or store.get_account_credentials(1)
             if not src:
@@ -625,10 +625,10 @@ class IntegratedTradingSystem:
         # --- 1) Читаем ключи ПРАВИЛЬНЫМ способом (никакого app.crypto_store) ---
         try:
             try:
-                from app.database_security_implementation import CredentialsStore
+                from app.database_security_implementation import create_credentials_store
             except Exception:
-                from database_security_implementation import CredentialsStore
-            store = CredentialsStore()
+                from database_security_implementation import create_credentials_store
+            store = create_credentials_store()
 
             # TARGET/DONOR берём из self или self.config (что есть)
             target_id = (
@@ -841,7 +841,7 @@ class IntegratedTradingSystem:
         Никаких исключений — только True/False.
         """
         try:
-            store = CredentialsStore()
+            store = create_credentials_store()
             creds = store.get_account_credentials(self._target_account_id())
             return bool(creds and all(creds))
         except Exception:
@@ -982,10 +982,10 @@ class IntegratedTradingSystem:
 
             # store
             try:
-                from app.database_security_implementation import CredentialsStore
+                from app.database_security_implementation import create_credentials_store
             except Exception:
-                from database_security_implementation import CredentialsStore
-            store = CredentialsStore()
+                from database_security_implementation import create_credentials_store
+            store = create_credentials_store()
 
             main_creds = store.get_account_credentials(target_id)
             donor_creds = store.get_account_credentials(donor_id) if donor_id else None
@@ -1107,10 +1107,10 @@ class IntegratedTradingSystem:
             # 0) Проверим, что TARGET действительно появился в БД
             try:
                 try:
-                    from app.database_security_implementation import CredentialsStore
+                    from app.database_security_implementation import create_credentials_store
                 except Exception:
-                    from database_security_implementation import CredentialsStore
-                store = CredentialsStore()
+                    from database_security_implementation import create_credentials_store
+                store = create_credentials_store()
 
                 target_id = (getattr(self, "TARGET_ACCOUNT_ID", None)
                              or getattr(getattr(self, "config", object()), "TARGET_ACCOUNT_ID", None)
@@ -64,7 +64,7 @@ class OrdersLogger:
                 if exchange_order_id:
                     existing = (
                         session.query(OrdersLog)
-                        .filter_by(exchange_order_id=exchange_order_id)
+                        .filter_by(account_id=account_id, exchange_order_id=exchange_order_id)
                         .first()
                     )
 
@@ -5,7 +5,6 @@
 
 from datetime import datetime
 from typing import Optional
-from decimal import Decimal
 
 from app.db_session import SessionLocal
 from app.db_models import RiskEvents
@@ -67,7 +66,7 @@ class RiskEventsLogger:
                     account_id=account_id,
                     event=event,
                     reason=reason,
-                    value=Decimal(str(value)) if value is not None else None,
+                    value=float(value) if value is not None else None,
                 )
 
                 session.add(risk_event)
@@ -3,36 +3,57 @@
 Логирование торговых сигналов с дедупликацией
 """
 
+import atexit
 import hashlib
 import json
+import threading
+from collections import OrderedDict, deque
 from datetime import datetime
-from typing import Optional, Dict, Any
-from sqlalchemy.exc import IntegrityError
+from typing import Optional, Dict, Any, List, Tuple
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import IntegrityError, InterfaceError, OperationalError
 
-from app.db_session import SessionLocal
-from app.db_models import SignalsLog
+from app.db_session import SessionLocal, utc_from_timestamp
+from app.db_models import SignalsLog, SIDE_CODES
 from app.sys_events_logger import sys_logger
 
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Буферизованная запись сигналов (enqueue_signal): строки копятся и уходят
+# одним INSERT ... VALUES (...), (...) ON CONFLICT DO NOTHING по достижении
+# BATCH_SIZE или раз в FLUSH_INTERVAL_SEC. Дубликаты внутри процесса
+# отсекаются по недавним (account_id, dedup_key) сразу, между процессами —
+# constraint'ами (уникальность dedup_key — в пределах аккаунта).
+BATCH_SIZE = 500
+FLUSH_INTERVAL_SEC = 0.2
+MAX_BUFFER_SIZE = 10_000
+RECENT_DEDUP_KEYS = 4096
+
+_buffer: deque = deque(maxlen=MAX_BUFFER_SIZE)
+_buffer_lock = threading.Lock()
+_flush_event = threading.Event()
+_flusher_thread: Optional[threading.Thread] = None
+_recent_keys: "OrderedDict[Tuple[int, bytes], None]" = OrderedDict()
+
 
 class SignalsLogger:
     """Класс для записи и дедупликации торговых сигналов"""
 
     @staticmethod
-    def generate_dedup_key(symbol: str, side: str, qty: float, timestamp: float) -> str:
+    def generate_dedup_key(symbol: str, side: str, qty: float, timestamp: float) -> bytes:
         """
         Генерирует ключ дедупликации для сигнала.
         Использует 5-секундное окно для предотвращения дубликатов.
+        Ключ — 16-байтный BLAKE2b-дайджест (BYTEA(16) в signals_log).
         """
         # Округляем timestamp до 5 секунд для группировки близких сигналов
         time_window = int(timestamp / 5) * 5
 
         # Создаем уникальный ключ
         key_string = f"{symbol}:{side}:{qty:.8f}:{time_window}"
-        return hashlib.sha256(key_string.encode()).hexdigest()
+        return hashlib.blake2b(key_string.encode(), digest_size=16).digest()
 
     @staticmethod
     def log_signal(
@@ -68,13 +89,15 @@ class SignalsLogger:
             dedup_key = SignalsLogger.generate_dedup_key(symbol, side, qty, timestamp)
 
             with SessionLocal() as session:
-                # Проверяем существование по dedup_key
+                # Проверяем существование по dedup_key (уникален в пределах аккаунта)
                 existing = (
-                    session.query(SignalsLog).filter_by(dedup_key=dedup_key).first()
+                    session.query(SignalsLog)
+                    .filter_by(account_id=account_id, dedup_key=dedup_key)
+                    .first()
                 )
 
                 if existing:
-                    logger.debug(f"Signal duplicate detected: {dedup_key}")
+                    logger.debug(f"Signal duplicate detected: {dedup_key.hex()}")
                     return False
 
                 # Создаем новую запись
@@ -84,7 +107,7 @@ class SignalsLogger:
                     side=side,
                     qty=qty,
                     ext_id=ext_id,
-                    received_at=datetime.fromtimestamp(timestamp),
+                    received_at=utc_from_timestamp(timestamp),
                     dedup_key=dedup_key,
                     parsed_json=signal_data,
                 )
@@ -93,7 +116,7 @@ class SignalsLogger:
                 session.commit()
 
                 logger.info(
-                    f"Signal logged: {symbol} {side} {qty} (dedup: {dedup_key[:8]}...)"
+                    f"Signal logged: {symbol} {side} {qty} (dedup: {dedup_key.hex()[:8]}...)"
                 )
 
                 # Логируем в sys_events
@@ -106,7 +129,7 @@ class SignalsLogger:
                         "side": side,
                         "qty": float(qty),
                         "account_id": account_id,
-                        "dedup_key": dedup_key[:8],
+                        "dedup_key": dedup_key.hex()[:8],
                     },
                 )
 
@@ -126,6 +149,89 @@ class SignalsLogger:
             )
             return False
 
+    @staticmethod
+    def enqueue_signal(
+        account_id: int,
+        symbol: str,
+        side: str,
+        qty: float,
+        ext_id: str,
+        signal_data: Dict[str, Any],
+        timestamp: Optional[float] = None,
+    ) -> bool:
+        """
+        Буферизованный вариант log_signal для горячего пути: без
+        round-trip в БД на каждый сигнал.
+
+        Returns:
+            True если сигнал поставлен в очередь, False если это дубликат
+            недавнего сигнала этого процесса или side невалиден
+        """
+        # side проверяем до буфера: невалидный сигнал не должен уронить
+        # пачку и не должен занять ключ дедупликации
+        try:
+            if side is None:
+                raise ValueError("side is required")
+            side_code = SIDE_CODES.process_bind_param(side, None)
+        except (ValueError, AttributeError) as e:
+            logger.error(f"Signal rejected: {e}")
+            return False
+
+        if timestamp is None:
+            timestamp = datetime.now().timestamp()
+
+        dedup_key = SignalsLogger.generate_dedup_key(symbol, side, qty, timestamp)
+
+        with _buffer_lock:
+            recent_key = (account_id, dedup_key)
+            if recent_key in _recent_keys:
+                logger.debug(f"Signal duplicate detected: {dedup_key.hex()}")
+                return False
+            _recent_keys[recent_key] = None
+            if len(_recent_keys) > RECENT_DEDUP_KEYS:
+                _recent_keys.popitem(last=False)
+
+        _enqueue({
+            "account_id": account_id,
+            "symbol": symbol,
+            "side": side_code,
+            "qty": qty,
+            "ext_id": ext_id,
+            "received_at": utc_from_timestamp(timestamp),
+            "dedup_key": dedup_key,
+            "parsed_json": signal_data,
+        })
+
+        sys_logger.log_event(
+            "INFO",
+            "SignalsLogger",
+            f"New signal: {symbol} {side}",
+            {
+                "symbol": symbol,
+                "side": side,
+                "qty": float(qty),
+                "account_id": account_id,
+                "dedup_key": dedup_key.hex()[:8],
+            },
+        )
+        return True
+
+    @staticmethod
+    def flush() -> int:
+        """Принудительно сбрасывает буфер сигналов в БД"""
+        written = 0
+        while True:
+            with _buffer_lock:
+                batch = [_buffer.popleft() for _ in range(min(BATCH_SIZE, len(_buffer)))]
+            if not batch:
+                return written
+            try:
+                written += _write_batch(batch)
+            except (OperationalError, InterfaceError) as e:
+                logger.error(f"signals_log unavailable, {len(batch)} signals requeued: {e}")
+                _requeue(batch)
+                return written
+
     @staticmethod
     def get_recent_signals(
         account_id: Optional[int] = None, symbol: Optional[str] = None, limit: int = 20
@@ -162,5 +268,91 @@ class SignalsLogger:
             return []
 
 
+def _insert_rows(rows: List[Dict[str, Any]]) -> int:
+    """Один INSERT ... ON CONFLICT DO NOTHING; возвращает число вставленных строк"""
+    with SessionLocal() as session:
+        # без preserve_rowcount SQLAlchemy на psycopg 3 отдаёт rowcount INSERT = -1
+        result = session.execute(
+            pg_insert(SignalsLog)
+            .values(rows)
+            .on_conflict_do_nothing()
+            .execution_options(preserve_rowcount=True)
+        )
+        session.commit()
+    return result.rowcount
+
+
+def _write_batch(batch: List[Dict[str, Any]]) -> int:
+    """
+    Пишет пачку одним INSERT; дубликаты по ext_id/dedup_key пропускаются.
+    Если пачка не прошла из-за данных, сигналы пишутся по одному и
+    отбрасываются только сбойные. Недоступность БД (OperationalError/
+    InterfaceError) пробрасывается; в batch при этом остаются только
+    незаписанные сигналы.
+    """
+    try:
+        return _insert_rows(batch)
+    except (OperationalError, InterfaceError):
+        raise
+    except Exception as e:
+        logger.warning(f"Batch write of {len(batch)} signals failed, retrying row by row: {e}")
+
+    written = 0
+    for i, row in enumerate(batch):
+        try:
+            written += _insert_rows([row])
+        except (OperationalError, InterfaceError):
+            del batch[:i]
+            raise
+        except Exception as e:
+            logger.error(f"Dropped signal {row.get('symbol')} (dedup: {row['dedup_key'].hex()[:8]}...): {e}")
+            # сигнал не записан — повторная отправка не должна считаться дубликатом
+            with _buffer_lock:
+                _recent_keys.pop((row["account_id"], row["dedup_key"]), None)
+    return written
+
+
+def _requeue(batch: List[Dict[str, Any]]) -> None:
+    """Возвращает незаписанные сигналы в начало буфера (в пределах MAX_BUFFER_SIZE)"""
+    with _buffer_lock:
+        room = MAX_BUFFER_SIZE - len(_buffer)
+        if room < len(batch):
+            logger.error(f"Signals buffer full, dropped {len(batch) - max(room, 0)} oldest signals")
+            batch = batch[len(batch) - max(room, 0):]
+        _buffer.extendleft(reversed(batch))
+
+
+def _flusher_loop() -> None:
+    """Фоновый поток: периодически сбрасывает буфер в БД"""
+    while True:
+        _flush_event.wait(FLUSH_INTERVAL_SEC)
+        _flush_event.clear()
+        try:
+            SignalsLogger.flush()
+        except Exception as e:
+            logger.error(f"Signals flusher error: {e}")
+
+
+def _enqueue(row: Dict[str, Any]) -> None:
+    """Добавляет сигнал в буфер и при необходимости будит фоновый поток"""
+    global _flusher_thread
+
+    with _buffer_lock:
+        _buffer.append(row)
+        pending = len(_buffer)
+
+        if _flusher_thread is None or not _flusher_thread.is_alive():
+            _flusher_thread = threading.Thread(
+                target=_flusher_loop, name="SignalsFlusher", daemon=True
+            )
+            _flusher_thread.start()
+
+    if pending >= BATCH_SIZE:
+        _flush_event.set()
+
+
+# Дописываем хвост буфера при завершении процесса
+atexit.register(SignalsLogger.flush)
+
 # Глобальный экземпляр
 signals_logger = SignalsLogger()
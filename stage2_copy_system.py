@@ -3922,6 +3922,8 @@ class Stage2CopyTradingSystem:
             monitoring_task = asyncio.create_task(self._stage2_monitoring_loop())
             risk_task       = asyncio.create_task(self._risk_monitoring_loop())
             trailing_task   = asyncio.create_task(self._trailing_stop_loop())
+            # Сброс буфера снимков баланса из текущего event loop
+            self._snapshot_flush_task = asyncio.create_task(balance_logger.run_flusher_async())
 
             self.system_active = True
 
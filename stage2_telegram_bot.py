@@ -33,7 +33,7 @@ from contextlib import suppress
 import sys
 import importlib
 from telegram.error import BadRequest
-from app.db_session import SessionLocal
+from app.db_session import SessionLocal, utc_now
 from app.db_models import SysEvents
 import hashlib
 
@@ -251,7 +251,7 @@ if not TELEGRAM_TOKEN:
 if not tg_keys_available:
     # Создаем fallback implementation только если основной модуль недоступен
     try:
-        from app.database_security_implementation import CredentialsStore
+        from app.database_security_implementation import create_credentials_store
         
         # Константы для FSM состояний
         WAIT_API_KEY, WAIT_API_SECRET = range(2)
@@ -283,7 +283,7 @@ if not tg_keys_available:
             
             # Сохраняем в БД
             try:
-                store = CredentialsStore()
+                store = create_credentials_store()
                 store.set_account_credentials(1, api_key, api_secret)  # Account ID = 1 по умолчанию
                 await update.message.reply_text("✅ Ключи успешно сохранены!")
                 
@@ -2488,7 +2488,7 @@ class Stage2TelegramBot:
                         try:
                             with SessionLocal() as session:
                                 # Удаляем старые события (старше 7 дней)
-                                cutoff_date = datetime.now() - timedelta(days=7)
+                                cutoff_date = utc_now() - timedelta(days=7)
                                 deleted = session.query(SysEvents)\
                                     .filter(SysEvents.created_at < cutoff_date)\
                                     .delete()
@@ -2601,7 +2601,7 @@ class Stage2TelegramBot:
                     warnings = session.query(SysEvents).filter_by(level="WARN").count()
                 
                     # События за последний час
-                    hour_ago = datetime.now() - timedelta(hours=1)
+                    hour_ago = utc_now() - timedelta(hours=1)
                     recent = session.query(SysEvents)\
                         .filter(SysEvents.created_at > hour_ago).count()
                 
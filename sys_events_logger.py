@@ -3,17 +3,57 @@
 Централизованный логгер для записи событий в sys_events
 """
 
+import atexit
 import json
 import logging
-from datetime import datetime
-from typing import Optional, Dict, Any
+import threading
+from collections import deque
+from datetime import datetime, date, timedelta
+from typing import Optional, Dict, Any, List, Tuple
 from contextlib import contextmanager
 
-from app.db_session import SessionLocal
-from app.db_models import SysEvents
+from sqlalchemy import Text, bindparam, cast, insert, text
+from sqlalchemy.exc import InterfaceError, OperationalError
+from sqlalchemy.dialects.postgresql import JSONB
+
+from app.db_session import engine, pipeline, _json_serializer, utc_now
+from app.db_models import SysEvents, EVENT_LEVEL_CODES
 
 logger = logging.getLogger(__name__)
 
+# События без переданной сессии не пишутся по одному: они копятся в буфере
+# и уходят одним executemany по достижении BATCH_SIZE или раз в
+# FLUSH_INTERVAL_SEC. Буфер ограничен MAX_BUFFER_SIZE — при недоступной БД
+# вытесняются самые старые события, а не растёт память.
+BATCH_SIZE = 500
+FLUSH_INTERVAL_SEC = 0.2
+MAX_BUFFER_SIZE = 10_000
+
+_buffer: deque = deque(maxlen=MAX_BUFFER_SIZE)
+_buffer_lock = threading.Lock()
+_flush_event = threading.Event()
+_flusher_thread: Optional[threading.Thread] = None
+
+# Дневные UNLOGGED-партиции sys_events (PARTITION BY RANGE (created_at)).
+# Партиции создаются на PARTITIONS_AHEAD_DAYS вперёд; DEFAULT-партиция
+# ловит строки прямых session.add(SysEvents(...)) за дни без партиции.
+# _partitioned = None — ещё не проверяли; False — старая обычная таблица
+PARTITIONS_AHEAD_DAYS = 2
+_partitioned: Optional[bool] = None
+_known_partitions: set = set()
+# Дни, чья партиция не создалась (обычно их строки уже лежат в DEFAULT):
+# до перезапуска процесса DDL для них не повторяем — каждая попытка берёт
+# блокировку на родительской sys_events
+_failed_partitions: set = set()
+_default_partition_ready = False
+_partition_lock = threading.Lock()
+
+# Буферизованные строки уже проверены и сериализованы в log_event: level —
+# SMALLINT-код, details — готовый JSON-текст, который в БД приводится к JSONB
+_INSERT_BUFFERED = insert(SysEvents).inline().values(
+    details_json=cast(bindparam("details_text", type_=Text), JSONB)
+)
+
 class SystemEventLogger:
     """Класс для централизованного логирования системных событий в БД"""
 
@@ -36,7 +76,7 @@ class SystemEventLogger:
             session: Существующая сессия БД или None
         
         Returns:
-            True если успешно записано
+            True если событие записано (в переданную сессию) или поставлено в очередь
         """
         try:
             # Убираем sensitive данные из details
@@ -50,28 +90,131 @@ class SystemEventLogger:
                     component=component,
                     message=message,
                     details_json=details,
-                    created_at=datetime.now()
+                    created_at=utc_now()
                 )
                 session.add(event)
                 return True
             else:
-                # Создаем новую сессию
-                with SessionLocal() as db_session:
-                    event = SysEvents(
-                        level=level,
-                        component=component,
-                        message=message,
-                        details_json=details,
-                        created_at=datetime.now()
-                    )
-                    db_session.add(event)
-                    db_session.commit()
+                # Без сессии — в буфер, запись пачкой фоновым потоком.
+                # Уровень и details проверяем здесь: невалидное событие
+                # должно упасть в своём вызове, а не уронить чужую пачку
+                _enqueue({
+                    "level": EVENT_LEVEL_CODES.process_bind_param(level, None),
+                    "component": component,
+                    "message": message,
+                    "details_text": None if details is None else _json_serializer(details),
+                    "created_at": utc_now(),
+                })
                 return True
 
         except Exception as e:
             logger.error(f"Failed to log event to sys_events: {e}")
             return False
 
+    @staticmethod
+    def flush() -> int:
+        """Принудительно сбрасывает буфер событий в БД"""
+        with _buffer_lock:
+            rows = list(_buffer)
+            _buffer.clear()
+        if not rows:
+            return 0
+        return _write_batches([rows[i:i + BATCH_SIZE] for i in range(0, len(rows), BATCH_SIZE)])
+
+    @staticmethod
+    def ensure_partitions(start: Optional[date] = None, end: Optional[date] = None) -> int:
+        """
+        Создаёт дневные UNLOGGED-партиции за [start, end] плюс
+        PARTITIONS_AHEAD_DAYS дней вперёд, и DEFAULT-партицию (один раз
+        на процесс). Созданные и не созданные партиции запоминаются,
+        повторный вызов для них DDL не выполняет.
+
+        Returns:
+            Количество созданных партиций
+        """
+        global _default_partition_ready
+        if not _is_partitioned():
+            return 0
+
+        today = utc_now().date()
+        start = start or today
+        end = max(end or start, today + timedelta(days=PARTITIONS_AHEAD_DAYS))
+        days = []
+        day = start
+        while day <= end:
+            if day not in _known_partitions and day not in _failed_partitions:
+                days.append(day)
+            day += timedelta(days=1)
+        if not days:
+            return 0
+
+        table = SysEvents.__tablename__
+        created = 0
+        with _partition_lock:
+            if not _default_partition_ready:
+                with engine.begin() as conn:
+                    conn.execute(text(
+                        f"CREATE UNLOGGED TABLE IF NOT EXISTS {table}_default "
+                        f"PARTITION OF {table} DEFAULT"
+                    ))
+                _default_partition_ready = True
+            for day in days:
+                try:
+                    with engine.begin() as conn:
+                        conn.execute(text(
+                            f"CREATE UNLOGGED TABLE IF NOT EXISTS {_partition_name(day)} "
+                            f"PARTITION OF {table} "
+                            f"FOR VALUES FROM ('{day:%Y-%m-%d}') "
+                            f"TO ('{day + timedelta(days=1):%Y-%m-%d}')"
+                        ))
+                except (OperationalError, InterfaceError):
+                    raise  # БД недоступна — попробуем при следующем сбросе
+                except Exception as e:
+                    # В DEFAULT уже есть строки за этот день — остаются там
+                    logger.warning(f"sys_events partition for {day} not created, rows stay in DEFAULT: {e}")
+                    _failed_partitions.add(day)
+                    continue
+                _known_partitions.add(day)
+                created += 1
+
+        return created
+
+    @staticmethod
+    def drop_old_partitions(days: int = 30) -> List[str]:
+        """
+        Удаляет (DROP TABLE) дневные партиции старше days дней —
+        без DELETE и VACUUM. Возвращает имена удалённых партиций.
+        """
+        if not _is_partitioned():
+            return []
+
+        cutoff = utc_now().date() - timedelta(days=days)
+        prefix = f"{SysEvents.__tablename__}_"
+        dropped = []
+        with engine.begin() as conn:
+            names = conn.execute(
+                text(
+                    "SELECT c.relname FROM pg_inherits i "
+                    "JOIN pg_class c ON c.oid = i.inhrelid "
+                    "JOIN pg_class p ON p.oid = i.inhparent "
+                    "WHERE p.relname = :parent AND c.relkind = 'r'"
+                ),
+                {"parent": SysEvents.__tablename__},
+            ).scalars().all()
+            for name in names:
+                suffix = name[len(prefix):]
+                if not name.startswith(prefix) or not suffix.isdigit():
+                    continue  # DEFAULT и чужие таблицы не трогаем
+                day = datetime.strptime(suffix, "%Y%m%d").date()
+                if day < cutoff:
+                    conn.execute(text(f"DROP TABLE IF EXISTS {name}"))
+                    dropped.append(name)
+                    _known_partitions.discard(day)
+
+        if dropped:
+            logger.info(f"Dropped {len(dropped)} sys_events partitions older than {cutoff}")
+        return dropped
+
     @staticmethod
     def _mask_sensitive_data(data: dict) -> dict:
         """Маскирует чувствительные данные"""
@@ -151,5 +294,108 @@ class SystemEventLogger:
             {"command": command, "user_id": user_id, "success": success},
         )
 
+def _partition_name(day: date) -> str:
+    return f"{SysEvents.__tablename__}_{day:%Y%m%d}"
+
+
+def _is_partitioned() -> bool:
+    """Проверяет (один раз на процесс), партиционирована ли таблица в БД"""
+    global _partitioned
+    if _partitioned is None:
+        with engine.connect() as conn:
+            _partitioned = bool(
+                conn.execute(
+                    text(
+                        "SELECT 1 FROM pg_partitioned_table pt "
+                        "JOIN pg_class c ON c.oid = pt.partrelid "
+                        "WHERE c.relname = :name"
+                    ),
+                    {"name": SysEvents.__tablename__},
+                ).first()
+            )
+        if not _partitioned:
+            logger.warning("sys_events is not partitioned; partition maintenance disabled")
+    return _partitioned
+
+
+def _write_batches(batches: List[List[Dict[str, Any]]]) -> int:
+    """
+    Пишет все пачки в одной транзакции; на psycopg 3 — через pipeline mode.
+    Если транзакция не прошла из-за данных, события пишутся по одному и
+    отбрасываются только сбойные. При недоступной БД незаписанные события
+    возвращаются в буфер.
+    """
+    rows = [row for batch in batches for row in batch]
+    try:
+        stamps = [row["created_at"] for row in rows]
+        SystemEventLogger.ensure_partitions(min(stamps).date(), max(stamps).date())
+        with pipeline() as conn:
+            for batch in batches:
+                conn.execute(_INSERT_BUFFERED, batch)
+        return len(rows)
+    except (OperationalError, InterfaceError) as e:
+        logger.error(f"sys_events unavailable, {len(rows)} events requeued: {e}")
+        _requeue(rows)
+        return 0
+    except Exception as e:
+        logger.warning(f"Batch write of {len(rows)} events to sys_events failed, retrying row by row: {e}")
+
+    written = 0
+    for i, row in enumerate(rows):
+        try:
+            with engine.begin() as conn:
+                conn.execute(_INSERT_BUFFERED, row)
+            written += 1
+        except (OperationalError, InterfaceError) as e:
+            logger.error(f"sys_events unavailable, {len(rows) - i} events requeued: {e}")
+            _requeue(rows[i:])
+            break
+        except Exception as e:
+            logger.error(f"Dropped event for sys_events: {e}")
+    return written
+
+
+def _requeue(rows: List[Dict[str, Any]]) -> None:
+    """Возвращает незаписанные события в начало буфера (в пределах MAX_BUFFER_SIZE)"""
+    with _buffer_lock:
+        room = MAX_BUFFER_SIZE - len(_buffer)
+        if room < len(rows):
+            logger.error(f"sys_events buffer full, dropped {len(rows) - max(room, 0)} oldest events")
+            rows = rows[len(rows) - max(room, 0):]
+        _buffer.extendleft(reversed(rows))
+
+
+def _flusher_loop() -> None:
+    """Фоновый поток: периодически сбрасывает буфер в БД"""
+    while True:
+        _flush_event.wait(FLUSH_INTERVAL_SEC)
+        _flush_event.clear()
+        try:
+            SystemEventLogger.flush()
+        except Exception as e:
+            logger.error(f"sys_events flusher error: {e}")
+
+
+def _enqueue(row: Dict[str, Any]) -> None:
+    """Добавляет событие в буфер и при необходимости будит фоновый поток"""
+    global _flusher_thread
+
+    with _buffer_lock:
+        _buffer.append(row)
+        pending = len(_buffer)
+
+        if _flusher_thread is None or not _flusher_thread.is_alive():
+            _flusher_thread = threading.Thread(
+                target=_flusher_loop, name="SysEventsFlusher", daemon=True
+            )
+            _flusher_thread.start()
+
+    if pending >= BATCH_SIZE:
+        _flush_event.set()
+
+
+# Дописываем хвост буфера при завершении процесса
+atexit.register(SystemEventLogger.flush)
+
 # Создаем глобальный экземпляр
 sys_logger = SystemEventLogger()
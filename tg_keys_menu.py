@@ -30,10 +30,10 @@ logger = logging.getLogger(__name__)
 # ИСПРАВЛЕННЫЙ ИМПОРТ CredentialsStore - БЕЗ префикса app. в первой попытке!
 # устойчивый импорт стора
 try:
-    from app.database_security_implementation import CredentialsStore
+    from app.database_security_implementation import CredentialsStore, create_credentials_store
     logger.info("CredentialsStore imported from app.database_security_implementation")
 except Exception:
-    from database_security_implementation import CredentialsStore
+    from database_security_implementation import CredentialsStore, create_credentials_store
     logger.info("CredentialsStore imported from database_security_implementation (top-level)")
 
 
@@ -119,7 +119,7 @@ class AccountManager:
         Возвращает только два предустановленных аккаунта (Target и Donor),
         помечая, есть ли у них сохранённые ключи в БД.
         """
-        store = CredentialsStore()
+        store = create_credentials_store()
         predefined = AccountManager.get_predefined_accounts()
 
         result: List[Dict] = []
@@ -174,7 +174,7 @@ def _mask(s: Optional[str]) -> str:
 async def _load_credentials(account_id: int) -> Tuple[Optional[str], Optional[str]]:
     """Загрузка credentials из БД"""
     try:
-        store = CredentialsStore()
+        store = create_credentials_store()
         creds = store.get_account_credentials(account_id)
         if creds and len(creds) >= 2:
             return creds[0], creds[1]
@@ -406,7 +406,7 @@ async def account_callback(update, context: ContextTypes.DEFAULT_TYPE) -> int:
     elif data == "save_creds":
         if sess.api_key and sess.api_secret:
             try:
-                store = CredentialsStore()
+                store = create_credentials_store()
                 store.set_account_credentials(
                     sess.selected_account_id,
                     sess.api_key,